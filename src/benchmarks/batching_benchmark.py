@@ -0,0 +1,77 @@
+import argparse
+import threading
+import time
+
+import numpy as np
+
+from src.models.batching_scheduler import BatchingScheduler, model_manager_predictor
+from src.models.model_manager_config import ModelManagerConfig
+
+
+def get_layer_input(model_manager, start_layer_id: int) -> np.ndarray:
+    """The input of a layer for a blank image, as sent by a device offloading before that layer."""
+    layer_input = np.zeros((1, *model_manager.model.input_shape[1:]), dtype=np.float32)
+    for layer_id in range(start_layer_id):
+        layer_input = model_manager.predict_single_layer(layer_id, layer_input)
+    return np.asarray(layer_input)
+
+
+def run_benchmark(max_batch_size: int, max_wait: float, num_devices: int, requests_per_device: int,
+                  interval: float, predict, start_layer_id: int, tensor: np.ndarray) -> dict:
+    """Replay num_devices devices offloading tensor before start_layer_id and measure throughput and latency."""
+    scheduler = BatchingScheduler(predict=predict, max_batch_size=max_batch_size, max_wait=max_wait)
+    scheduler.start()
+    latencies = []
+    lock = threading.Lock()
+
+    def device(device_id: int):
+        for i in range(requests_per_device):
+            start_time = time.perf_counter()
+            scheduler.submit("resnet_model", start_layer_id, f"{device_id}_{i}", tensor).result()
+            with lock:
+                latencies.append(time.perf_counter() - start_time)
+            time.sleep(interval)
+
+    start_time = time.perf_counter()
+    threads = [threading.Thread(target=device, args=(device_id,)) for device_id in range(num_devices)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed_time = time.perf_counter() - start_time
+    scheduler.stop()
+
+    latencies = np.array(latencies) * 1000
+    return {
+        "max_batch_size": max_batch_size,
+        "max_wait_ms": max_wait * 1000,
+        "throughput_rps": len(latencies) / elapsed_time,
+        "p50_ms": np.percentile(latencies, 50),
+        "p95_ms": np.percentile(latencies, 95),
+        "mean_batch_size": scheduler.metrics.mean_batch_size,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Throughput and latency of the edge batching scheduler")
+    parser.add_argument("--devices", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--interval", type=float, default=0.0, help="think time of a device between requests")
+    parser.add_argument("--model-path", default=ModelManagerConfig.MODEL_PATH)
+    parser.add_argument("--start-layer", type=int, default=2, help="first layer computed by the edge")
+    args = parser.parse_args()
+
+    # tensorflow is only needed to run the benchmark, not to import its functions
+    from src.models.model_manager import ModelManager
+    model_manager = ModelManager(model_path=args.model_path)
+    model_manager.load_model(args.model_path)
+    predictor = model_manager_predictor(model_manager)
+    layer_input = get_layer_input(model_manager, args.start_layer)
+    # the first batch builds the tensorflow graph of the tail, it is not part of the measures
+    model_manager.predict_from_layer(args.start_layer, layer_input)
+    print(f"{'batch':>6} {'wait ms':>8} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'avg batch':>10}")
+    for batch_size, wait in [(1, 0.0), (4, 0.001), (8, 0.002), (16, 0.005), (32, 0.010)]:
+        result = run_benchmark(batch_size, wait, args.devices, args.requests, args.interval, predictor,
+                               args.start_layer, layer_input)
+        print(f"{result['max_batch_size']:>6} {result['max_wait_ms']:>8.1f} {result['throughput_rps']:>9.1f} "
+              f"{result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f} {result['mean_batch_size']:>10.2f}")
@@ -0,0 +1,73 @@
+import argparse
+import atexit
+import json
+import logging
+import os
+import tempfile
+import time
+
+from src.logger.log import setup_logger
+
+# a registration message and the AskInference reply with its input image, as logged on the hot path
+PAYLOAD = json.dumps({"device_id": "edge", "message_id": "ae6a", "message_content": "AskInference",
+                      "input_data": [[255] * 10] * 10})
+NUM_CANDIDATES = 5
+
+
+def log_message(mqtt_logger: logging.Logger, algo_logger: logging.Logger, guarded: bool) -> None:
+    """Emit the log records of one registration message: reception, offloading evaluation, reply."""
+    mqtt_logger.debug(f"Received a valid message")
+    mqtt_logger.debug(f"Data saved to ../evaluations/evaluations.csv")
+    algo_logger.info(f"Performing Static Offloading:")
+    for layer in range(NUM_CANDIDATES):
+        if not guarded or algo_logger.isEnabledFor(logging.INFO):
+            algo_logger.info(f"Performing Evaluation:")
+            algo_logger.info(f"DS:           {44288.0 / (layer + 1)}")
+            algo_logger.info(f"IC:           {0.163 * layer}")
+            algo_logger.info(f"CE:           {0.06 * (NUM_CANDIDATES - layer)}")
+            algo_logger.info(f"AvgSpeed:     {1024.0}")
+            algo_logger.info(f"Evaluation =  {0.5 + layer}")
+    algo_logger.info(f"Best Offloading Layer: {0}")
+    mqtt_logger.debug(f"Sending inference request to device_01")
+    if not guarded or mqtt_logger.isEnabledFor(logging.DEBUG):
+        mqtt_logger.debug(f"Publishing message to device_01/model_inference: {PAYLOAD}")
+
+
+def run_benchmark(mode: str, num_messages: int, log_folder: str, devnull) -> float:
+    """Measure the logging time spent on the calling thread per message, in microseconds."""
+    root_logger = logging.getLogger(f"benchmark_{mode}")
+    listener = setup_logger(root_logger, queue_logging=(mode != "synchronous"), log_folder=log_folder, stream=devnull)
+    mqtt_logger = root_logger.getChild("mqtt_client")
+    algo_logger = root_logger.getChild("offloading_algo")
+    if mode == "synchronous":
+        # previous setup: every record also propagates to a basicConfig root handler
+        root_logger.propagate = True
+        logging.getLogger().addHandler(logging.StreamHandler(devnull))
+        logging.getLogger().setLevel(logging.DEBUG)
+    if mode == "queue_gated":
+        mqtt_logger.setLevel(logging.INFO)
+        algo_logger.setLevel(logging.WARNING)
+
+    start_time = time.perf_counter()
+    for _ in range(num_messages):
+        log_message(mqtt_logger, algo_logger, guarded=(mode != "synchronous"))
+    elapsed_time = time.perf_counter() - start_time
+
+    if listener is not None:
+        listener.stop()
+        atexit.unregister(listener.stop)
+    logging.getLogger().handlers.clear()
+    for handler in root_logger.handlers:
+        handler.close()
+    return elapsed_time / num_messages * 1e6
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-message logging overhead on the MQTT hot path")
+    parser.add_argument("--messages", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as log_folder, open(os.devnull, "w") as devnull:
+        for benchmark_mode in ["synchronous", "queue", "queue_gated"]:
+            overhead = run_benchmark(benchmark_mode, args.messages, log_folder, devnull)
+            print(f"{benchmark_mode:>12}: {overhead:9.1f} us/message")
@@ -0,0 +1,276 @@
+import argparse
+import gc
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable
+
+import numpy as np
+
+from src.logger.log import logger as main_logger
+
+# (name, setup) of each benchmark, the setup returns the function to time and raises ImportError
+# when an optional dependency is missing
+BENCHMARKS = []
+# the benchmarks needing these packages are skipped when they are not installed, any other import error is raised
+OPTIONAL_DEPENDENCIES = ("tensorflow",)
+OFFLOADING_LAYER_COUNTS = (10, 100, 1000)
+# output shape of a convolutional layer of the default model, as sent by the device
+TENSOR_SHAPE = (1, 8, 8, 32)
+
+
+def benchmark(name: str):
+    def register(setup: Callable) -> Callable:
+        BENCHMARKS.append((name, setup))
+        return setup
+    return register
+
+
+def make_result_payload(num_values: int = 1024) -> bytes:
+    """A device inference result message, as received by the edge."""
+    return json.dumps({
+        "timestamp": "3930000000.0",
+        "message_id": "ae6a",
+        "device_id": "device_01",
+        "message_content": {
+            "layer_output": [0.5] * num_values,
+            "offloading_layer_index": 2,
+            "layers_inference_time": [0.001] * 8,
+        },
+    }).encode()
+
+
+@benchmark("mqtt_message_from_raw")
+def setup_from_raw() -> Callable:
+    from src.mqtt_client.mqtt_custom_message import MqttMessageData
+    payload = make_result_payload()
+    return lambda: MqttMessageData.from_raw("device_01/model_inference_result", payload)
+
+
+@benchmark("extend_message_data")
+def setup_extend_message_data() -> Callable:
+    from src.mqtt_client.mqtt_client import MqttClient
+    from src.mqtt_client.mqtt_custom_message import MqttMessageData
+    message_data = MqttMessageData.from_raw("device_01/model_inference_result", make_result_payload())
+    message_data.message_content = json.loads(message_data.payload)["message_content"]
+    return lambda: MqttClient.extend_message_data(message_data, 3930000000.5)
+
+
+@benchmark("save_to_file")
+def setup_save_to_file() -> Callable:
+    from src.mqtt_client.mqtt_custom_message import MqttMessageData
+    message_data = MqttMessageData.from_raw("devices/", make_result_payload(num_values=16))
+    file_path = os.path.join(tempfile.mkdtemp(), "evaluations.csv")
+    return lambda: MqttMessageData.save_to_file(file_path, message_data.to_dict())
+
+
+def make_offloading_setup(num_layers: int) -> Callable:
+    def setup() -> Callable:
+        from src.offloading_algo.offloading_algo import OffloadingAlgo
+        rng = np.random.default_rng(0)
+        layers_sizes = list(rng.uniform(1e3, 1e5, num_layers + 1))
+        inference_time_device = list(rng.uniform(1e-3, 1e-2, num_layers + 1))
+        inference_time_edge = list(rng.uniform(1e-4, 1e-3, num_layers + 1))
+        return lambda: OffloadingAlgo(
+            avg_speed=1e5,
+            num_layers=num_layers,
+            layers_sizes=layers_sizes,
+            inference_time_device=inference_time_device,
+            inference_time_edge=inference_time_edge,
+        ).static_offloading()
+    return setup
+
+
+for layer_count in OFFLOADING_LAYER_COUNTS:
+    benchmark(f"static_offloading[layers={layer_count}]")(make_offloading_setup(layer_count))
+
+
+@benchmark("predict_single_layer")
+def setup_predict_single_layer() -> Callable:
+    from src.models.model_manager import ModelManager
+    model_manager = ModelManager()
+    model_manager.load_model()
+    layer_input = np.zeros((1, *model_manager.model.input_shape[1:]), dtype=np.float32)
+    return lambda: model_manager.predict_single_layer(0, layer_input)
+
+
+@benchmark("tensor_json_encode")
+def setup_tensor_json_encode() -> Callable:
+    tensor = np.random.default_rng(0).random(TENSOR_SHAPE, dtype=np.float32)
+    return lambda: json.dumps({"layer_output": tensor.tolist()})
+
+
+@benchmark("tensor_json_decode")
+def setup_tensor_json_decode() -> Callable:
+    payload = json.dumps({"layer_output": np.random.default_rng(0).random(TENSOR_SHAPE).tolist()})
+    return lambda: np.asarray(json.loads(payload)["layer_output"], dtype=np.float32)
+
+
+def calibrate(func: Callable, min_time: float) -> int:
+    """Number of calls per repetition so that a repetition lasts at least min_time seconds."""
+    number = 1
+    while True:
+        start_time = time.perf_counter()
+        for _ in range(number):
+            func()
+        if time.perf_counter() - start_time >= min_time:
+            return number
+        number *= 2
+
+
+def measure(func: Callable, warmup: int = 3, repetitions: int = 15, min_time: float = 0.05) -> dict:
+    """Time a function over repetitions of calibrated loops, with the garbage collector disabled.
+
+    Returns:
+        The per-call time statistics in microseconds, the median is the value compared to the baselines.
+    """
+    for _ in range(warmup):
+        func()
+    number = calibrate(func, min_time)
+    timings = []
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repetitions):
+            start_time = time.perf_counter_ns()
+            for _ in range(number):
+                func()
+            timings.append((time.perf_counter_ns() - start_time) / number / 1000)
+    finally:
+        if gc_enabled:
+            gc.enable()
+    quartiles = statistics.quantiles(timings, n=4) if len(timings) > 1 else [timings[0]] * 3
+    return {
+        "median_us": statistics.median(timings),
+        "mean_us": statistics.fmean(timings),
+        "min_us": min(timings),
+        "iqr_us": quartiles[2] - quartiles[0],
+        "repetitions": repetitions,
+        "number": number,
+    }
+
+
+def pin_cpu(cpu: int | None) -> None:
+    """Pin the process to one CPU to reduce the scheduling noise, where the platform allows it."""
+    if cpu is None:
+        return
+    if hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, {cpu})
+    else:
+        print(f"CPU pinning is not supported on {platform.system()}, run it under taskset/start /affinity instead")
+
+
+def set_log_level(level: str) -> None:
+    """Set the level of the edge subsystem loggers created so far."""
+    for subsystem_logger in list(logging.Logger.manager.loggerDict.values()):
+        if isinstance(subsystem_logger, logging.Logger) and subsystem_logger.parent is main_logger:
+            subsystem_logger.setLevel(level)
+
+
+def run_benchmarks(selected: list[str] | None = None, warmup: int = 3, repetitions: int = 15,
+                   min_time: float = 0.05, log_level: str | None = None) -> dict:
+    """Run the registered benchmarks (or the selected ones) and return the results with the environment.
+
+    The subsystem loggers are created when the benchmarked modules are imported, so the log level
+    is applied after each setup.
+    """
+    results = {}
+    skipped = {}
+    for name, setup in BENCHMARKS:
+        if selected and not any(name.startswith(prefix) for prefix in selected):
+            continue
+        try:
+            func = setup()
+        except ModuleNotFoundError as e:
+            if (e.name or "").split(".")[0] not in OPTIONAL_DEPENDENCIES:
+                raise
+            skipped[name] = repr(e)
+            continue
+        if log_level is not None:
+            set_log_level(log_level)
+        results[name] = measure(func, warmup=warmup, repetitions=repetitions, min_time=min_time)
+        print(f"{name:<36} {results[name]['median_us']:>12.2f} us  (iqr {results[name]['iqr_us']:.2f})")
+    for name, reason in skipped.items():
+        print(f"{name:<36} skipped: {reason}")
+    return {
+        "environment": {
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+            "numpy": np.__version__,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+        "skipped": skipped,
+    }
+
+
+def compare(baseline: dict, current: dict, threshold: float = 0.1) -> list[dict]:
+    """Compare the median times of two runs.
+
+    Args:
+        baseline: The results of the baseline run.
+        current: The results of the run to judge.
+        threshold: The relative slowdown above which a benchmark is a regression.
+    Returns:
+        One row per benchmark present in both runs, with its relative change and regression flag.
+    """
+    rows = []
+    for name, result in current["results"].items():
+        if name not in baseline["results"]:
+            continue
+        baseline_median = baseline["results"][name]["median_us"]
+        change = result["median_us"] / baseline_median - 1
+        rows.append({
+            "name": name,
+            "baseline_us": baseline_median,
+            "current_us": result["median_us"],
+            "change": change,
+            "regression": change > threshold,
+        })
+    return rows
+
+
+def load_results(file_path: str) -> dict:
+    with open(file_path, 'r') as file:
+        return json.load(file)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Microbenchmarks of the edge hot paths with JSON baselines")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    run_parser = subparsers.add_parser("run", help="run the benchmarks and save the results")
+    run_parser.add_argument("--output", default="benchmark_results.json", help="JSON file for the results")
+    run_parser.add_argument("--only", nargs="*", default=None, help="benchmark name prefixes to run")
+    run_parser.add_argument("--warmup", type=int, default=3)
+    run_parser.add_argument("--repetitions", type=int, default=15)
+    run_parser.add_argument("--min-time", type=float, default=0.05, help="minimum duration of a repetition")
+    run_parser.add_argument("--cpu", type=int, default=None, help="CPU to pin the process to")
+    run_parser.add_argument("--log-level", default="WARNING",
+                            help="level of the edge loggers while benchmarking, to keep log I/O out of the timings")
+    compare_parser = subparsers.add_parser("compare", help="flag the regressions of a run against a baseline")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.1, help="relative slowdown flagged")
+    args = parser.parse_args()
+
+    if args.command == "run":
+        pin_cpu(args.cpu)
+        run_results = run_benchmarks(args.only, args.warmup, args.repetitions, args.min_time, args.log_level)
+        with open(args.output, 'w') as output_file:
+            json.dump(run_results, output_file, indent=2)
+        print(f"Results saved to {args.output}")
+    else:
+        comparison = compare(load_results(args.baseline), load_results(args.current), args.threshold)
+        for row in comparison:
+            flag = "REGRESSION" if row["regression"] else ""
+            print(f"{row['name']:<36} {row['baseline_us']:>12.2f} {row['current_us']:>12.2f} "
+                  f"{row['change']:>+8.1%} {flag}")
+        if any(row["regression"] for row in comparison):
+            sys.exit(1)
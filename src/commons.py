@@ -2,4 +2,6 @@ class OffloadingDataFiles:
     data_file_path_device: str = "../device_inference_times.json"
     data_file_path_edge: str = "../edge_inference_times.json"
     data_file_path_sizes: str = "../layer_sizes.json"
+    data_file_path_features: str = "../layer_features.json"
     evaluation_file_path: str = "../evaluations/evaluations.csv"
+    snapshot_file_path: str = "../edge_snapshot.npz"
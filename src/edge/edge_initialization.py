@@ -3,6 +3,7 @@ import json
 import numpy as np
 
 from src.commons import OffloadingDataFiles
+from src.models.model_graph import extract_layer_features
 from src.models.model_manager import ModelManager
 
 if __name__ == "__main__":
@@ -65,3 +66,7 @@ if __name__ == "__main__":
     # save the layer sizes to a file
     with open(f"../{OffloadingDataFiles.data_file_path_sizes}.json", "w") as f:
         json.dump(layer_sizes, f, indent=4)
+
+    # save the layer features of the device timing model to a file
+    with open(OffloadingDataFiles.data_file_path_features, "w") as f:
+        json.dump(extract_layer_features(model_manager.model), f, indent=4)
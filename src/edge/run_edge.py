@@ -1,21 +1,43 @@
 from src.logger.log import logger
 
+from src.models.model_manager_config import ModelManagerConfig, ModelRegistryConfig
+from src.models.inference_workers import InferenceWorkerPool
+from src.models.model_registry import (
+    ModelRegistry, ModelSpec, get_inference_pool_size_in_bytes, load_inference_pool
+)
 from src.mqtt_client.mqtt_client import MqttClient
 from src.mqtt_client.mqtt_configs import MqttClientConfig
 
 if __name__ == "__main__":
     logger.info("Starting the [EDGE] MQTT client")
 
+    # register the served models, the devices naming no model get the default one, each loaded model is served
+    # by its own pool of inference processes, off the MQTT thread and the GIL
+    model_registry = ModelRegistry(
+        loader=load_inference_pool,
+        size_estimator=get_inference_pool_size_in_bytes,
+        unloader=InferenceWorkerPool.stop
+    )
+    model_registry.register(ModelSpec(
+        model_id=ModelRegistryConfig.DEFAULT_MODEL_ID,
+        version=ModelRegistryConfig.DEFAULT_MODEL_VERSION,
+        model_path=ModelManagerConfig.MODEL_PATH,
+        exit_layers=ModelManagerConfig.EXIT_LAYERS
+    ))
+
     # start the MQTT client
     mqtt_client = MqttClient(
         broker_url=MqttClientConfig.broker_url,
         broker_port=MqttClientConfig.broker_port,
         client_id=MqttClientConfig.client_id,
         protocol=MqttClientConfig.protocol,
-        subscribed_topics=MqttClientConfig.subscribe_topics
+        subscribed_topics=MqttClientConfig.subscribe_topics,
+        model_registry=model_registry
     )
 
-    # run the MQTT client in loop
-    mqtt_client.run()
-
+    # run the MQTT client in loop, the snapshot for the next startup is saved on exit
     logger.info("Listening for messages...")
+    try:
+        mqtt_client.run()
+    finally:
+        mqtt_client.stop()
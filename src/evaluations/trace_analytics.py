@@ -0,0 +1,206 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+
+# phase of each topic, matched on the last topic level so that any device id is accepted
+PHASES = {
+    "": "registration",
+    "model_inference": "ask_inference",
+    "model_inference_result": "inference_result",
+    "end_computation": "end_computation",
+}
+# columns needed for the analysis, the payloads and tensors are never loaded
+COLUMNS = ["topic", "message_id", "timestamp", "received_timestamp", "payload_size", "avg_speed",
+           "offloading_layer_index"]
+# seconds without a new row after which a request still in flight is dropped as lost
+PENDING_HORIZON = 600.0
+DTYPES = {"topic": str, "message_id": str, "timestamp": np.float64, "received_timestamp": np.float64,
+          "payload_size": np.float64, "avg_speed": np.float64, "offloading_layer_index": np.float64}
+
+
+class StreamingHistogram:
+    """Signed log-spaced histogram with exact count, sum, min and max, for percentiles in bounded memory.
+
+    Negative values (e.g. latencies under clock skew) are binned by magnitude in a mirrored histogram.
+
+    Args:
+        low: The smallest magnitude binned apart from zero, smaller magnitudes fall in the first bin.
+        high: The largest magnitude, larger magnitudes fall in the last bin.
+        num_bins: The number of bins on each side of zero.
+    """
+
+    def __init__(self, low: float = 1e-6, high: float = 1e9, num_bins: int = 2000):
+        magnitude_edges = np.geomspace(low, high, num_bins + 1)
+        # bin edges in increasing order, from the negative bins to the positive ones
+        self.edges = np.concatenate([-magnitude_edges[::-1], magnitude_edges])
+        self.counts = np.zeros(len(self.edges) - 1, dtype=np.int64)
+        self.count = 0
+        self.total = 0.0
+        self.minimum = float('inf')
+        self.maximum = float('-inf')
+
+    def update(self, values: np.ndarray) -> None:
+        values = np.asarray(values, dtype=float)
+        values = values[np.isfinite(values)]
+        if len(values) == 0:
+            return
+        self.counts += np.histogram(np.clip(values, self.edges[0], self.edges[-1]), bins=self.edges)[0]
+        self.count += len(values)
+        self.total += float(values.sum())
+        self.minimum = min(self.minimum, float(values.min()))
+        self.maximum = max(self.maximum, float(values.max()))
+
+    def percentile(self, q: float) -> float:
+        if self.count == 0:
+            return float('nan')
+        bin_index = int(np.searchsorted(np.cumsum(self.counts), q / 100 * self.count))
+        bin_index = min(bin_index, len(self.counts) - 1)
+        low, high = self.edges[bin_index], self.edges[bin_index + 1]
+        # geometric center of the bin (the middle bin spans zero), bounded by the observed extremes
+        center = float(np.sign(low + high) * np.sqrt(low * high)) if low * high > 0 else 0.0
+        return min(max(center, self.minimum), self.maximum)
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else float('nan'),
+            "min": self.minimum if self.count else float('nan'),
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            "max": self.maximum if self.count else float('nan'),
+        }
+
+
+class TraceAnalytics:
+    """Streaming join of evaluation rows into per-request records and their aggregated statistics.
+
+    The rows of a request are kept until its end_computation row arrives, then the completed
+    requests of a chunk are reduced into histograms and counters and dropped. A registration row
+    starts a new request, so message ids reused over a long trace are not merged. A request without
+    a new row for pending_horizon seconds of trace time is dropped and counted as lost, by the last
+    phase it reached, so that the requests that never end do not accumulate.
+
+    Args:
+        pending_horizon: The seconds a request stays in flight without a new row, None to keep it until the end.
+    """
+
+    def __init__(self, pending_horizon: float | None = PENDING_HORIZON):
+        self.pending_horizon = pending_horizon
+        self.latest_timestamp = float('-inf')
+        self.pending = pd.DataFrame(columns=COLUMNS + ["phase"])
+        self.phase_latencies = {phase: StreamingHistogram() for phase in PHASES.values()}
+        self.metrics = {
+            "device_computation": StreamingHistogram(),
+            "end_to_end": StreamingHistogram(),
+            "avg_speed": StreamingHistogram(),
+            "payload_size": StreamingHistogram(),
+        }
+        self.split_counts = pd.Series(dtype=np.int64)
+        self.lost_requests = pd.Series(dtype=np.int64)
+        self.completed_requests = 0
+        self.rows = 0
+
+    def update(self, chunk: pd.DataFrame) -> None:
+        self.rows += len(chunk)
+        chunk = chunk.assign(phase=chunk["topic"].str.rsplit("/", n=1).str[-1].map(PHASES))
+        chunk = chunk[chunk["phase"].notna()]
+        if len(chunk):
+            self.latest_timestamp = max(self.latest_timestamp, chunk["received_timestamp"].max())
+        rows = pd.concat([self.pending, chunk], ignore_index=True) if len(self.pending) else chunk
+        # request sequence number of each row within its message id
+        request = (rows["phase"] == "registration").groupby(rows["message_id"]).cumsum()
+        rows = rows.assign(request=request)
+
+        ended = rows.loc[rows["phase"] == "end_computation", ["message_id", "request"]].drop_duplicates()
+        is_completed = pd.MultiIndex.from_frame(rows[["message_id", "request"]]).isin(
+            pd.MultiIndex.from_frame(ended)
+        )
+        completed = rows[is_completed]
+        # keep only the rows of the requests still in flight, their sequence is recomputed with the next chunk
+        pending = rows[~is_completed]
+        if self.pending_horizon is not None and len(pending):
+            pending = self.evict_lost(pending)
+        self.pending = pending.drop(columns="request")
+        if len(completed):
+            self.reduce(completed)
+
+    def evict_lost(self, pending: pd.DataFrame) -> pd.DataFrame:
+        """Drop the requests in flight without a row for pending_horizon seconds, counting them as lost."""
+        requests = pending.groupby(["message_id", "request"])["received_timestamp"]
+        is_lost = requests.transform("max") < self.latest_timestamp - self.pending_horizon
+        if is_lost.any():
+            lost = pending[is_lost].sort_values("received_timestamp")
+            last_phases = lost.groupby(["message_id", "request"])["phase"].last().value_counts()
+            self.lost_requests = self.lost_requests.add(last_phases, fill_value=0).astype(np.int64)
+        return pending[~is_lost]
+
+    def reduce(self, rows: pd.DataFrame) -> None:
+        """Aggregate the rows of completed requests."""
+        rows = rows.assign(phase_latency=rows["received_timestamp"] - rows["timestamp"])
+        for phase, latencies in rows.groupby("phase")["phase_latency"]:
+            self.phase_latencies[phase].update(latencies.to_numpy())
+
+        requests = rows.pivot_table(
+            index=["message_id", "request"], columns="phase",
+            values=["timestamp", "received_timestamp"], aggfunc="first"
+        )
+        self.completed_requests += len(requests)
+        if ("timestamp", "inference_result") in requests and ("timestamp", "ask_inference") in requests:
+            self.metrics["device_computation"].update(
+                (requests[("timestamp", "inference_result")] - requests[("timestamp", "ask_inference")]).to_numpy()
+            )
+        if ("timestamp", "registration") in requests:
+            self.metrics["end_to_end"].update(
+                (requests[("received_timestamp", "end_computation")] - requests[("timestamp", "registration")])
+                .to_numpy()
+            )
+
+        registrations = rows[rows["phase"] == "registration"]
+        self.metrics["avg_speed"].update(registrations["avg_speed"].to_numpy())
+        self.metrics["payload_size"].update(rows["payload_size"].to_numpy())
+        splits = rows["offloading_layer_index"].dropna().astype(np.int64).value_counts()
+        self.split_counts = self.split_counts.add(splits, fill_value=0).astype(np.int64)
+
+    def summary(self) -> pd.DataFrame:
+        """One row per statistic: the latency of each phase, the derived latencies and the link stats."""
+        statistics = {f"latency_{phase}": histogram.summary() for phase, histogram in self.phase_latencies.items()}
+        statistics.update({name: histogram.summary() for name, histogram in self.metrics.items()})
+        return pd.DataFrame.from_dict(statistics, orient="index")
+
+    def split_distribution(self) -> pd.DataFrame:
+        split_counts = self.split_counts.sort_index()
+        return pd.DataFrame({"requests": split_counts, "share": split_counts / max(split_counts.sum(), 1)})
+
+
+def analyze(file_paths: list[str], chunk_size: int = 100_000,
+            pending_horizon: float | None = PENDING_HORIZON) -> TraceAnalytics:
+    """Stream the evaluation files in chunks through the trace analytics."""
+    trace_analytics = TraceAnalytics(pending_horizon=pending_horizon)
+    for file_path in file_paths:
+        for chunk in pd.read_csv(file_path, usecols=COLUMNS, dtype=DTYPES, chunksize=chunk_size):
+            trace_analytics.update(chunk)
+    return trace_analytics
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-request latency, split and bandwidth summary of evaluation traces")
+    parser.add_argument("files", nargs="+", help="evaluations.csv files, in chronological order")
+    parser.add_argument("--chunk-size", type=int, default=100_000, help="rows read at a time")
+    parser.add_argument("--pending-horizon", type=float, default=PENDING_HORIZON,
+                        help="seconds without a new row before a request in flight is counted as lost")
+    parser.add_argument("--output", default=None, help="optional CSV file for the summary table")
+    args = parser.parse_args()
+
+    analytics = analyze(args.files, chunk_size=args.chunk_size, pending_horizon=args.pending_horizon)
+    summary = analytics.summary()
+    print(f"rows: {analytics.rows}, completed requests: {analytics.completed_requests}, "
+          f"lost requests: {analytics.lost_requests.sum()}, "
+          f"incomplete requests: {analytics.pending['message_id'].nunique()}")
+    if analytics.lost_requests.sum():
+        print(f"last phase of the lost requests: {analytics.lost_requests.to_dict()}")
+    print(summary.to_string(float_format=lambda value: f"{value:.6g}"))
+    print(analytics.split_distribution().to_string())
+    if args.output is not None:
+        summary.to_csv(args.output)
@@ -1,14 +1,18 @@
+import atexit
+import queue
 from logging import (
     getLogger,
-    basicConfig,
+    Handler,
+    Logger,
     StreamHandler,
     Formatter,
+    NOTSET,
     DEBUG,
     INFO,
     WARNING,
     ERROR
 )
-from logging.handlers import TimedRotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener, TimedRotatingFileHandler
 from os import path
 from pathlib import Path
 
@@ -33,18 +37,20 @@ class CustomFormatter(Formatter):
         return super().format(record)
 
 
-basicConfig(level=DEBUG)
+class LocalQueueHandler(QueueHandler):
+    """Enqueues the records untouched: the listener lives in the same process, so formatting is left to its thread."""
 
-logger = getLogger(__name__)
-logger.setLevel(DEBUG)
+    def prepare(self, record):
+        return record
 
-if len(logger.handlers) == 0:
+
+def create_handlers(log_folder: str = LOG_FOLDER, stream=None) -> list[Handler]:
+    """Create the console handler and the rotating file handlers of each log level."""
     formatter = CustomFormatter("%(asctime)s - %(levelname)-8s - %(file_info)-40s - %(indentation_space)s%(message)s")
 
-    syslog = StreamHandler()
+    syslog = StreamHandler(stream)
     syslog.setFormatter(formatter)
-    logger.setLevel(DEBUG)
-    logger.addHandler(syslog)
+    handlers = [syslog]
 
     optional_handlers = []
     if DEBUG_LOG_LEVEL:
@@ -56,7 +62,7 @@ if len(logger.handlers) == 0:
                                          (WARNING, "WARNING.log", "W0"),
                                      ] + optional_handlers:
         fh = TimedRotatingFileHandler(
-            path.join(LOG_FOLDER, filename),
+            path.join(log_folder, filename),
             when=when,
             interval=1,
             backupCount=LOG_HISTORY_DAYS_LIMIT,
@@ -64,4 +70,51 @@ if len(logger.handlers) == 0:
         )
         fh.setLevel(log_level)
         fh.setFormatter(formatter)
-        logger.addHandler(fh)
+        handlers.append(fh)
+    return handlers
+
+
+def setup_logger(
+        target_logger: Logger,
+        queue_logging: bool = LoggerConfig.QUEUE_LOGGING,
+        log_folder: str = LOG_FOLDER,
+        stream=None
+) -> QueueListener | None:
+    """Attach the handlers to a logger, behind a queue when queue_logging is set.
+
+    In queue mode the calling thread only enqueues the record, formatting and writing happen in the
+    listener thread. Records are not propagated to the root logger to avoid writing them twice.
+
+    Returns:
+        The started queue listener, None in synchronous mode.
+    """
+    target_logger.setLevel(DEBUG)
+    target_logger.propagate = False
+    handlers = create_handlers(log_folder, stream)
+    if not queue_logging:
+        for handler in handlers:
+            target_logger.addHandler(handler)
+        return None
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    target_logger.addHandler(LocalQueueHandler(log_queue))
+    # flush the queued records on exit
+    atexit.register(listener.stop)
+    return listener
+
+
+logger = getLogger(__name__)
+
+if len(logger.handlers) == 0:
+    listener = setup_logger(logger)
+
+
+def get_logger(subsystem: str) -> Logger:
+    """Get the logger of a subsystem, with its level from LoggerConfig.SUBSYSTEM_LEVELS.
+
+    Records go through the handlers of the main logger, the subsystem level only filters them.
+    """
+    subsystem_logger = logger.getChild(subsystem)
+    subsystem_logger.setLevel(LoggerConfig.SUBSYSTEM_LEVELS.get(subsystem, NOTSET))
+    return subsystem_logger
@@ -4,3 +4,12 @@ class LoggerConfig:
     LOG_HISTORY_DAYS_LIMIT = 7
     LOG_INDENTATION_UNIT = "  "
     ERROR_LOG_LEVEL = True
+    QUEUE_LOGGING = True
+    # level of each subsystem logger, the subsystems not listed log at DEBUG; the offloading algorithms log
+    # every evaluated split at INFO, too much for the decision path
+    SUBSYSTEM_LEVELS = {
+        "mqtt_client": "INFO",
+        "offloading_algo": "WARNING",
+        "models": "DEBUG",
+        "simulator": "INFO",
+    }
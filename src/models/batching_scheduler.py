@@ -0,0 +1,185 @@
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable
+
+import numpy as np
+
+from src.logger.log import get_logger
+from src.models.model_manager_config import BatchingConfig
+
+logger = get_logger("models")
+
+
+@dataclass
+class BatchRequest:
+    message_id: str
+    tensor: np.ndarray
+    arrival_time: float
+    future: Future = field(default_factory=Future)
+
+
+@dataclass
+class BatchingMetrics:
+    batches: int = 0
+    requests: int = 0
+    failed_batches: int = 0
+
+    @property
+    def mean_batch_size(self) -> float:
+        return self.requests / self.batches if self.batches else 0.0
+
+
+def model_manager_predictor(model_manager) -> Callable:
+    """Adapt a ModelManager to the batched prediction function of the scheduler."""
+    def predict(model_id: str, version: str | None, start_layer_id: int, batch: np.ndarray) -> tuple:
+        return model_manager.predict_tail(start_layer_id, batch)
+    return predict
+
+
+def model_registry_predictor(model_registry) -> Callable:
+    """Adapt a ModelRegistry to the batched prediction function, running the tail of the requested model version."""
+    def predict(model_id: str, version: str | None, start_layer_id: int, batch: np.ndarray) -> tuple:
+        return model_registry.get_model(model_id, version).predict_tail(start_layer_id, batch)
+    return predict
+
+
+class BatchingScheduler:
+    """Groups the pending tail inference requests sharing a (model, version, start layer) key into batched calls.
+
+    A batch is run as soon as it reaches max_batch_size requests or its oldest request has waited
+    max_wait seconds, and its output is scattered back to the futures of the single requests, with the exit
+    layer the batch took (the early exits stop a whole batch at once).
+
+    Args:
+        predict: The function (model_id, version, start_layer_id, batch) -> (batched output, exit layer or None).
+        max_batch_size: The maximum number of requests in a batch.
+        max_wait: The maximum time in seconds a request waits for its batch to fill.
+        concurrent_batches: The maximum number of batches run at the same time (e.g. one per inference worker).
+    """
+
+    def __init__(
+            self,
+            predict: Callable,
+            max_batch_size: int = BatchingConfig.MAX_BATCH_SIZE,
+            max_wait: float = BatchingConfig.MAX_WAIT,
+            concurrent_batches: int = BatchingConfig.CONCURRENT_BATCHES
+    ):
+        self.predict = predict
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.concurrent_batches = concurrent_batches
+        # (model_id, version, start_layer_id) -> requests in arrival order
+        self.pending = {}
+        self.condition = threading.Condition()
+        self.running = False
+        self.thread = None
+        self.executor = None
+        self.metrics = BatchingMetrics()
+
+    def start(self) -> None:
+        self.running = True
+        if self.concurrent_batches > 1:
+            self.executor = ThreadPoolExecutor(max_workers=self.concurrent_batches)
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        """Stop the scheduler, running the batches still pending."""
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        if self.thread is not None:
+            self.thread.join()
+        for key, requests in self.pop_ready_batches(float('inf')):
+            self.dispatch(key, requests)
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+
+    def submit(
+            self,
+            model_id: str,
+            start_layer_id: int,
+            message_id: str,
+            tensor: np.ndarray,
+            version: str | None = None
+    ) -> Future:
+        """Submit a tail inference request.
+        Args:
+            model_id: The id of the model.
+            start_layer_id: The id of the first layer to compute.
+            message_id: The id of the message the request comes from.
+            tensor: The input tensor, with a leading batch dimension.
+            version: The version of the model, None for the default one.
+        Returns:
+            The future of the request output and of its exit layer.
+        """
+        request = BatchRequest(message_id=message_id, tensor=np.asarray(tensor), arrival_time=time.monotonic())
+        with self.condition:
+            self.pending.setdefault((model_id, version, start_layer_id), []).append(request)
+            self.condition.notify()
+        return request.future
+
+    def pop_ready_batches(self, now: float) -> list[tuple[tuple, list]]:
+        """Pop the batches that are full or whose oldest request has waited long enough."""
+        ready = []
+        for key, requests in list(self.pending.items()):
+            while requests and (len(requests) >= self.max_batch_size
+                                or now - requests[0].arrival_time >= self.max_wait):
+                ready.append((key, requests[:self.max_batch_size]))
+                del requests[:self.max_batch_size]
+            if not requests:
+                del self.pending[key]
+        return ready
+
+    def next_deadline(self) -> float | None:
+        if not self.pending:
+            return None
+        return min(requests[0].arrival_time for requests in self.pending.values()) + self.max_wait
+
+    def run(self) -> None:
+        while True:
+            with self.condition:
+                if not self.running:
+                    return
+                ready = self.pop_ready_batches(time.monotonic())
+                if not ready:
+                    deadline = self.next_deadline()
+                    self.condition.wait(None if deadline is None else max(deadline - time.monotonic(), 0))
+                    continue
+            for key, requests in ready:
+                self.dispatch(key, requests)
+
+    def dispatch(self, key: tuple, requests: list[BatchRequest]) -> None:
+        """Run a batch in the scheduler thread, or hand it to the executor when batches run concurrently."""
+        if self.executor is None:
+            self.execute(key, requests)
+        else:
+            self.executor.submit(self.execute, key, requests)
+
+    def execute(self, key: tuple, requests: list[BatchRequest]) -> None:
+        """Run a batch and scatter its output back to the requests."""
+        model_id, version, start_layer_id = key
+        batch = np.concatenate([r.tensor for r in requests], axis=0)
+        try:
+            outputs, exit_layer = self.predict(model_id, version, start_layer_id, batch)
+        except Exception as e:
+            logger.error(f"Batched inference of {len(requests)} requests for {key} failed: {e}")
+            with self.condition:
+                self.metrics.failed_batches += 1
+            for request in requests:
+                request.future.set_exception(e)
+            return
+        with self.condition:
+            self.metrics.batches += 1
+            self.metrics.requests += len(requests)
+        offset = 0
+        for request in requests:
+            batch_size = request.tensor.shape[0]
+            request.future.set_result((outputs[offset:offset + batch_size], exit_layer))
+            offset += batch_size
+
+    def get_metrics(self) -> dict:
+        return {**self.metrics.__dict__, "mean_batch_size": self.metrics.mean_batch_size}
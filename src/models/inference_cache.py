@@ -0,0 +1,120 @@
+import hashlib
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable
+
+import numpy as np
+
+from src.logger.log import get_logger
+from src.models.model_manager_config import InferenceCacheConfig
+
+logger = get_logger("models")
+
+
+@dataclass
+class CacheEntry:
+    value: np.ndarray
+    size: int
+    compute_time: float
+    expires_at: float
+
+
+@dataclass
+class CacheMetrics:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
+    saved_time: float = 0.0
+
+    @property
+    def hit_ratio(self) -> float:
+        requests = self.hits + self.misses
+        return self.hits / requests if requests else 0.0
+
+
+def get_tensor_key(model_version: str, layer_id: int, tensor: np.ndarray) -> bytes:
+    """Compute the content address of a tensor entering a layer of a model version.
+    Args:
+        model_version: The version (or path) of the model.
+        layer_id: The id of the first layer the tensor is fed to.
+        tensor: The input tensor.
+    Returns:
+        The digest identifying the request.
+    """
+    tensor = np.ascontiguousarray(tensor)
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{model_version}:{layer_id}:{tensor.dtype.str}:{tensor.shape}".encode())
+    digest.update(memoryview(tensor).cast("B"))
+    return digest.digest()
+
+
+def read_only(value: np.ndarray) -> np.ndarray:
+    """A read-only view of a cached result, so the callers cannot alter the stored one."""
+    view = value.view()
+    view.flags.writeable = False
+    return view
+
+
+class InferenceCache:
+    """LRU cache of inference results with a time-to-live and a bound on the stored bytes.
+
+    The results are returned as read-only views of the stored arrays.
+
+    Args:
+        max_bytes: The maximum size in bytes of the stored results.
+        ttl: The time-to-live of a result in seconds, None to keep results until evicted.
+    """
+
+    def __init__(self, max_bytes: int = InferenceCacheConfig.MAX_BYTES, ttl: float | None = InferenceCacheConfig.TTL):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.size = 0
+        self.metrics = CacheMetrics()
+
+    def get(self, key: bytes) -> np.ndarray | None:
+        entry = self.entries.get(key)
+        if entry is None:
+            self.metrics.misses += 1
+            return None
+        if entry.expires_at < time.monotonic():
+            self.metrics.misses += 1
+            self.metrics.expirations += 1
+            self.remove(key)
+            return None
+        self.metrics.hits += 1
+        self.metrics.saved_time += entry.compute_time
+        self.entries.move_to_end(key)
+        return read_only(entry.value)
+
+    def put(self, key: bytes, value: np.ndarray, compute_time: float = 0.0) -> None:
+        size = value.nbytes
+        if size > self.max_bytes:
+            return
+        if key in self.entries:
+            self.remove(key)
+        expires_at = float('inf') if self.ttl is None else time.monotonic() + self.ttl
+        self.entries[key] = CacheEntry(value=value, size=size, compute_time=compute_time, expires_at=expires_at)
+        self.size += size
+        while self.size > self.max_bytes:
+            self.remove(next(iter(self.entries)))
+            self.metrics.evictions += 1
+
+    def remove(self, key: bytes) -> None:
+        self.size -= self.entries.pop(key).size
+
+    def get_or_compute(self, key: bytes, compute: Callable[[], np.ndarray]) -> np.ndarray:
+        """Get the cached result of a request, computing and storing it on a miss."""
+        value = self.get(key)
+        if value is None:
+            start_time = time.perf_counter()
+            value = np.asarray(compute())
+            self.put(key, value, compute_time=time.perf_counter() - start_time)
+            value = read_only(value)
+        return value
+
+    def get_metrics(self) -> dict:
+        logger.debug(f"Inference cache hit ratio: {self.metrics.hit_ratio:.2%}, saved {self.metrics.saved_time:.4f}s")
+        return {**self.metrics.__dict__, "hit_ratio": self.metrics.hit_ratio, "size": self.size}
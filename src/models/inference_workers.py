@@ -0,0 +1,317 @@
+import itertools
+import multiprocessing
+import queue
+import threading
+from collections import deque
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from multiprocessing.shared_memory import SharedMemory
+from typing import Callable
+
+import numpy as np
+
+from src.logger.log import get_logger
+from src.models.model_manager_config import InferenceWorkersConfig
+
+logger = get_logger("models")
+
+
+class SharedTensorRing:
+    """Fixed-size tensor slots in a shared memory block, used to hand tensors over between processes.
+
+    Only the tensor metadata (slot, shape, dtype) goes through the queues, the data is copied once
+    into the slot and once out of it instead of being pickled.
+
+    Args:
+        slots: The number of slots.
+        slot_size: The size in bytes of each slot.
+        name: The name of an existing shared memory block to attach to, None to create a new one.
+    """
+
+    def __init__(self, slots: int, slot_size: int, name: str | None = None):
+        self.slots = slots
+        self.slot_size = slot_size
+        self.shared_memory = SharedMemory(name=name, create=name is None, size=slots * slot_size)
+
+    @property
+    def name(self) -> str:
+        return self.shared_memory.name
+
+    def write(self, slot: int, tensor: np.ndarray) -> tuple[tuple, str]:
+        """Write a tensor into a slot and return its shape and dtype."""
+        tensor = np.ascontiguousarray(tensor)
+        if tensor.nbytes > self.slot_size:
+            raise ValueError(f"Tensor of {tensor.nbytes} bytes does not fit in a {self.slot_size} bytes slot")
+        view = np.ndarray(tensor.shape, dtype=tensor.dtype, buffer=self.shared_memory.buf,
+                          offset=slot * self.slot_size)
+        view[...] = tensor
+        return tensor.shape, tensor.dtype.str
+
+    def read(self, slot: int, shape: tuple, dtype: str) -> np.ndarray:
+        """Read a copy of the tensor stored in a slot."""
+        return np.ndarray(shape, dtype=dtype, buffer=self.shared_memory.buf, offset=slot * self.slot_size).copy()
+
+    def close(self, unlink: bool = False) -> None:
+        self.shared_memory.close()
+        if unlink:
+            self.shared_memory.unlink()
+
+
+def load_model_predictor(model_path: str, exit_layers: tuple = ()) -> Callable:
+    """Load a model and its early exit heads in the worker process and return its tail prediction function."""
+    from src.models.model_manager import ModelManager
+    model_manager = ModelManager(model_path=model_path)
+    model_manager.load_model(model_path)
+    if exit_layers:
+        model_manager.load_exit_heads(exit_layers=exit_layers)
+    return model_manager.predict_tail
+
+
+def _worker_main(
+        worker_id: int,
+        model_path: str,
+        predictor_factory: Callable,
+        slots: int,
+        slot_size: int,
+        request_ring_name: str,
+        response_ring_name: str,
+        request_queue: multiprocessing.Queue,
+        response_queue: multiprocessing.Queue
+) -> None:
+    """Inference worker loop: read a request tensor, predict the tail, write the response tensor.
+
+    The exit layer taken by the tail, if any, is sent back with the response tensor.
+    A failure to load the model is reported with a None request id before the worker exits.
+    """
+    request_ring = SharedTensorRing(slots, slot_size, name=request_ring_name)
+    response_ring = SharedTensorRing(slots, slot_size, name=response_ring_name)
+    try:
+        predict = predictor_factory(model_path)
+    except Exception as e:
+        response_queue.put((worker_id, None, None, None, None, None, repr(e)))
+        request_ring.close()
+        response_ring.close()
+        raise
+    try:
+        while (request := request_queue.get()) is not None:
+            request_id, slot, start_layer_id, shape, dtype = request
+            try:
+                prediction, exit_layer = predict(start_layer_id, request_ring.read(slot, shape, dtype))
+                shape, dtype = response_ring.write(slot, np.asarray(prediction))
+                response_queue.put((worker_id, request_id, slot, shape, dtype, exit_layer, None))
+            except Exception as e:
+                response_queue.put((worker_id, request_id, slot, None, None, None, repr(e)))
+    finally:
+        request_ring.close()
+        response_ring.close()
+
+
+@dataclass
+class InferenceWorker:
+    worker_id: int
+    request_ring: SharedTensorRing
+    response_ring: SharedTensorRing
+    free_slots: deque
+    process: multiprocessing.Process = None
+    request_queue: multiprocessing.Queue = None
+    # request id -> (future, slot)
+    in_flight: dict = field(default_factory=dict)
+    completed: int = 0
+    restarts: int = 0
+    # restarts since the last completed request, the worker is given up past the maximum
+    consecutive_restarts: int = 0
+    failed: bool = False
+    error: str | None = None
+
+
+class InferenceWorkerPool:
+    """Pool of inference processes, each holding its own loaded model.
+
+    Requests are scheduled on the least loaded alive worker, tensors are handed over through
+    per-worker shared memory rings, and dead workers are restarted, failing their in-flight requests.
+    A worker restarted max_restarts times in a row without completing a request (e.g. its model
+    fails to load) is given up, and once every worker is given up the requests are refused.
+
+    Args:
+        model_path: The path to the model loaded by each worker.
+        num_workers: The number of worker processes.
+        slots_per_worker: The maximum number of in-flight requests per worker.
+        slot_size: The maximum size in bytes of a request or response tensor.
+        predictor_factory: A picklable function loading the model and returning the prediction function,
+            returning the output of the tail and its exit layer (None without early exit).
+        max_restarts: The restarts of a worker in a row before it is given up.
+    """
+
+    def __init__(
+            self,
+            model_path: str,
+            num_workers: int = InferenceWorkersConfig.NUM_WORKERS,
+            slots_per_worker: int = InferenceWorkersConfig.SLOTS_PER_WORKER,
+            slot_size: int = InferenceWorkersConfig.SLOT_SIZE,
+            predictor_factory: Callable = load_model_predictor,
+            max_restarts: int = InferenceWorkersConfig.MAX_RESTARTS
+    ):
+        self.model_path = model_path
+        self.num_workers = num_workers
+        self.slots_per_worker = slots_per_worker
+        self.slot_size = slot_size
+        self.predictor_factory = predictor_factory
+        self.max_restarts = max_restarts
+        # spawn the workers, forking a process with an initialized tensorflow runtime is not safe
+        self.context = multiprocessing.get_context("spawn")
+        self.response_queue = None
+        self.workers = []
+        self.request_ids = itertools.count()
+        self.lock = threading.Lock()
+        self.running = False
+        self.collector = None
+
+    def start(self) -> None:
+        logger.debug(f"Starting {self.num_workers} inference workers")
+        self.response_queue = self.context.Queue()
+        for worker_id in range(self.num_workers):
+            worker = InferenceWorker(
+                worker_id=worker_id,
+                request_ring=SharedTensorRing(self.slots_per_worker, self.slot_size),
+                response_ring=SharedTensorRing(self.slots_per_worker, self.slot_size),
+                free_slots=deque(range(self.slots_per_worker)),
+            )
+            self.start_worker(worker)
+            self.workers.append(worker)
+        self.running = True
+        self.collector = threading.Thread(target=self.collect_responses, daemon=True)
+        self.collector.start()
+
+    def start_worker(self, worker: InferenceWorker) -> None:
+        worker.request_queue = self.context.Queue()
+        worker.process = self.context.Process(
+            target=_worker_main,
+            args=(
+                worker.worker_id, self.model_path, self.predictor_factory, self.slots_per_worker, self.slot_size,
+                worker.request_ring.name, worker.response_ring.name, worker.request_queue, self.response_queue
+            ),
+            daemon=True
+        )
+        worker.process.start()
+
+    def submit(self, start_layer_id: int, tensor: np.ndarray) -> Future:
+        """Submit a tail inference request.
+        Args:
+            start_layer_id: The id of the first layer to compute.
+            tensor: The input tensor of the first layer.
+        Returns:
+            The future of the prediction and of its exit layer, None if no exit was taken.
+        Raises:
+            RuntimeError: If every worker is dead or has no free slot, or if every worker was given up.
+        """
+        future = Future()
+        with self.lock:
+            if self.is_failed():
+                raise RuntimeError(f"Inference worker pool failed: {self.workers[0].error}")
+            available_workers = [w for w in self.workers if w.free_slots and w.process.is_alive()]
+            if not available_workers:
+                raise RuntimeError("No inference worker available")
+            worker = min(available_workers, key=lambda w: len(w.in_flight))
+            slot = worker.free_slots.popleft()
+            try:
+                shape, dtype = worker.request_ring.write(slot, tensor)
+            except ValueError:
+                worker.free_slots.append(slot)
+                raise
+            request_id = next(self.request_ids)
+            worker.in_flight[request_id] = (future, slot)
+        worker.request_queue.put((request_id, slot, start_layer_id, shape, dtype))
+        return future
+
+    def predict(self, start_layer_id: int, tensor: np.ndarray,
+                timeout: float | None = None) -> tuple[np.ndarray, int | None]:
+        return self.submit(start_layer_id, tensor).result(timeout=timeout)
+
+    def predict_tail(self, start_layer_id: int, tensor: np.ndarray) -> tuple[np.ndarray, int | None]:
+        """Predict the tail of the model in a worker, as ModelManager.predict_tail does in process."""
+        return self.predict(start_layer_id, tensor, timeout=InferenceWorkersConfig.PREDICT_TIMEOUT)
+
+    def collect_responses(self) -> None:
+        """Resolve the futures of the completed requests and restart the dead workers."""
+        while self.running:
+            try:
+                worker_id, request_id, slot, shape, dtype, exit_layer, error = self.response_queue.get(
+                    timeout=InferenceWorkersConfig.HEALTH_CHECK_INTERVAL
+                )
+            except queue.Empty:
+                self.check_health()
+                continue
+            except (EOFError, OSError):
+                break
+            worker = self.workers[worker_id]
+            if request_id is None:
+                logger.error(f"Inference worker {worker_id} failed to start: {error}")
+                worker.error = error
+                continue
+            with self.lock:
+                future, _ = worker.in_flight.pop(request_id, (None, None))
+                if future is None:
+                    # the request was failed when the worker was restarted
+                    continue
+                result = None if error else worker.response_ring.read(slot, shape, dtype)
+                worker.free_slots.append(slot)
+                worker.completed += 1
+                worker.consecutive_restarts = 0
+            if error:
+                future.set_exception(RuntimeError(f"Inference worker {worker_id} failed: {error}"))
+            else:
+                future.set_result((result, exit_layer))
+            self.check_health()
+
+    def check_health(self) -> None:
+        for worker in self.workers:
+            if not self.running or worker.failed or worker.process.is_alive():
+                continue
+            logger.error(f"Inference worker {worker.worker_id} died with exit code {worker.process.exitcode}")
+            with self.lock:
+                failed_requests = list(worker.in_flight.values())
+                worker.in_flight.clear()
+                worker.free_slots = deque(range(self.slots_per_worker))
+                worker.error = worker.error or f"exit code {worker.process.exitcode}"
+                if worker.consecutive_restarts >= self.max_restarts:
+                    logger.error(f"Inference worker {worker.worker_id} given up after {worker.restarts} restarts")
+                    worker.failed = True
+                else:
+                    worker.restarts += 1
+                    worker.consecutive_restarts += 1
+                    self.start_worker(worker)
+            for future, _ in failed_requests:
+                future.set_exception(RuntimeError(f"Inference worker {worker.worker_id} died"))
+
+    def is_failed(self) -> bool:
+        """Whether every worker was given up, the pool cannot serve any request."""
+        return bool(self.workers) and all(worker.failed for worker in self.workers)
+
+    def stop(self) -> None:
+        logger.debug("Stopping the inference workers")
+        self.running = False
+        for worker in self.workers:
+            worker.request_queue.put(None)
+        for worker in self.workers:
+            worker.process.join(timeout=InferenceWorkersConfig.HEALTH_CHECK_INTERVAL * 5)
+            if worker.process.is_alive():
+                worker.process.terminate()
+        if self.collector is not None:
+            self.collector.join()
+        for worker in self.workers:
+            worker.request_ring.close(unlink=True)
+            worker.response_ring.close(unlink=True)
+        self.workers = []
+
+    def get_metrics(self) -> list[dict]:
+        return [
+            {
+                "worker_id": worker.worker_id,
+                "alive": worker.process.is_alive(),
+                "in_flight": len(worker.in_flight),
+                "completed": worker.completed,
+                "restarts": worker.restarts,
+                "failed": worker.failed,
+            }
+            for worker in self.workers
+        ]
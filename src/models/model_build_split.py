@@ -1,11 +1,23 @@
+import argparse
+import hashlib
+import json
+import multiprocessing
 import os
+from concurrent.futures import ProcessPoolExecutor
 
+import numpy as np
 import tensorflow as tf
 from tensorflow.keras import Input
 from tensorflow.keras import layers
 from tensorflow.keras.models import Model
 
-from model_manager_config import ModelManagerConfig
+from src.logger.log import get_logger
+from src.models.model_manager_config import ModelManagerConfig
+
+logger = get_logger("models")
+
+# decimal literal of every byte value, used to stream the C headers
+_BYTE_LITERALS = [str(b) for b in range(256)]
 
 
 def init_folders(root_folder: str) -> None:
@@ -32,21 +44,279 @@ def load_keras(name: str, dir_path: str) -> Model:
     return tf.keras.models.load_model(f'{dir_path}/{name}.keras')
 
 
-def create_keras_submodels(save_dir: str, model: Model) -> dict:
-    submodels = {}
-    # start with the input tensor
-    input_tensor = Input(shape=model.input_shape[1:])
+def layer_content_hash(layer: layers.Layer) -> str:
+    """Compute a content hash of a layer from its config, input shape and weights.
+    Args:
+        layer: A built Keras layer.
+    Returns:
+        The hex digest of the layer content.
+    """
+    digest = hashlib.sha256()
+    digest.update(type(layer).__name__.encode())
+    digest.update(json.dumps(layer.get_config(), sort_keys=True, default=str).encode())
+    digest.update(str(tuple(layer.input.shape)).encode())
+    for weight in layer.get_weights():
+        digest.update(str(weight.shape).encode())
+        digest.update(weight.tobytes())
+    return digest.hexdigest()
+
+
+def segment_name(start_layer: int, end_layer: int) -> str:
+    return f"segment_{start_layer}_{end_layer}"
+
+
+def segment_header_names(start_layer: int, end_layer: int) -> tuple[str, str]:
+    """The header file name (without '.h') and the C array name of a segment.
+
+    Single-layer segments keep the names of the previous per-layer builds, included by the device
+    firmware: 'layer_{i}.h' declaring the array 'layer_{i-1}'. Multi-layer segments, which the
+    firmware does not know, are named after the segment.
+    """
+    if start_layer == end_layer:
+        return f"layer_{start_layer}", f"layer_{start_layer - 1}"
+    name = segment_name(start_layer, end_layer)
+    return name, name
+
+
+def get_segment_boundaries(num_layers: int, segment_size: int = 1) -> list[tuple[int, int]]:
+    """Split the layers of a model into consecutive, inclusive (start, end) ranges.
+    Args:
+        num_layers: The number of layers in the model.
+        segment_size: The number of layers in each segment.
+    Returns:
+        The list of (start_layer, end_layer) ranges.
+    """
+    return [
+        (start, min(start + segment_size, num_layers) - 1)
+        for start in range(0, num_layers, segment_size)
+    ]
+
+
+def create_keras_segment(model: Model, start_layer: int, end_layer: int) -> Model:
+    """Create a model that contains only the layers start_layer..end_layer (inclusive).
+    Args:
+        model: The full sequential model.
+        start_layer: The index of the first layer of the segment.
+        end_layer: The index of the last layer of the segment.
+    Returns:
+        The segment model, taking the output of start_layer - 1 as input.
+    """
+    input_tensor = Input(shape=model.layers[start_layer].input.shape[1:])
     x = input_tensor
-    # iterate through layers and create submodels
-    for i, layer in enumerate(model.layers):
-        # pass the input tensor through each layer sequentially
+    for layer in model.layers[start_layer:end_layer + 1]:
         x = layer(x)
-        # create the submodel from the input tensor to the current layer's output
-        submodel = Model(inputs=input_tensor, outputs=x)
-        submodels[layer.name] = submodel
-        # save each submodel to a file
-        submodel.save(f'{save_dir}/submodel_{i}.keras')
-    return submodels
+    return Model(inputs=input_tensor, outputs=x, name=segment_name(start_layer, end_layer))
+
+
+def exit_head_name(exit_layer: int) -> str:
+    return f"exit_{exit_layer}"
+
+
+def build_exit_head(model: Model, exit_layer: int, num_classes: int | None = None,
+                    seed: int = ModelManagerConfig.EXIT_HEAD_SEED) -> Model:
+    """Create an untrained early exit classifier on the output of a layer.
+
+    The layers are named after the exit and initialized from the seed, so that the same head is
+    built with the same content hash. The head must be trained with train_exit_heads before use.
+
+    Args:
+        model: The full sequential model.
+        exit_layer: The index of the layer whose output feeds the exit.
+        num_classes: The number of classes, the ones of the model output by default.
+        seed: The seed of the initial weights.
+    Returns:
+        The exit head, taking the output of exit_layer as input and returning the class probabilities.
+    """
+    name = exit_head_name(exit_layer)
+    num_classes = num_classes or model.output_shape[-1]
+    input_tensor = Input(shape=model.layers[exit_layer].output.shape[1:], name=f"{name}_input")
+    # pool the feature maps so that the head stays small enough for the device
+    if len(input_tensor.shape) == 4:
+        x = layers.GlobalAveragePooling2D(name=f"{name}_pooling")(input_tensor)
+    else:
+        x = layers.Flatten(name=f"{name}_flatten")(input_tensor)
+    outputs = layers.Dense(
+        num_classes, activation='softmax', name=f"{name}_dense",
+        kernel_initializer=tf.keras.initializers.GlorotUniform(seed=seed + exit_layer)
+    )(x)
+    return Model(inputs=input_tensor, outputs=outputs, name=name)
+
+
+def attach_exit_heads(model: Model, exit_layers: tuple = ModelManagerConfig.EXIT_LAYERS,
+                      num_classes: int | None = None) -> dict:
+    """Create the untrained early exit heads of a model, mapping each exit layer to its head."""
+    return {exit_layer: build_exit_head(model, exit_layer, num_classes) for exit_layer in exit_layers}
+
+
+def train_exit_heads(model: Model, exit_heads: dict, x, y=None,
+                     epochs: int = ModelManagerConfig.EXIT_TRAINING_EPOCHS, batch_size: int = 32) -> dict:
+    """Train the early exit heads on the outputs of their layer, the model itself is left unchanged.
+    Args:
+        model: The full sequential model.
+        exit_heads: The trained early exit heads, mapping each exit layer to its head.
+        x: The training inputs of the model.
+        y: The class labels, the classes predicted by the full model by default (self-distillation).
+        epochs: The training epochs of each head.
+        batch_size: The training batch size.
+    Returns:
+        The trained exit heads.
+    """
+    if y is None:
+        predictions = model.predict(x, verbose=0)
+        # average the spatial class scores of a model without a pooled classifier
+        y = predictions.reshape(len(predictions), -1, predictions.shape[-1]).mean(axis=1).argmax(axis=-1)
+    for exit_layer, exit_head in exit_heads.items():
+        features = Model(inputs=model.inputs, outputs=model.layers[exit_layer].output).predict(x, verbose=0)
+        exit_head.compile(optimizer='adam', loss='sparse_categorical_crossentropy')
+        exit_head.fit(features, y, epochs=epochs, batch_size=batch_size, shuffle=False, verbose=0)
+    return exit_heads
+
+
+def load_exit_dataset(file_path: str) -> tuple:
+    """Load the samples the early exit heads are trained on.
+    Args:
+        file_path: A '.npz' file with the model inputs 'x' and, optionally, their class labels 'y'.
+    Returns:
+        The inputs and the labels, None without labels.
+    """
+    with np.load(file_path) as dataset:
+        return dataset["x"], dataset["y"] if "y" in dataset.files else None
+
+
+def exit_head_hash(exit_head: Model) -> str:
+    layer_hashes = [layer_content_hash(layer) for layer in exit_head.layers if not isinstance(layer, layers.InputLayer)]
+    return hashlib.sha256("".join(layer_hashes).encode()).hexdigest()
+
+
+def load_manifest(manifest_path: str) -> dict:
+    if not os.path.isfile(manifest_path):
+        return {}
+    with open(manifest_path, 'r') as f:
+        return json.load(f)
+
+
+def save_manifest(manifest_path: str, manifest: dict) -> None:
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f, indent=4)
+
+
+def write_c_header(tflite_path: str, header_path: str, array_name: str, chunk_size: int = 4096) -> None:
+    """Stream a '.tflite' file into a C header without building the whole array string in memory.
+    Args:
+        tflite_path: The path to the '.tflite' file.
+        header_path: The path of the header to write.
+        array_name: The name of the C array.
+        chunk_size: The number of bytes converted per write.
+    Returns:
+        None
+    """
+    with open(tflite_path, 'rb') as tflite_file, open(header_path, 'w') as header_file:
+        header_file.write('#pragma once\n\n')
+        header_file.write('#include <cstdint>\n\n')
+        header_file.write(f'const uint8_t {array_name}[] = {{\n')
+        separator = ""
+        while chunk := tflite_file.read(chunk_size):
+            header_file.write(separator)
+            header_file.write(", ".join(_BYTE_LITERALS[b] for b in chunk))
+            separator = ",\n"
+        header_file.write('\n};\n')
+
+
+def _convert_segment(root_folder: str, name: str, header_name: str, array_name: str) -> str:
+    """Convert a stored '.keras' segment to '.tflite' and '.h', used as a process pool task."""
+    keras_model = load_keras(name=name, dir_path=f"{root_folder}/layers/keras")
+    to_tflite(keras_model, save=True, save_dir=f"{root_folder}/layers/tflite", name=name)
+    write_c_header(
+        tflite_path=f"{root_folder}/layers/tflite/{name}.tflite",
+        header_path=f"{root_folder}/layers/h/{header_name}.h",
+        array_name=array_name,
+        chunk_size=ModelManagerConfig.HEADER_CHUNK_SIZE
+    )
+    return name
+
+
+def _segment_artifacts_exist(root_folder: str, name: str, header_name: str) -> bool:
+    return all(
+        os.path.isfile(artifact_path) for artifact_path in (
+            f"{root_folder}/layers/keras/{name}.keras",
+            f"{root_folder}/layers/tflite/{name}.tflite",
+            f"{root_folder}/layers/h/{header_name}.h",
+        )
+    )
+
+
+def build_split_artifacts(
+        model: Model,
+        root_folder: str,
+        segment_size: int = 1,
+        max_workers: int | None = ModelManagerConfig.BUILD_WORKERS,
+        exit_heads: dict | None = None,
+        exit_threshold: float = ModelManagerConfig.EXIT_THRESHOLD
+) -> dict:
+    """Build the '.keras', '.tflite' and '.h' artifacts of every model segment and early exit head.
+
+    Segments whose content hash matches the manifest of the previous build and whose artifacts
+    are still on disk are skipped, the others are converted in a process pool. The headers of the
+    single-layer segments keep the firmware names, see segment_header_names.
+
+    Args:
+        model: The full sequential model.
+        root_folder: The model folder, containing the 'layers/' artifacts folders.
+        segment_size: The number of layers in each segment.
+        max_workers: The number of conversion processes, None to use all the cores.
+        exit_heads: The trained early exit heads, mapping each exit layer to its head.
+        exit_threshold: The confidence needed to stop at an exit, stored with the heads.
+    Returns:
+        The manifest, mapping each segment name to its content hash, layer range and header names,
+        and each exit head name to its content hash, exit layer, threshold and header names.
+    """
+    init_folders(root_folder)
+    manifest_path = f"{root_folder}/layers/{ModelManagerConfig.SEGMENTS_MANIFEST}"
+    previous_manifest = load_manifest(manifest_path)
+    layer_hashes = [layer_content_hash(layer) for layer in model.layers]
+
+    manifest = {}
+    stale_segments = []
+    for start_layer, end_layer in get_segment_boundaries(len(model.layers), segment_size):
+        name = segment_name(start_layer, end_layer)
+        header_name, array_name = segment_header_names(start_layer, end_layer)
+        segment_hash = hashlib.sha256("".join(layer_hashes[start_layer:end_layer + 1]).encode()).hexdigest()
+        manifest[name] = {"start_layer": start_layer, "end_layer": end_layer, "hash": segment_hash,
+                          "header": header_name, "array": array_name}
+        if (previous_manifest.get(name, {}).get("hash") == segment_hash
+                and _segment_artifacts_exist(root_folder, name, header_name)):
+            logger.debug(f"Skipped unchanged segment: {name}")
+            continue
+        save_keras(name=name, model=create_keras_segment(model, start_layer, end_layer),
+                   dir_path=f"{root_folder}/layers/keras")
+        stale_segments.append(name)
+
+    for exit_layer, exit_head in (exit_heads or {}).items():
+        name = exit_head_name(exit_layer)
+        head_hash = exit_head_hash(exit_head)
+        manifest[name] = {"exit_layer": exit_layer, "threshold": exit_threshold, "hash": head_hash,
+                          "header": name, "array": name}
+        if (previous_manifest.get(name, {}).get("hash") == head_hash
+                and _segment_artifacts_exist(root_folder, name, name)):
+            logger.debug(f"Skipped unchanged exit head: {name}")
+            continue
+        save_keras(name=name, model=exit_head, dir_path=f"{root_folder}/layers/keras")
+        stale_segments.append(name)
+
+    # spawn the workers, forking a process with an initialized tensorflow runtime is not safe
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+        converted_segments = executor.map(
+            _convert_segment,
+            [root_folder] * len(stale_segments),
+            stale_segments,
+            [manifest[name]["header"] for name in stale_segments],
+            [manifest[name]["array"] for name in stale_segments],
+        )
+        for name in converted_segments:
+            logger.debug(f"Created [tflite] and [h] segment: {name}")
+
+    save_manifest(manifest_path, manifest)
+    return manifest
 
 
 def build_resnet_from_scratch(img_height=10, img_width=10, num_classes=5) -> Model:
@@ -62,7 +332,30 @@ def build_resnet_from_scratch(img_height=10, img_width=10, num_classes=5) -> Mod
     return resnet_model
 
 
+def build_residual_resnet(img_height=10, img_width=10, num_classes=5) -> Model:
+    """Build a functional ResNet with a residual block, whose layers form a non-sequential graph."""
+    inputs = Input(shape=(img_height, img_width, 3))
+    x = layers.Conv2D(64, kernel_size=7, strides=2, padding='same')(inputs)
+    x = layers.BatchNormalization()(x)
+    shortcut = layers.ReLU()(x)
+    # residual block
+    x = layers.Conv2D(64, kernel_size=3, padding='same')(shortcut)
+    x = layers.BatchNormalization()(x)
+    x = layers.ReLU()(x)
+    x = layers.Conv2D(64, kernel_size=3, padding='same')(x)
+    x = layers.BatchNormalization()(x)
+    x = layers.Add()([x, shortcut])
+    x = layers.ReLU()(x)
+    x = layers.MaxPooling2D(pool_size=3, strides=2, padding='same')(x)
+    outputs = layers.Dense(num_classes, activation='softmax')(x)
+    return Model(inputs=inputs, outputs=outputs, name="residual_resnet")
+
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the resnet model and its split artifacts")
+    parser.add_argument("--exit-dataset", default=None,
+                        help="'.npz' samples training the early exit heads, the heads are not built without it")
+    args = parser.parse_args()
 
     # initialize folders
     main_folder = "test/" + ModelManagerConfig.MODEL_DIR_PATH
@@ -77,28 +370,13 @@ if __name__ == "__main__":
     # load the model
     model = load_keras(name="resnet_model", dir_path=main_folder)
 
-    # creates and save submodels '.tflite'
-    print("creating submodels ...")
-    submodels = create_keras_submodels(model=model, save_dir=f"{main_folder}/layers/keras")
-
-    # creates and save submodels '.h'
-    for layer_index, item in enumerate(submodels.items()):
-        model_name, model = item
-        # convert the model content to a C array format
-        print(f"created [tflite] submodel for layer: {layer_index}")
-        tflite_bytes = to_tflite(model, save=True, save_dir=f"{main_folder}/layers/tflite",
-                                 name=f"submodel_{layer_index}")
-
-        # convert the model content to a C array format
-        model_array = ", ".join([str(b) for b in tflite_bytes])
-
-        # write the C header file
-        print(f"created [h] submodel for layer: {layer_index}")
-        with open(f'{main_folder}/layers/h/layer_{layer_index}.h', 'w') as header_file:
-            header_file.write('#pragma once\n\n')
-            header_file.write('#include <cstdint>\n\n')
-            header_file.write('const uint8_t layer_' + str(layer_index - 1) + '[] = {\n')
-            header_file.write(model_array)
-            header_file.write('\n};\n')
+    # creates and save the segments and exit heads '.keras', '.tflite' and '.h', skipping the unchanged ones
+    print("creating segments ...")
+    exit_heads = None
+    if args.exit_dataset is not None:
+        print("training exit heads ...")
+        x, y = load_exit_dataset(args.exit_dataset)
+        exit_heads = train_exit_heads(model, attach_exit_heads(model), x, y)
+    build_split_artifacts(model=model, root_folder=main_folder, exit_heads=exit_heads)
 
     print(model.summary())
@@ -0,0 +1,130 @@
+import numpy as np
+import tensorflow as tf
+
+from src.offloading_algo.graph_offloading_algo import GraphCut, LayerNode
+
+
+def _get_history_names(inbound_node) -> list[str]:
+    """Get the names of the layers producing the tensors of a serialized inbound node, in call order.
+
+    Handles both the tf.keras 2 format, a list of [layer name, node index, tensor index, kwargs]
+    entries, and the Keras 3 format, whose serialized tensors carry their keras history.
+    """
+    if isinstance(inbound_node, dict):
+        if "keras_history" in inbound_node:
+            return [inbound_node["keras_history"][0]]
+        return [name for value in inbound_node.values() for name in _get_history_names(value)]
+    if isinstance(inbound_node, (list, tuple)):
+        if len(inbound_node) >= 3 and isinstance(inbound_node[0], str) and isinstance(inbound_node[1], int):
+            return [inbound_node[0]]
+        return [name for value in inbound_node for name in _get_history_names(value)]
+    return []
+
+
+def get_inbound_layers(model: tf.keras.Model) -> dict[str, list[str]]:
+    """Get the names of the layers feeding each layer of a functional (or sequential) model.
+
+    The graph is read from the public model config, which only lists the nodes of this model, so
+    layers also called by other models (e.g. exported sub-graphs) are still supported.
+
+    Args:
+        model: The Keras model.
+    Returns:
+        The names of the inbound layers of each layer, in call order.
+    """
+    if isinstance(model, tf.keras.Sequential):
+        names = [layer.name for layer in model.layers]
+        return {name: names[index - 1:index] for index, name in enumerate(names)}
+    inbound_layers = {}
+    for layer_config in model.get_config()["layers"]:
+        inbound_nodes = layer_config.get("inbound_nodes", [])
+        if len(inbound_nodes) > 1:
+            raise ValueError(f"Shared layers are not supported: {layer_config['name']}")
+        inbound_layers[layer_config["name"]] = _get_history_names(inbound_nodes[0]) if inbound_nodes else []
+    return inbound_layers
+
+
+def get_output_size_in_bytes(layer: tf.keras.layers.Layer) -> float:
+    """Calculate the size in bytes of a single-sample layer output from its symbolic shape."""
+    output = layer.output
+    return float(np.prod(output.shape[1:]) * tf.as_dtype(output.dtype).size)
+
+
+def get_layer_flops(layer: tf.keras.layers.Layer) -> float:
+    """Estimate the floating point operations of a single-sample forward pass of a layer.
+
+    The layers with a kernel do a multiply-add per kernel weight feeding each output element, the
+    other layers are counted as one operation per output element.
+    """
+    output_elements = float(np.prod(layer.output.shape[1:]))
+    if getattr(layer, "depthwise_kernel", None) is not None:
+        return 2 * output_elements * float(np.prod(layer.depthwise_kernel.shape[:-2]))
+    if getattr(layer, "kernel", None) is not None:
+        return 2 * output_elements * float(np.prod(layer.kernel.shape[:-1]))
+    return output_elements
+
+
+def get_param_size_in_bytes(layer: tf.keras.layers.Layer) -> float:
+    return float(sum(np.prod(weight.shape) * tf.as_dtype(weight.dtype).size for weight in layer.weights))
+
+
+def extract_layer_features(model: tf.keras.Model) -> dict:
+    """Extract the features the device timing model predicts the time of each layer from."""
+    return {
+        f"layer_{layer_index}": {
+            "flops": get_layer_flops(layer),
+            "param_bytes": get_param_size_in_bytes(layer),
+            "output_bytes": get_output_size_in_bytes(layer),
+        }
+        for layer_index, layer in enumerate(model.layers)
+    }
+
+
+def extract_layer_graph(model: tf.keras.Model) -> list[LayerNode]:
+    """Extract the layer graph of a functional (or sequential) Keras model.
+    Args:
+        model: The Keras model, its layers are expected in topological order.
+    Returns:
+        The list of layer nodes, in the same order as model.layers.
+    """
+    inbound_layers = get_inbound_layers(model)
+    return [
+        LayerNode(name=layer.name, inbound=inbound_layers[layer.name], output_size=get_output_size_in_bytes(layer))
+        for layer in model.layers
+    ]
+
+
+def export_cut_subgraphs(model: tf.keras.Model, cut: GraphCut) -> tuple[tf.keras.Model, tf.keras.Model]:
+    """Export the device and edge sub-graphs of a model for the given cut.
+
+    The device model outputs every tensor crossing the cut, the edge model takes them as inputs
+    (in the same order) and replays the remaining layers up to the model output. The edge layers
+    are replayed from a clone of the model, calling the original layers would add nodes to them.
+
+    Args:
+        model: The functional Keras model.
+        cut: The cut to export.
+    Returns:
+        The device model and the edge model.
+    """
+    layers_by_name = {layer.name: layer for layer in model.layers}
+    device_model = tf.keras.Model(
+        inputs=model.inputs,
+        outputs=[layers_by_name[name].output for name in cut.tensors],
+        name=f"device_{cut.last_device_layer}"
+    )
+
+    # new inputs for the tensors crossing the cut, then replay the edge layers on top of them
+    edge_inputs = [
+        tf.keras.Input(shape=layers_by_name[name].output.shape[1:], name=f"{name}_cut") for name in cut.tensors
+    ]
+    inbound_layers = get_inbound_layers(model)
+    model_clone = tf.keras.models.clone_model(model)
+    model_clone.set_weights(model.get_weights())
+    tensors = dict(zip(cut.tensors, edge_inputs))
+    for layer in model_clone.layers[cut.last_device_layer + 1:]:
+        inbound_tensors = [tensors[name] for name in inbound_layers[layer.name]]
+        tensors[layer.name] = layer(inbound_tensors[0] if len(inbound_tensors) == 1 else inbound_tensors)
+    edge_outputs = tensors[model_clone.layers[-1].name]
+    edge_model = tf.keras.Model(inputs=edge_inputs, outputs=edge_outputs, name=f"edge_{cut.last_device_layer}")
+    return device_model, edge_model
@@ -1,12 +1,21 @@
 import json
+import os
 import time
 from functools import wraps
 
+import numpy as np
 import tensorflow as tf
 
-from src.logger.log import logger
+from src.logger.log import get_logger
 from src.models.model_manager_config import ModelManagerConfig
 from src.commons import OffloadingDataFiles
+from src.models.inference_cache import InferenceCache, get_tensor_key
+from src.models.model_graph import extract_layer_graph
+from src.offloading_algo.exit_statistics import ExitStatistics
+from src.offloading_algo.graph_offloading_algo import LayerNode
+
+logger = get_logger("models")
+
 
 def track_inference_time(func):
     """
@@ -37,6 +46,8 @@ class ModelManager:
     Args:
         save_path: The path to save the model.
         model_path: The path to the model.
+        inference_cache: The optional cache of the tail inference results.
+        exit_statistics: The optional exit statistics updated by the early exit predictions.
 
     Attributes:
         save_path: The path to save the model.
@@ -44,15 +55,26 @@ class ModelManager:
         num_layers: The number of layers in the model.
         model: The model.
         inference_times: A dictionary to store the inference times for each layer.
+        inference_cache: The cache of the tail inference results, None if disabled.
+        exit_heads: The early exit heads, mapping each exit layer to its head and confidence threshold.
     """
 
-    def __init__(self, save_path: str = ModelManagerConfig.SAVE_PATH, model_path: str = ModelManagerConfig.MODEL_PATH):
+    def __init__(
+            self,
+            save_path: str = ModelManagerConfig.SAVE_PATH,
+            model_path: str = ModelManagerConfig.MODEL_PATH,
+            inference_cache: InferenceCache | None = None,
+            exit_statistics: ExitStatistics | None = None
+    ):
         self.save_path = save_path
         self.model_path = model_path
         self.num_layers = None
         self.model = None
         # dictionary to store inference times for each layer
         self.inference_times = {}
+        self.inference_cache = inference_cache
+        self.exit_heads = {}
+        self.exit_statistics = exit_statistics
 
     def load_model(self, model_path: str = ModelManagerConfig.MODEL_PATH):
         """Load the model from the given path.
@@ -79,6 +101,13 @@ class ModelManager:
         """
         return self.model.layers[layer_id]
 
+    def get_layer_graph(self) -> list[LayerNode]:
+        """Get the layer graph of the model, including the residual edges.
+        Returns:
+            The layer nodes, in topological order.
+        """
+        return extract_layer_graph(self.model)
+
     @staticmethod
     def get_layer_size_in_bytes(layer: tf.keras.layers.Layer, layer_output: tf.Tensor) -> int:
         """Calculate the size of a Keras layer's weights in bytes.
@@ -128,6 +157,89 @@ class ModelManager:
         layer_output = intermediate_model.predict(layer_input_data)
         return layer_output
 
+    def predict_from_layer(self, start_layer_id: int, layer_input_data: object) -> np.ndarray:
+        """Predict the output of the model from the given layer onwards (the edge tail computation).
+
+        If the inference cache is enabled, a request with the same model, start layer and input
+        tensor is answered from the cache without running the layers.
+
+        Args:
+            start_layer_id: The id of the first layer to compute.
+            layer_input_data: The input data to the first layer.
+        Returns:
+            The output of the model.
+        """
+        def compute() -> np.ndarray:
+            prediction = layer_input_data
+            for layer_id in range(start_layer_id, self.num_layers):
+                prediction = self.predict_single_layer(layer_id, prediction)
+            return prediction
+
+        if self.inference_cache is None:
+            return compute()
+        layer_input_data = np.asarray(layer_input_data, dtype=np.float32)
+        key = get_tensor_key(self.model_path, start_layer_id, layer_input_data)
+        return self.inference_cache.get_or_compute(key, compute)
+
+    def load_exit_heads(self, root_folder: str | None = None, exit_layers: tuple | None = None):
+        """Load the early exit heads listed in the split artifacts manifest.
+        Args:
+            root_folder: The model folder containing the 'layers/' artifacts, the model folder by default.
+            exit_layers: The exit layers of the heads to load, every head of the manifest by default.
+        Returns:
+            None
+        """
+        root_folder = root_folder or os.path.dirname(self.model_path)
+        manifest_path = f"{root_folder}/layers/{ModelManagerConfig.SEGMENTS_MANIFEST}"
+        if not os.path.isfile(manifest_path):
+            logger.debug(f"No split artifacts manifest in {root_folder}, early exits disabled")
+            return
+        with open(manifest_path, 'r') as f:
+            manifest = json.load(f)
+        for name, entry in manifest.items():
+            if "exit_layer" not in entry or (exit_layers is not None and entry["exit_layer"] not in exit_layers):
+                continue
+            exit_head = tf.keras.models.load_model(f"{root_folder}/layers/keras/{name}.keras")
+            self.exit_heads[entry["exit_layer"]] = (exit_head, entry["threshold"])
+        logger.debug(f"Loaded exit heads at layers {sorted(self.exit_heads)}")
+
+    def predict_with_early_exit(self, start_layer_id: int, layer_input_data: object) -> tuple[np.ndarray, int | None]:
+        """Predict the output of the model from the given layer onwards, stopping at the first confident exit.
+        Args:
+            start_layer_id: The id of the first layer to compute.
+            layer_input_data: The input data to the first layer.
+        Returns:
+            The class probabilities and the exit layer, None if no exit was confident enough.
+        """
+        prediction = layer_input_data
+        for layer_id in range(start_layer_id, self.num_layers):
+            prediction = self.predict_single_layer(layer_id, prediction)
+            if layer_id not in self.exit_heads:
+                continue
+            exit_head, threshold = self.exit_heads[layer_id]
+            exit_prediction = exit_head(prediction, training=False).numpy()
+            if exit_prediction.max(axis=-1).min() >= threshold:
+                logger.debug(f"Early exit at layer [{layer_id}]")
+                if self.exit_statistics is not None:
+                    self.exit_statistics.update(layer_id, layer_id, first_layer=start_layer_id)
+                return exit_prediction, layer_id
+        if self.exit_statistics is not None:
+            self.exit_statistics.update(None, self.num_layers - 1, first_layer=start_layer_id)
+        return np.asarray(prediction), None
+
+    def predict_tail(self, start_layer_id: int, layer_input_data: object) -> tuple[np.ndarray, int | None]:
+        """Predict the output of the model from the given layer onwards, through the early exits if any is loaded.
+        Args:
+            start_layer_id: The id of the first layer to compute.
+            layer_input_data: The input data to the first layer.
+        Returns:
+            The output of the model (the class probabilities of the exit taken if any) and the exit layer,
+            None if no exit was taken.
+        """
+        if self.exit_heads:
+            return self.predict_with_early_exit(start_layer_id, layer_input_data)
+        return self.predict_from_layer(start_layer_id, layer_input_data), None
+
     def save_inference_times(self, save_path: str | None = None):
         """Save the inference times to a JSON file.
         Args:
@@ -1,3 +1,4 @@
+import os
 from dataclasses import dataclass
 
 
@@ -8,3 +9,45 @@ class ModelManagerConfig:
     MODEL_PATH: str = f"{MODEL_DIR_PATH}/{DEFAULT_MODEL_NAME}"
     IMAGE_SIZE: int = 10
     SAVE_PATH: str = f"../"
+    SEGMENTS_MANIFEST: str = "manifest.json"
+    BUILD_WORKERS: int | None = None
+    HEADER_CHUNK_SIZE: int = 4096
+    # layers followed by an early exit head, and the confidence needed to stop at an exit
+    EXIT_LAYERS: tuple = ()
+    EXIT_THRESHOLD: float = 0.9
+    EXIT_TRAINING_EPOCHS: int = 10
+    # seed of the exit heads initial weights, so that rebuilding an unchanged head gives the same content hash
+    EXIT_HEAD_SEED: int = 0
+
+
+@dataclass
+class ModelRegistryConfig:
+    DEFAULT_MODEL_ID: str = "resnet_model"
+    DEFAULT_MODEL_VERSION: str = "1"
+    MEMORY_BUDGET: int = 512 * 1024 * 1024
+
+
+@dataclass
+class InferenceCacheConfig:
+    MAX_BYTES: int = 64 * 1024 * 1024
+    TTL: float | None = 300.0
+
+
+@dataclass
+class InferenceWorkersConfig:
+    NUM_WORKERS: int = os.cpu_count() or 1
+    SLOTS_PER_WORKER: int = 8
+    SLOT_SIZE: int = 1024 * 1024
+    HEALTH_CHECK_INTERVAL: float = 1.0
+    # seconds a tail prediction waits for its worker
+    PREDICT_TIMEOUT: float = 30.0
+    # restarts of a worker in a row without completing a request, before the worker is given up
+    MAX_RESTARTS: int = 3
+
+
+@dataclass
+class BatchingConfig:
+    MAX_BATCH_SIZE: int = 16
+    MAX_WAIT: float = 0.005
+    # one batch per inference worker can be in flight
+    CONCURRENT_BATCHES: int = InferenceWorkersConfig.NUM_WORKERS
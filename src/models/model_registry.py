@@ -0,0 +1,298 @@
+import functools
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable
+
+import numpy as np
+
+from src.commons import OffloadingDataFiles
+from src.logger.log import get_logger
+from src.models.inference_workers import InferenceWorkerPool, load_model_predictor
+from src.models.model_manager_config import ModelRegistryConfig
+from src.offloading_algo.device_timing_model import DeviceTimingModel, load_layer_features, load_timing_history
+from src.offloading_algo.exit_statistics import ExitStatistics
+from src.offloading_algo.timing_histograms import LayerTimingHistograms
+
+logger = get_logger("models")
+
+
+@dataclass
+class ModelSpec:
+    """The description of a model served by the edge.
+
+    Attributes:
+        model_id: The id of the model.
+        version: The version of the model.
+        model_path: The path to the '.keras' model.
+        data_file_path_device: The path to the device inference times of the model.
+        data_file_path_edge: The path to the edge inference times of the model.
+        data_file_path_sizes: The path to the layer sizes of the model.
+        data_file_path_features: The path to the layer features of the model, predicting the times of new devices.
+        evaluation_file_path: The evaluation file holding the layer times reported for the model, its timing history.
+        exit_layers: The layers followed by an early exit head.
+    """
+    model_id: str
+    version: str
+    model_path: str
+    data_file_path_device: str = OffloadingDataFiles.data_file_path_device
+    data_file_path_edge: str = OffloadingDataFiles.data_file_path_edge
+    data_file_path_sizes: str = OffloadingDataFiles.data_file_path_sizes
+    data_file_path_features: str = OffloadingDataFiles.data_file_path_features
+    evaluation_file_path: str = OffloadingDataFiles.evaluation_file_path
+    exit_layers: tuple = ()
+
+    @property
+    def key(self) -> tuple[str, str]:
+        return self.model_id, self.version
+
+
+@dataclass
+class ModelProfile:
+    """The offloading profile of a model, kept even when the model itself is unloaded.
+
+    Attributes:
+        device_inference_times: The device inference time of each layer.
+        edge_inference_times: The edge inference time of each layer.
+        layers_sizes: The output size of each layer.
+        split_table: The last offloading layer chosen for each device.
+        device_histograms: The distribution of the device inference time of each layer.
+        edge_histograms: The distribution of the edge inference time of each layer.
+        exit_statistics: The exit probability of each early exit of the model.
+        timing_model: The device time of each layer predicted for each device, None without layer features.
+        data_file_path_device: The file the device times reported by the devices are written to, None to skip it.
+    """
+    device_inference_times: list
+    edge_inference_times: list
+    layers_sizes: list
+    split_table: dict = field(default_factory=dict)
+    device_histograms: LayerTimingHistograms = None
+    edge_histograms: LayerTimingHistograms = None
+    exit_statistics: ExitStatistics = None
+    timing_model: DeviceTimingModel = None
+    data_file_path_device: str | None = None
+
+    def __post_init__(self):
+        # the histograms start from the scalar profiles and are refined by the reported times
+        if self.device_histograms is None:
+            self.device_histograms = LayerTimingHistograms.from_times(self.device_inference_times)
+        if self.edge_histograms is None:
+            self.edge_histograms = LayerTimingHistograms.from_times(self.edge_inference_times)
+        if self.exit_statistics is None:
+            self.exit_statistics = ExitStatistics()
+
+    def get_device_inference_times(self, device_id: str, device_class: str | None = None) -> list:
+        """The device time of each layer for a device, predicted by the timing model once it has reports."""
+        if self.timing_model is None or not self.timing_model.is_fitted():
+            return list(self.device_inference_times)
+        predicted_times, _, _ = self.timing_model.predict(device_id, device_class)
+        return predicted_times.tolist()
+
+    def add_edge_tail_time(self, first_layer: int, last_layer: int, tail_time: float) -> None:
+        """Add the measured time of the edge layers first_layer to last_layer to the edge timing distributions.
+
+        The time of the whole tail is split over its layers in proportion to their profiled edge times.
+        """
+        profiled_times = np.asarray(self.edge_inference_times[first_layer:last_layer + 1], dtype=float)
+        if not len(profiled_times):
+            return
+        total = profiled_times.sum()
+        shares = profiled_times / total if total > 0 else np.full(len(profiled_times), 1 / len(profiled_times))
+        self.edge_histograms.update(tail_time * shares, first_layer=first_layer)
+
+
+@dataclass
+class RegistryMetrics:
+    loads: int = 0
+    evictions: int = 0
+    hits: int = 0
+    misses: int = 0
+    load_time: float = 0.0
+    evict_time: float = 0.0
+    resident_bytes: int = 0
+    peak_resident_bytes: int = 0
+
+
+def load_profile_values(file_path: str) -> list:
+    """Load a profile JSON file ({layer: value}) as the list of its values."""
+    with open(file_path, 'r') as file:
+        return list(json.load(file).values())
+
+
+def load_timing_model(file_path: str) -> DeviceTimingModel | None:
+    """Create the device timing model of a model, None if its layer features were not extracted."""
+    if not os.path.isfile(file_path):
+        return None
+    return DeviceTimingModel(load_layer_features(file_path))
+
+
+def load_fitted_timing_model(features_file_path: str, evaluation_file_path: str) -> DeviceTimingModel | None:
+    """Create the device timing model of a model fitted on the layer times reported in its evaluation file.
+
+    The model is built before it is attached to a profile, the profile times are used meanwhile.
+    """
+    timing_model = load_timing_model(features_file_path)
+    if timing_model is None:
+        return None
+    try:
+        history = load_timing_history([evaluation_file_path])
+    except FileNotFoundError:
+        history = []
+    for device_id, layers_times in history:
+        timing_model.add(device_id, layers_times)
+    timing_model.fit()
+    logger.debug(f"Fitted the device timing model of {features_file_path} on {len(history)} reports")
+    return timing_model
+
+
+def load_model_manager(spec: ModelSpec):
+    """Load the model of the given spec in a ModelManager."""
+    # tensorflow is only imported when the first model is actually loaded
+    from src.models.model_manager import ModelManager
+    model_manager = ModelManager(model_path=spec.model_path)
+    model_manager.load_model(spec.model_path)
+    if spec.exit_layers:
+        model_manager.load_exit_heads(exit_layers=spec.exit_layers)
+    return model_manager
+
+
+def load_inference_pool(spec: ModelSpec) -> InferenceWorkerPool:
+    """Start a pool of inference processes, each loading the model of the given spec."""
+    inference_pool = InferenceWorkerPool(
+        model_path=spec.model_path,
+        predictor_factory=functools.partial(load_model_predictor, exit_layers=spec.exit_layers)
+    )
+    inference_pool.start()
+    return inference_pool
+
+
+def get_inference_pool_size_in_bytes(inference_pool: InferenceWorkerPool) -> int:
+    """Estimate the resident memory of a pool from the size of the model file loaded by each worker."""
+    if not os.path.isfile(inference_pool.model_path):
+        return 0
+    return os.path.getsize(inference_pool.model_path) * inference_pool.num_workers
+
+
+def get_model_size_in_bytes(model_manager) -> int:
+    """Estimate the resident memory of a loaded model from the size of its weights."""
+    return sum(weight.nbytes for weight in model_manager.model.get_weights())
+
+
+class ModelRegistry:
+    """Registry of the models served by the edge, keyed by model id and version.
+
+    Models are loaded lazily on first use and the least recently used ones are unloaded when the
+    resident memory exceeds the budget. The profiles are loaded on first use and never evicted.
+    The models can be requested from several threads (e.g. the batches of the edge running concurrently).
+
+    Args:
+        memory_budget: The maximum resident memory of the loaded models, in bytes.
+        loader: The function loading the model of a spec.
+        size_estimator: The function estimating the resident memory of a loaded model.
+        unloader: The function releasing an unloaded model (e.g. stopping its inference pool), None if not needed.
+    """
+
+    def __init__(
+            self,
+            memory_budget: int = ModelRegistryConfig.MEMORY_BUDGET,
+            loader: Callable = load_model_manager,
+            size_estimator: Callable = get_model_size_in_bytes,
+            unloader: Callable | None = None
+    ):
+        self.memory_budget = memory_budget
+        self.loader = loader
+        self.size_estimator = size_estimator
+        self.unloader = unloader
+        self.specs = {}
+        self.profiles = {}
+        # loaded models in least recently used order, with their estimated size
+        self.loaded_models = OrderedDict()
+        self.lock = threading.RLock()
+        self.metrics = RegistryMetrics()
+
+    def register(self, spec: ModelSpec) -> None:
+        logger.debug(f"Registering model {spec.model_id}:{spec.version}")
+        self.specs[spec.key] = spec
+
+    def get_spec(self, model_id: str | None = None, version: str | None = None) -> ModelSpec:
+        """Get the spec of a registered model, falling back to the default model id and version."""
+        key = (model_id or ModelRegistryConfig.DEFAULT_MODEL_ID, version or ModelRegistryConfig.DEFAULT_MODEL_VERSION)
+        try:
+            return self.specs[key]
+        except KeyError:
+            raise KeyError(f"Model {key[0]}:{key[1]} is not registered")
+
+    def get_profile(self, model_id: str | None = None, version: str | None = None) -> ModelProfile:
+        """Get the offloading profile of a model, loading it on first use."""
+        spec = self.get_spec(model_id, version)
+        if spec.key not in self.profiles:
+            self.profiles[spec.key] = ModelProfile(
+                device_inference_times=load_profile_values(spec.data_file_path_device),
+                edge_inference_times=load_profile_values(spec.data_file_path_edge),
+                layers_sizes=load_profile_values(spec.data_file_path_sizes),
+                exit_statistics=ExitStatistics(spec.exit_layers),
+                timing_model=load_fitted_timing_model(spec.data_file_path_features, spec.evaluation_file_path),
+                data_file_path_device=spec.data_file_path_device,
+            )
+        return self.profiles[spec.key]
+
+    def get_model(self, model_id: str | None = None, version: str | None = None):
+        """Get a loaded model, loading it and evicting the least recently used ones if needed."""
+        spec = self.get_spec(model_id, version)
+        with self.lock:
+            return self.get_loaded_model(spec)
+
+    def get_loaded_model(self, spec: ModelSpec):
+        if spec.key in self.loaded_models:
+            self.metrics.hits += 1
+            self.loaded_models.move_to_end(spec.key)
+            return self.loaded_models[spec.key][0]
+
+        self.metrics.misses += 1
+        start_time = time.perf_counter()
+        model = self.loader(spec)
+        size = self.size_estimator(model)
+        load_time = time.perf_counter() - start_time
+        self.metrics.loads += 1
+        self.metrics.load_time += load_time
+        logger.debug(f"Loaded model {spec.model_id}:{spec.version} ({size} bytes) in {load_time:.4f} seconds")
+
+        self.loaded_models[spec.key] = (model, size)
+        self.metrics.resident_bytes += size
+        self.metrics.peak_resident_bytes = max(self.metrics.peak_resident_bytes, self.metrics.resident_bytes)
+        self.enforce_budget()
+        return model
+
+    def unload(self, model_id: str, version: str) -> None:
+        """Unload a model, keeping its spec and profile."""
+        with self.lock:
+            self.unload_model(model_id, version)
+
+    def unload_model(self, model_id: str, version: str) -> None:
+        start_time = time.perf_counter()
+        model, size = self.loaded_models.pop((model_id, version))
+        if self.unloader is not None:
+            self.unloader(model)
+        self.metrics.resident_bytes -= size
+        self.metrics.evictions += 1
+        self.metrics.evict_time += time.perf_counter() - start_time
+        logger.debug(f"Unloaded model {model_id}:{version} ({size} bytes)")
+
+    def unload_all(self) -> None:
+        """Unload every model, when the edge shuts down."""
+        with self.lock:
+            for model_id, version in list(self.loaded_models):
+                self.unload_model(model_id, version)
+
+    def enforce_budget(self) -> None:
+        """Unload the least recently used models until the memory budget is met, keeping the last one used."""
+        while self.metrics.resident_bytes > self.memory_budget and len(self.loaded_models) > 1:
+            self.unload_model(*next(iter(self.loaded_models)))
+        if self.metrics.resident_bytes > self.memory_budget:
+            logger.warning(f"Model {next(iter(self.loaded_models))} alone exceeds the memory budget")
+
+    def get_metrics(self) -> dict:
+        return self.metrics.__dict__
@@ -0,0 +1,177 @@
+from collections import OrderedDict
+
+import numpy as np
+
+from src.mqtt_client.mqtt_configs import DeltaCodecConfig
+from src.mqtt_client.tensor_memory import TensorMemoryBudget
+
+
+class DeltaDecodeError(Exception):
+    """The reference of a delta frame is not held by the decoder, the device has to resync."""
+
+
+def is_delta_encoded(layer_output) -> bool:
+    return isinstance(layer_output, dict) and "encoding" in layer_output
+
+
+class DeltaEncoder:
+    """Device side of the temporal delta codec of a layer output.
+
+    Key frames carry the whole tensor, delta frames the quantized non-zero differences against the
+    last tensor acknowledged by the edge. The differences are taken against the reconstruction the
+    edge holds, not the original tensor, so the quantization error does not accumulate.
+
+    Args:
+        key_frame_interval: The frames between two key frames.
+        quantization_step: The quantization step of the differences.
+        max_delta_ratio: The fraction of changed elements above which a key frame is sent instead.
+    """
+
+    def __init__(self,
+                 key_frame_interval: int = DeltaCodecConfig.key_frame_interval,
+                 quantization_step: float = DeltaCodecConfig.quantization_step,
+                 max_delta_ratio: float = DeltaCodecConfig.max_delta_ratio):
+        self.key_frame_interval = key_frame_interval
+        self.quantization_step = quantization_step
+        self.max_delta_ratio = max_delta_ratio
+        self.sequence = 0
+        self.reference = None
+        self.reference_sequence = None
+        self.frames_since_key = 0
+        # sequence -> reconstruction held by the edge once the frame is decoded
+        self.pending = {}
+
+    def encode(self, tensor: np.ndarray) -> dict:
+        tensor = np.asarray(tensor, dtype=np.float32)
+        self.sequence += 1
+        if (self.reference is None or self.reference.shape != tensor.shape
+                or self.frames_since_key + 1 >= self.key_frame_interval):
+            return self.encode_key_frame(tensor)
+        quantized = np.rint((tensor - self.reference) / self.quantization_step).astype(np.int64).ravel()
+        indices = np.flatnonzero(quantized)
+        if len(indices) > self.max_delta_ratio * tensor.size:
+            return self.encode_key_frame(tensor)
+        reconstruction = self.reference.ravel().copy()
+        # same float32 operations as the decoder, so both hold the same reconstruction
+        reconstruction[indices] += quantized[indices].astype(np.float32) * np.float32(self.quantization_step)
+        self.pending[self.sequence] = reconstruction.reshape(tensor.shape)
+        self.frames_since_key += 1
+        return {
+            "encoding": "delta",
+            "sequence": self.sequence,
+            "reference": self.reference_sequence,
+            "shape": list(tensor.shape),
+            "step": self.quantization_step,
+            "indices": indices.tolist(),
+            "values": quantized[indices].tolist(),
+        }
+
+    def encode_key_frame(self, tensor: np.ndarray) -> dict:
+        self.pending[self.sequence] = tensor
+        self.frames_since_key = 0
+        return {
+            "encoding": "key",
+            "sequence": self.sequence,
+            "shape": list(tensor.shape),
+            "data": tensor.ravel().tolist(),
+        }
+
+    def acknowledge(self, sequence: int) -> None:
+        """Use the frame decoded by the edge as the reference of the next deltas."""
+        if sequence not in self.pending:
+            return
+        self.reference = self.pending.pop(sequence)
+        self.reference_sequence = sequence
+        self.pending = {s: tensor for s, tensor in self.pending.items() if s > sequence}
+
+    def resync(self) -> None:
+        """Send a key frame next, after the edge lost the reference of a delta."""
+        self.reference = None
+        self.reference_sequence = None
+        self.pending.clear()
+
+
+class DeltaDecoder:
+    """Edge side of the temporal delta codec: the reference buffers of each session.
+
+    A session is a device and the layer it offloads at. The last decoded tensors of a session are
+    kept so that a delta against any recently acknowledged frame can be decoded, and counted in the
+    tensor memory of the device. The ratio between the encoded and the full tensor of each session
+    is tracked for the offloading cost model.
+
+    Args:
+        reference_history: The decoded tensors kept per session.
+        size_ratio_smoothing: The smoothing factor of the size ratio of each session.
+        min_size_ratio: The smallest expected size ratio, for the overhead of a frame.
+        tensor_memory: The tensor memory the references are counted in, None to not count them.
+    """
+
+    def __init__(self,
+                 reference_history: int = DeltaCodecConfig.reference_history,
+                 size_ratio_smoothing: float = DeltaCodecConfig.size_ratio_smoothing,
+                 min_size_ratio: float = DeltaCodecConfig.min_size_ratio,
+                 tensor_memory: TensorMemoryBudget | None = None):
+        self.reference_history = reference_history
+        self.size_ratio_smoothing = size_ratio_smoothing
+        self.min_size_ratio = min_size_ratio
+        self.tensor_memory = tensor_memory
+        # (device id, layer) -> sequence -> decoded tensor
+        self.sessions = {}
+        # (device id, layer) -> encoded to full size ratio
+        self.size_ratios = {}
+
+    def decode(self, device_id: str, layer: int, frame: dict) -> np.ndarray:
+        """Reconstruct the tensor of a frame.
+        Raises:
+            DeltaDecodeError: If the reference of a delta frame is not held.
+        """
+        references = self.sessions.setdefault((device_id, layer), OrderedDict())
+        shape = tuple(frame["shape"])
+        if frame["encoding"] == "key":
+            tensor = np.asarray(frame["data"], dtype=np.float32).reshape(shape)
+            size_ratio = 1.0
+        else:
+            reference = references.get(frame["reference"])
+            if reference is None or reference.shape != shape:
+                raise DeltaDecodeError(
+                    f"Missing reference {frame['reference']} of {device_id} at layer {layer}"
+                )
+            tensor = reference.ravel().copy()
+            indices = np.asarray(frame["indices"], dtype=np.int64)
+            tensor[indices] += np.asarray(frame["values"], dtype=np.float32) * np.float32(frame["step"])
+            tensor = tensor.reshape(shape)
+            # indices and values against the whole tensor
+            size_ratio = 2 * len(indices) / max(tensor.size, 1)
+        references[frame["sequence"]] = tensor
+        while len(references) > self.reference_history:
+            references.popitem(last=False)
+        self.account_references(device_id, layer)
+        previous_ratio = self.size_ratios.get((device_id, layer), size_ratio)
+        self.size_ratios[(device_id, layer)] = (
+                (1 - self.size_ratio_smoothing) * previous_ratio + self.size_ratio_smoothing * size_ratio
+        )
+        return tensor
+
+    def reset(self, device_id: str, layer: int) -> None:
+        self.sessions.pop((device_id, layer), None)
+        self.account_references(device_id, layer)
+
+    def account_references(self, device_id: str, layer: int) -> None:
+        """Count the reference tensors of a session in the tensor memory of its device."""
+        if self.tensor_memory is None:
+            return
+        size = sum(reference.nbytes for reference in self.sessions.get((device_id, layer), {}).values())
+        self.tensor_memory.hold(f"delta_references/{layer}", device_id, size)
+
+    def get_expected_sizes(self, device_id: str, layers_sizes: list) -> list:
+        """The expected transferred size of each layer output of a device, given its delta encoding.
+
+        The output offloaded at a layer (layers_sizes[layer + 1], as in OffloadingAlgo) is scaled by the
+        size ratio of its session. The input sent by the edge-only split and the result of the
+        device-only split are never delta encoded.
+        """
+        expected_sizes = list(layers_sizes)
+        for (session_device_id, layer), size_ratio in self.size_ratios.items():
+            if session_device_id == device_id and 0 < layer + 1 < len(layers_sizes) - 1:
+                expected_sizes[layer + 1] *= max(size_ratio, self.min_size_ratio)
+        return expected_sizes
@@ -0,0 +1,53 @@
+import heapq
+import itertools
+import threading
+from dataclasses import dataclass, field
+
+from src.mqtt_client.mqtt_custom_message import MqttMessageData
+
+
+@dataclass(order=True)
+class QueuedMessage:
+    deadline: float
+    # negated priority, higher priorities come first among equal deadlines
+    priority: int
+    sequence: int
+    message_data: MqttMessageData = field(compare=False)
+
+
+@dataclass
+class DeadlineMetrics:
+    met: int = 0
+    missed: int = 0
+    expired_in_queue: int = 0
+    # requests dropped while waiting for the device result
+    expired_in_flight: int = 0
+    rejected_infeasible: int = 0
+
+
+class EdfMessageQueue:
+    """Thread-safe message queue ordered earliest-deadline-first.
+
+    Best-effort messages have an infinite deadline and are served after the ones with a deadline,
+    by priority and then in arrival order.
+    """
+
+    def __init__(self):
+        self.heap = []
+        self.sequence = itertools.count()
+        self.condition = threading.Condition()
+
+    def put(self, message_data: MqttMessageData, deadline: float = float('inf'), priority: int = 0) -> None:
+        with self.condition:
+            heapq.heappush(self.heap, QueuedMessage(deadline, -priority, next(self.sequence), message_data))
+            self.condition.notify()
+
+    def get(self, timeout: float | None = None) -> QueuedMessage | None:
+        """Pop the message with the earliest deadline, None if the queue stays empty for timeout seconds."""
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.heap, timeout=timeout):
+                return None
+            return heapq.heappop(self.heap)
+
+    def __len__(self) -> int:
+        return len(self.heap)
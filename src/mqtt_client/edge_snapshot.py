@@ -0,0 +1,138 @@
+import io
+import json
+import os
+from collections import OrderedDict
+
+import numpy as np
+
+from src.models.model_registry import ModelProfile
+from src.mqtt_client.delta_codec import DeltaDecoder
+from src.offloading_algo.exit_statistics import ExitStatistics
+from src.offloading_algo.timing_histograms import LayerTimingHistograms
+
+SNAPSHOT_VERSION = 3
+
+
+def profile_to_arrays(name: str, profile: ModelProfile) -> tuple[dict, dict]:
+    """Split a profile into its numeric arrays and its JSON metadata."""
+    arrays = {
+        f"{name}/device_inference_times": np.asarray(profile.device_inference_times, dtype=float),
+        f"{name}/edge_inference_times": np.asarray(profile.edge_inference_times, dtype=float),
+        f"{name}/layers_sizes": np.asarray(profile.layers_sizes, dtype=float),
+        f"{name}/device_histograms": profile.device_histograms.counts,
+        f"{name}/edge_histograms": profile.edge_histograms.counts,
+    }
+    metadata = {
+        "split_table": profile.split_table,
+        "histograms": {
+            "device": profile.device_histograms.get_parameters(),
+            "edge": profile.edge_histograms.get_parameters(),
+        },
+        "exits": {
+            "reached": profile.exit_statistics.reached,
+            "taken": profile.exit_statistics.taken,
+        },
+    }
+    return arrays, metadata
+
+
+def profile_from_arrays(name: str, arrays, metadata: dict) -> ModelProfile:
+    histograms = {}
+    for side in ("device", "edge"):
+        histograms[side] = LayerTimingHistograms.from_dict({
+            **metadata["histograms"][side], "counts": arrays[f"{name}/{side}_histograms"]
+        })
+    exit_statistics = ExitStatistics()
+    exit_statistics.reached = {int(layer): count for layer, count in metadata["exits"]["reached"].items()}
+    exit_statistics.taken = {int(layer): count for layer, count in metadata["exits"]["taken"].items()}
+    return ModelProfile(
+        device_inference_times=arrays[f"{name}/device_inference_times"].tolist(),
+        edge_inference_times=arrays[f"{name}/edge_inference_times"].tolist(),
+        layers_sizes=arrays[f"{name}/layers_sizes"].tolist(),
+        split_table=dict(metadata["split_table"]),
+        device_histograms=histograms["device"],
+        edge_histograms=histograms["edge"],
+        exit_statistics=exit_statistics,
+    )
+
+
+def save_snapshot(file_path: str, profiles: dict, delta_decoder: DeltaDecoder | None = None) -> None:
+    """Write the warm state of the edge to a compressed '.npz' file.
+
+    The snapshot holds the profiles with their timing histograms, split tables and exit statistics,
+    and the delta codec sessions with their latest reference tensor. It is written to a temporary
+    file first, so an interrupted write never replaces a valid snapshot.
+
+    Args:
+        file_path: The path of the snapshot.
+        profiles: The profiles to save, by name.
+        delta_decoder: The delta decoder whose sessions are saved.
+    """
+    arrays = {}
+    metadata = {"version": SNAPSHOT_VERSION, "profiles": {}, "size_ratios": [], "sessions": []}
+    for name, profile in profiles.items():
+        profile_arrays, metadata["profiles"][name] = profile_to_arrays(name, profile)
+        arrays.update(profile_arrays)
+    if delta_decoder is not None:
+        metadata["size_ratios"] = [
+            {"device_id": device_id, "layer": layer, "ratio": ratio}
+            for (device_id, layer), ratio in delta_decoder.size_ratios.items()
+        ]
+        for session_id, ((device_id, layer), references) in enumerate(delta_decoder.sessions.items()):
+            if not references:
+                continue
+            sequence, reference = next(reversed(references.items()))
+            arrays[f"session_{session_id}"] = reference
+            metadata["sessions"].append(
+                {"array": f"session_{session_id}", "device_id": device_id, "layer": layer, "sequence": sequence}
+            )
+    arrays["metadata"] = np.frombuffer(json.dumps(metadata).encode(), dtype=np.uint8)
+
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, **arrays)
+    temporary_path = f"{file_path}.tmp"
+    with open(temporary_path, 'wb') as f:
+        f.write(buffer.getvalue())
+    os.replace(temporary_path, file_path)
+
+
+def load_snapshot(file_path: str) -> dict:
+    """Read a snapshot written by save_snapshot.
+    Returns:
+        The profiles by name, the delta codec size ratios and sessions.
+    Raises:
+        ValueError: If the snapshot was written by an incompatible version.
+    """
+    with np.load(file_path, allow_pickle=False) as arrays:
+        metadata = json.loads(arrays["metadata"].tobytes())
+        if metadata["version"] != SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported snapshot version: {metadata['version']}")
+        return {
+            "profiles": {
+                name: profile_from_arrays(name, arrays, profile_metadata)
+                for name, profile_metadata in metadata["profiles"].items()
+            },
+            "size_ratios": metadata["size_ratios"],
+            "sessions": [
+                {**session, "reference": arrays[session["array"]]} for session in metadata["sessions"]
+            ],
+        }
+
+
+def restore_delta_decoder(delta_decoder: DeltaDecoder, snapshot: dict) -> None:
+    """Restore the delta codec sessions, so the devices can keep sending deltas across a restart."""
+    for size_ratio in snapshot["size_ratios"]:
+        delta_decoder.size_ratios[(size_ratio["device_id"], size_ratio["layer"])] = size_ratio["ratio"]
+    for session in snapshot["sessions"]:
+        delta_decoder.sessions[(session["device_id"], session["layer"])] = OrderedDict(
+            [(session["sequence"], session["reference"])]
+        )
+        delta_decoder.account_references(session["device_id"], session["layer"])
+
+
+def is_snapshot_fresh(file_path: str, source_paths: list[str]) -> bool:
+    """Whether the snapshot exists and is newer than the files it was built from."""
+    if not os.path.isfile(file_path):
+        return False
+    snapshot_time = os.path.getmtime(file_path)
+    return all(not os.path.isfile(path) or os.path.getmtime(path) <= snapshot_time for path in source_paths)
@@ -0,0 +1,131 @@
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable
+
+from src.models.model_registry import ModelProfile
+from src.mqtt_client.mqtt_configs import MqttClientConfig
+
+
+@dataclass
+class InferenceRequest:
+    """The edge state of an in-flight request, from its registration to the end of its computation.
+
+    The device id and the message id chosen by the device correlate all the messages of a request,
+    so a device can keep several requests in flight.
+
+    Attributes:
+        message_id: The correlation id of the request.
+        device_id: The device that registered the request.
+        deadline: The absolute deadline of the request, infinite for best-effort requests.
+        priority: The priority of the request among equal deadlines.
+        profile: The profile of the model of the request, set by the offloading decision.
+        model_key: The (model id, version) of the model of the request, None without a model registry.
+        offloading_layer_index: The split chosen for the request.
+        edge_computation_cost: The expected edge work of the request, counted in the edge backlog.
+        expires_at: The time the request is dropped if it has not ended, its deadline or its time-to-live.
+    """
+    message_id: str
+    device_id: str
+    deadline: float = float('inf')
+    priority: int = 0
+    profile: ModelProfile = None
+    model_key: tuple | None = None
+    offloading_layer_index: int | None = None
+    edge_computation_cost: float = 0.0
+    expires_at: float = float('inf')
+
+
+class InFlightRequests:
+    """Thread-safe registry of the in-flight requests, bounding the requests of each device.
+
+    The requests whose device never sent the result (lost messages, disconnected device) are dropped
+    once past their deadline or their time-to-live, so they neither fill the pipeline of the device
+    nor count in the edge backlog. Expired requests are swept on each registration and backlog read.
+
+    Args:
+        pipeline_depth: The maximum number of in-flight requests of a device.
+        ttl: The seconds a request stays in flight without a deadline, None to keep it until it ends.
+        clock: The current time, in the unit of the deadlines.
+        on_expired: Called with each expired request, outside the lock.
+    """
+
+    def __init__(self, pipeline_depth: int, ttl: float | None = MqttClientConfig.request_ttl,
+                 clock: Callable[[], float] = time.time,
+                 on_expired: Callable[[InferenceRequest], None] | None = None):
+        self.pipeline_depth = pipeline_depth
+        self.ttl = ttl
+        self.clock = clock
+        self.on_expired = on_expired
+        # (device id, message id) -> request
+        self.requests = {}
+        # device id -> message ids of its in-flight requests
+        self.device_requests = {}
+        self.lock = threading.Lock()
+
+    def register(self, message_id: str, device_id: str, deadline: float = float('inf'),
+                 priority: int = 0) -> InferenceRequest | None:
+        """Register a new request.
+        Returns:
+            The state of the request, None if the pipeline of the device is full.
+        """
+        now = self.clock()
+        expired = self.expire(now)
+        with self.lock:
+            device_requests = self.device_requests.setdefault(device_id, set())
+            if message_id not in device_requests and len(device_requests) >= self.pipeline_depth:
+                request = None
+            else:
+                expires_at = deadline if self.ttl is None else min(deadline, now + self.ttl)
+                request = InferenceRequest(message_id=message_id, device_id=device_id, deadline=deadline,
+                                           priority=priority, expires_at=expires_at)
+                self.requests[(device_id, message_id)] = request
+                device_requests.add(message_id)
+        self.notify_expired(expired)
+        return request
+
+    def get(self, message_id: str, device_id: str) -> InferenceRequest | None:
+        return self.requests.get((device_id, message_id))
+
+    def pop(self, message_id: str, device_id: str) -> InferenceRequest | None:
+        with self.lock:
+            return self.remove(message_id, device_id)
+
+    def remove(self, message_id: str, device_id: str) -> InferenceRequest | None:
+        request = self.requests.pop((device_id, message_id), None)
+        if request is not None:
+            device_requests = self.device_requests[device_id]
+            device_requests.discard(message_id)
+            if not device_requests:
+                del self.device_requests[device_id]
+        return request
+
+    def expire(self, now: float | None = None) -> list[InferenceRequest]:
+        """Drop the requests past their expiry time.
+        Returns:
+            The expired requests, to be passed to notify_expired once outside the lock.
+        """
+        now = self.clock() if now is None else now
+        with self.lock:
+            expired = [request for request in self.requests.values() if request.expires_at < now]
+            for request in expired:
+                self.remove(request.message_id, request.device_id)
+        return expired
+
+    def notify_expired(self, expired: list[InferenceRequest]) -> None:
+        if self.on_expired is None:
+            return
+        for request in expired:
+            self.on_expired(request)
+
+    def get_edge_backlog(self) -> float:
+        """The expected edge work of the in-flight requests."""
+        self.notify_expired(self.expire())
+        with self.lock:
+            return sum(request.edge_computation_cost for request in self.requests.values())
+
+    def get_depth(self, device_id: str) -> int:
+        return len(self.device_requests.get(device_id, ()))
+
+    def __len__(self) -> int:
+        return len(self.requests)
@@ -1,15 +1,44 @@
 import json
 import random
+import threading
 import time
+from concurrent.futures import Future
+from dataclasses import dataclass
+from logging import DEBUG
 
 import ntplib
+import numpy as np
 import paho.mqtt.client as mqtt
-from offloading_algo.offloading_algo import OffloadingAlgo
 
 from src.commons import OffloadingDataFiles
-from src.logger.log import logger
+from src.logger.log import get_logger
+from src.models.batching_scheduler import BatchingScheduler, model_registry_predictor
+from src.models.inference_cache import InferenceCache, get_tensor_key
+from src.models.model_registry import ModelProfile, ModelRegistry, load_fitted_timing_model
+from src.mqtt_client.delta_codec import DeltaDecodeError, DeltaDecoder, is_delta_encoded
+from src.mqtt_client.edf_queue import DeadlineMetrics, EdfMessageQueue
+from src.mqtt_client.edge_snapshot import (
+    is_snapshot_fresh, load_snapshot, restore_delta_decoder, save_snapshot
+)
+from src.mqtt_client.inference_request import InferenceRequest, InFlightRequests
 from src.mqtt_client.mqtt_configs import MqttClientConfig, Topics, DefaultMessages
 from src.mqtt_client.mqtt_custom_message import MqttMessageData
+from src.mqtt_client.tensor_memory import TensorMemoryBudget
+from src.offloading_algo.offloading_algo import OffloadingAlgo
+from src.offloading_algo.percentile_offloading_algo import PercentileOffloadingAlgo
+
+logger = get_logger("mqtt_client")
+
+
+@dataclass
+class StartupMetrics:
+    """The seconds from the creation of the edge client to each stage of its startup."""
+    connected: float | None = None
+    clock_synced: float | None = None
+    profiles_ready: float | None = None
+    models_ready: float | None = None
+    first_message: float | None = None
+    restored_from_snapshot: bool = False
 
 
 class MqttClient:
@@ -20,8 +49,18 @@ class MqttClient:
             client_id: str = MqttClientConfig.client_id,
             protocol: str = MqttClientConfig.protocol,
             subscribed_topics: list = None,
-            ntp_server: str = MqttClientConfig.ntp_server
+            ntp_server: str = MqttClientConfig.ntp_server,
+            model_registry: ModelRegistry = None,
+            edf_scheduling: bool = MqttClientConfig.edf_scheduling,
+            offloading_percentile: float | None = MqttClientConfig.offloading_percentile,
+            pipeline_depth: int = MqttClientConfig.pipeline_depth,
+            tensor_memory: TensorMemoryBudget = None,
+            inference_cache: InferenceCache = None,
+            snapshot_file_path: str | None = OffloadingDataFiles.snapshot_file_path,
+            preload_models: bool = MqttClientConfig.preload_models
     ):
+        self.startup_monotonic = time.monotonic()
+        self.startup_metrics = StartupMetrics()
         self.broker_url = broker_url
         self.broker_port = broker_port
         self.client_id = client_id
@@ -36,16 +75,55 @@ class MqttClient:
         # Set up topics
         self.subscribed_topics = subscribed_topics
 
-        # Set up NTP client
+        # Set up NTP client, the local clock is used until the first sync succeeds
         self.ntp_client = ntplib.NTPClient()
         self.ntp_server = ntp_server
+        self.clock_offset = 0.0
+        self.clock_synced = threading.Event()
+        self.stopped = threading.Event()
         self.start_timestamp = self.get_ntp_timestamp()
+        self.start_monotonic = time.monotonic()
+
+        # Models served by the edge, None to use the single model stats files
+        self.model_registry = model_registry
+        self.preload_models = preload_models
 
-        # Stats
+        # Stats, loaded in the background: the messages are only handled once they are ready
         self.layers_sizes = []
         self.edge_inference_times = []
         self.device_inference_times = []
-        self.load_stats()
+        self.default_profile = None
+        self.snapshot_file_path = snapshot_file_path
+        self.profiles_ready = threading.Event()
+        # the edge only takes a share of the inferences once its models are loaded
+        self.models_ready = threading.Event()
+
+        # Offloading minimizing a percentile of the latency, None to minimize the expected latency
+        self.offloading_percentile = offloading_percentile
+
+        # State of the in-flight requests, correlated by device and message id, up to pipeline_depth per device
+        self.requests = InFlightRequests(pipeline_depth, clock=self.get_current_timestamp,
+                                         on_expired=self.expire_request)
+        # Bytes of the offloaded tensors held for the in-flight requests
+        self.tensor_memory = TensorMemoryBudget() if tensor_memory is None else tensor_memory
+        # Edge results of the offloaded layer outputs, a repeated output is answered without running the layers
+        self.inference_cache = InferenceCache() if inference_cache is None else inference_cache
+        # Reference tensors of the devices sending delta encoded layer outputs, held in the tensor memory
+        self.delta_decoder = DeltaDecoder(tensor_memory=self.tensor_memory)
+        # Edge tails of the requests offloading at the same layer of the same model run as one batch
+        self.batching_scheduler = None
+        if model_registry is not None:
+            self.batching_scheduler = BatchingScheduler(predict=model_registry_predictor(model_registry))
+            self.batching_scheduler.start()
+
+        # Deadline-aware scheduling
+        self.message_queue = EdfMessageQueue() if edf_scheduling else None
+        self.queue_thread = None
+        self.deadline_metrics = DeadlineMetrics()
+
+        # Staged startup: the client connects while the clock, the profiles and the models are loaded
+        threading.Thread(target=self.run_clock_sync, daemon=True).start()
+        threading.Thread(target=self.warm_up, daemon=True).start()
 
     @staticmethod
     def create_random_payload():
@@ -55,7 +133,9 @@ class MqttClient:
 
     def publish(self, topic: str, message: str, qos: int = 2, max_retries: int = 3):
         """Publishes a message to a topic."""
-        logger.debug(f"Publishing message to {topic}: {message}")
+        # the message can carry a whole tensor, only format it when debug logging is enabled
+        if logger.isEnabledFor(DEBUG):
+            logger.debug(f"Publishing message to {topic}: {message}")
         try:
             self.client.publish(topic, message, qos=qos, retain=False)
         except Exception as e:
@@ -68,11 +148,26 @@ class MqttClient:
 
     def run(self):
         """Connect to the broker and start the MQTT client loop."""
+        if self.message_queue is not None:
+            self.queue_thread = threading.Thread(target=self.process_queued_messages, daemon=True)
+            self.queue_thread.start()
         self.client.connect(self.broker_url, self.broker_port, 60)
         self.client.loop_forever()
 
     def stop(self):
-        """Stops the MQTT client loop and disconnects."""
+        """Stops the MQTT client loop, saves the warm-start snapshot, unloads the models and disconnects."""
+        self.stopped.set()
+        if self.queue_thread is not None:
+            # the queued messages loop sees the stop within a poll interval
+            self.queue_thread.join()
+        if self.snapshot_file_path is not None and self.profiles_ready.is_set():
+            self.save_snapshot()
+        if self.batching_scheduler is not None:
+            # runs the batches still pending before their inference pools are stopped
+            self.batching_scheduler.stop()
+        if self.model_registry is not None:
+            # stops the inference pools of the loaded models
+            self.model_registry.unload_all()
         logger.debug("Disconnecting MQTT client")
         self.client.disconnect()
 
@@ -81,22 +176,165 @@ class MqttClient:
             logger.debug(f"Connected to {self.broker_url}:{self.broker_port} with client ID {self.client_id}")
             for topic in self.subscribed_topics:
                 self.subscribe(topic)
+            self.record_startup_stage("connected")
             logger.debug(f"Initial NTP timestamp from NTP server {self.ntp_server}: {self.start_timestamp}")
         else:
             logger.debug(f"Connection failed with code {rc}")
 
-    def get_ntp_timestamp(self) -> float:
-        ntp_timestamp = None
-        while ntp_timestamp is None:
+    def get_ntp_timestamp(self) -> str:
+        """Current NTP time, from the local clock corrected by the offset of the last sync."""
+        return str(time.time() + self.clock_offset)
+
+    def sync_clock(self) -> bool:
+        """Measure the offset of the local clock from the NTP server.
+        Returns:
+            False if the NTP server did not answer.
+        """
+        try:
+            response = self.ntp_client.request(self.ntp_server, timeout=MqttClientConfig.ntp_timeout)
+        except (ntplib.NTPException, OSError) as e:
+            logger.debug(f"NTP sync with {self.ntp_server} failed: {e}")
+            return False
+        # the start timestamp was taken with the previous offset
+        self.start_timestamp = str(float(self.start_timestamp) + response.offset - self.clock_offset)
+        self.clock_offset = response.offset
+        if not self.clock_synced.is_set():
+            self.clock_synced.set()
+            self.record_startup_stage("clock_synced")
+        return True
+
+    def run_clock_sync(self):
+        """Sync the clock until the client stops, retrying the failed syncs with exponential backoff."""
+        retry_delay = 1.0
+        while not self.stopped.is_set():
+            if self.sync_clock():
+                retry_delay = 1.0
+                delay = MqttClientConfig.ntp_sync_interval
+            else:
+                delay = retry_delay
+                retry_delay = min(2 * retry_delay, MqttClientConfig.ntp_sync_interval)
+            self.stopped.wait(delay)
+
+    def warm_up(self):
+        """Load the profiles, from the snapshot when it is newer than the stats files, then the models.
+
+        A snapshot that cannot be restored falls back to the stats files. Without a loaded profile the
+        registrations are rejected, see get_model_profile. The device timing models are fitted on the
+        reports history once the messages are handled, the profile times are used until then.
+        """
+        try:
+            self.load_profiles()
+            # imported by the first save of the message data otherwise
+            import pandas
+        except Exception as e:
+            logger.error(f"Failed to load the offloading profiles, rejecting the requests without a profile: {e}")
+        self.profiles_ready.set()
+        self.record_startup_stage("profiles_ready")
+
+        try:
+            self.load_timing_models()
+        except Exception as e:
+            logger.error(f"Failed to load the device timing models: {e}")
+
+        if self.model_registry is not None and self.preload_models:
+            try:
+                self.model_registry.get_model()
+            except Exception as e:
+                logger.error(f"Failed to preload the default model, it is loaded on first use: {e}")
+        self.models_ready.set()
+        self.record_startup_stage("models_ready")
+
+    def load_profiles(self):
+        if self.snapshot_file_path is not None and is_snapshot_fresh(self.snapshot_file_path, self.get_stats_files()):
             try:
-                response = self.ntp_client.request(self.ntp_server)
-                # Get the current NTP time (seconds since 1900)
-                ntp_timestamp = response.tx_time
-            except ntplib.NTPException as _:
-                time.sleep(1)
-        return str(ntp_timestamp)
+                self.restore_snapshot()
+                return
+            except (OSError, ValueError, KeyError) as e:
+                logger.error(f"Failed to restore snapshot from {self.snapshot_file_path}, loading the stats: {e}")
+        self.load_stats()
+        self.default_profile = ModelProfile(
+            device_inference_times=self.device_inference_times,
+            edge_inference_times=self.edge_inference_times,
+            layers_sizes=self.layers_sizes,
+            data_file_path_device=OffloadingDataFiles.data_file_path_device
+        )
+
+    def load_timing_models(self):
+        """Attach the missing device timing models, each fitted on the times reported for its model.
+
+        Each model is built before it is attached, the message handling keeps using the profile times meanwhile.
+        The registry profiles loaded later are fitted on their spec's history when they are loaded.
+        """
+        if self.model_registry is not None:
+            # the registry profiles restored from the snapshot
+            for key, profile in list(self.model_registry.profiles.items()):
+                if profile.timing_model is None:
+                    spec = self.model_registry.specs[key]
+                    profile.timing_model = load_fitted_timing_model(
+                        spec.data_file_path_features, spec.evaluation_file_path
+                    )
+        if self.default_profile is None or self.default_profile.timing_model is not None:
+            return
+        self.default_profile.timing_model = load_fitted_timing_model(
+            OffloadingDataFiles.data_file_path_features, OffloadingDataFiles.evaluation_file_path
+        )
+
+    def get_stats_files(self) -> list:
+        """The files the profiles are built from, a snapshot older than any of them is stale."""
+        stats_files = [
+            OffloadingDataFiles.data_file_path_device,
+            OffloadingDataFiles.data_file_path_edge,
+            OffloadingDataFiles.data_file_path_sizes
+        ]
+        if self.model_registry is not None:
+            for spec in self.model_registry.specs.values():
+                stats_files += [spec.data_file_path_device, spec.data_file_path_edge, spec.data_file_path_sizes]
+        return stats_files
+
+    def save_snapshot(self):
+        """Save the profiles, the split tables and the delta codec sessions for the next startup."""
+        profiles = {} if self.default_profile is None else {"default": self.default_profile}
+        if self.model_registry is not None:
+            profiles.update({f"{model_id}:{version}": profile
+                             for (model_id, version), profile in self.model_registry.profiles.items()})
+        if not profiles:
+            return
+        try:
+            save_snapshot(self.snapshot_file_path, profiles, self.delta_decoder)
+            logger.debug(f"Saved snapshot to {self.snapshot_file_path}")
+        except OSError as e:
+            logger.error(f"Failed to save snapshot to {self.snapshot_file_path}: {e}")
+
+    def restore_snapshot(self):
+        snapshot = load_snapshot(self.snapshot_file_path)
+        for name, profile in snapshot["profiles"].items():
+            if name == "default":
+                profile.data_file_path_device = OffloadingDataFiles.data_file_path_device
+                self.default_profile = profile
+                self.device_inference_times = profile.device_inference_times
+                self.edge_inference_times = profile.edge_inference_times
+                self.layers_sizes = profile.layers_sizes
+            elif self.model_registry is not None and tuple(name.split(":", 1)) in self.model_registry.specs:
+                # the profiles of the models no longer registered are dropped
+                spec = self.model_registry.specs[tuple(name.split(":", 1))]
+                profile.data_file_path_device = spec.data_file_path_device
+                self.model_registry.profiles[spec.key] = profile
+        restore_delta_decoder(self.delta_decoder, snapshot)
+        self.startup_metrics.restored_from_snapshot = True
+        logger.debug(f"Restored snapshot from {self.snapshot_file_path}")
+
+    def record_startup_stage(self, stage: str):
+        if getattr(self.startup_metrics, stage) is not None:
+            return
+        elapsed_time = time.monotonic() - self.startup_monotonic
+        setattr(self.startup_metrics, stage, elapsed_time)
+        logger.info(f"Startup stage {stage} reached after {elapsed_time:.3f} seconds")
+
+    def get_startup_metrics(self) -> dict:
+        return self.startup_metrics.__dict__
 
     def on_message(self, client, userdata, message):
+        self.record_startup_stage("first_message")
 
         # obtain message data if the message is JSON valid
         try:
@@ -116,17 +354,122 @@ class MqttClient:
         # Save message data to file
         MqttMessageData.save_to_file(OffloadingDataFiles.evaluation_file_path, message_data.to_dict())
 
+        # register the request with its deadline, subsequent messages with the same id inherit it
+        if message_data.topic == Topics.registration.value:
+            deadline, priority = MqttMessageData.get_deadline_info(message_data.payload)
+            request = self.requests.register(
+                message_data.message_id, message_data.device_id, float(message_data.timestamp) + deadline, priority
+            )
+            if request is None:
+                logger.debug(f"Pipeline of {message_data.device_id} full, rejecting {message_data.message_id}")
+                self.reject_request(message_data.device_id, message_data.message_id, DefaultMessages.pipeline_full_msg)
+                return
+
+        if self.message_queue is None:
+            self.handle_message(message_data)
+        else:
+            request = self.requests.get(message_data.message_id, message_data.device_id)
+            if request is None:
+                self.message_queue.put(message_data)
+            else:
+                self.message_queue.put(message_data, request.deadline, request.priority)
+
+    def process_queued_messages(self):
+        """Serve the queued messages earliest-deadline-first, rejecting the ones already past their deadline.
+
+        The loop ends once the client is stopped.
+        """
+        while not self.stopped.is_set():
+            queued_message = self.message_queue.get(timeout=MqttClientConfig.queue_poll_interval)
+            if queued_message is None or self.stopped.is_set():
+                continue
+            if queued_message.deadline < self.get_current_timestamp():
+                logger.debug(f"Message {queued_message.message_data.message_id} expired in queue")
+                self.deadline_metrics.expired_in_queue += 1
+                self.reject_request(queued_message.message_data.device_id, queued_message.message_data.message_id)
+                continue
+            self.handle_message(queued_message.message_data)
+
+    def handle_message(self, message_data: MqttMessageData):
+        """Run the edge side of the protocol for a received message.
+
+        Args:
+            message_data (MqttMessageData): The extended message data.
+        """
+        self.profiles_ready.wait()
+        request = self.requests.get(message_data.message_id, message_data.device_id)
+        deadline = float('inf') if request is None else request.deadline
+
         # run offloading algorithm and ask for prediction after the device sends the registration message
         if message_data.topic == Topics.registration.value:
+            try:
+                profile = self.get_model_profile(message_data)
+            except KeyError as e:
+                logger.debug(f"{e}, rejecting {message_data.message_id}")
+                self.reject_request(message_data.device_id, message_data.message_id, DefaultMessages.unknown_model_msg)
+                return
+            if profile is None:
+                logger.debug(f"No offloading profile loaded, rejecting {message_data.message_id}")
+                self.reject_request(
+                    message_data.device_id, message_data.message_id, DefaultMessages.profiles_unavailable_msg
+                )
+                return
+            device_class = self.register_device_timings(profile, message_data)
+            # the splits with a tensor larger than the memory left are not admitted, steering toward deeper splits
+            max_data_size = self.tensor_memory.get_available(message_data.device_id)
+            # devices sending delta encoded outputs transfer a fraction of the layer sizes
+            layers_sizes = self.delta_decoder.get_expected_sizes(message_data.device_id, profile.layers_sizes)
             # run offloading algorithm
-            offloading_algo = OffloadingAlgo(
-                avg_speed=message_data.avg_speed,
-                num_layers=len(self.layers_sizes) - 1,
-                layers_sizes=list(self.layers_sizes),
-                inference_time_device=list(self.device_inference_times),
-                inference_time_edge=list(self.edge_inference_times)
-            )
-            best_offloading_layer = offloading_algo.static_offloading()
+            if not self.models_ready.is_set():
+                # the models are still loading, the whole inference runs on the device
+                best_offloading_layer = len(profile.layers_sizes) - 1
+                best_layer_data_size = layers_sizes[best_offloading_layer]
+                edge_computation_cost = 0.0
+            elif self.offloading_percentile is None:
+                offloading_algo = OffloadingAlgo(
+                    avg_speed=message_data.avg_speed,
+                    num_layers=len(profile.layers_sizes) - 1,
+                    layers_sizes=layers_sizes,
+                    inference_time_device=profile.get_device_inference_times(message_data.device_id, device_class),
+                    inference_time_edge=list(profile.edge_inference_times),
+                    deadline=deadline - self.get_current_timestamp(),
+                    edge_backlog=self.requests.get_edge_backlog(),
+                    max_data_size=max_data_size,
+                    exit_probabilities=profile.exit_statistics.get_exit_probabilities()
+                )
+                best_offloading_layer = offloading_algo.static_offloading()
+                best_layer_data_size = offloading_algo.best_layer_data_size
+                edge_computation_cost = offloading_algo.best_edge_computation_cost
+            else:
+                offloading_algo = PercentileOffloadingAlgo(
+                    avg_speed=message_data.avg_speed,
+                    num_layers=len(profile.layers_sizes) - 1,
+                    layers_sizes=layers_sizes,
+                    device_histograms=profile.device_histograms,
+                    edge_histograms=profile.edge_histograms,
+                    percentile=self.offloading_percentile,
+                    deadline=deadline - self.get_current_timestamp(),
+                    edge_backlog=self.requests.get_edge_backlog(),
+                    max_data_size=max_data_size
+                )
+                best_offloading_layer = offloading_algo.percentile_offloading()
+                best_layer_data_size = offloading_algo.best_layer_data_size
+                edge_computation_cost = offloading_algo.best_edge_computation_cost
+            if best_offloading_layer is None:
+                self.reject_infeasible_request(message_data, min(layers_sizes), max_data_size)
+                return
+            # another request of the device can take the memory between the decision and the reservation
+            if not self.tensor_memory.reserve(message_data.message_id, message_data.device_id, best_layer_data_size):
+                self.reject_infeasible_request(
+                    message_data, best_layer_data_size, self.tensor_memory.get_available(message_data.device_id)
+                )
+                return
+            profile.split_table[message_data.device_id] = best_offloading_layer
+            if request is not None:
+                request.profile = profile
+                request.model_key = self.get_model_key(message_data)
+                request.offloading_layer_index = best_offloading_layer
+                request.edge_computation_cost = edge_computation_cost
             # ask for prediction
             self.ask_for_prediction(
                 ask_device_id=message_data.device_id,
@@ -136,29 +479,259 @@ class MqttClient:
 
         # ends the computation after receiving the inference result
         if message_data.topic == Topics.device_inference_result.value:
-            # update device inference time
-            with open(OffloadingDataFiles.data_file_path_device, 'r') as f:
-                device_inference_times = json.load(f)
-            for l_id, inference_time in enumerate(message_data.device_layers_inference_time):
-                device_inference_times[f"layer_{l_id}"] = inference_time
-            with open(OffloadingDataFiles.data_file_path_device, 'w') as f:
-                json.dump(device_inference_times, f)
-            # end the computation
-            self.end_computation(ask_device_id=message_data.device_id, message_id=message_data.message_id)
+            self.save_model_report(request, message_data)
+            delta_fields = self.decode_layer_output(message_data)
+            if message_data.layer_output is not None:
+                # hold the decoded tensor, not the JSON payload nor the delta frame it was sent as
+                self.tensor_memory.resize(
+                    message_data.message_id, message_data.device_id,
+                    np.asarray(message_data.layer_output, dtype=np.float32).nbytes
+                )
+            # update the profile of the model the request was computed with, if any profile is loaded
+            profile = self.default_profile if request is None or request.profile is None else request.profile
+            if profile is not None:
+                self.save_device_inference_times(profile, message_data.device_layers_inference_time)
+                # update the device timing distributions
+                profile.device_histograms.update(message_data.device_layers_inference_time)
+                if profile.timing_model is not None:
+                    profile.timing_model.update(message_data.device_id, message_data.device_layers_inference_time)
+                # update the exit probabilities with the exits evaluated on the device, the edge ones are
+                # recorded once the edge layers are computed
+                profile.exit_statistics.update(
+                    MqttMessageData.get_exit_layer(message_data.message_content), message_data.offloading_layer_index
+                )
+            # end the computation, once the edge layers computed in the inference pool are done
+            prediction = self.submit_edge_layers(request, message_data)
+            if prediction is None:
+                self.end_request(message_data, delta_fields)
+            else:
+                prediction.add_done_callback(lambda future: self.end_request(message_data, delta_fields, future))
+
+    def save_model_report(self, request: InferenceRequest | None, message_data: MqttMessageData):
+        """Save a device result in the evaluation file of its model too, when the model has its own timing history."""
+        if self.model_registry is None or request is None or request.model_key is None:
+            return
+        evaluation_file_path = self.model_registry.get_spec(*request.model_key).evaluation_file_path
+        if evaluation_file_path != OffloadingDataFiles.evaluation_file_path:
+            MqttMessageData.save_to_file(evaluation_file_path, message_data.to_dict())
+
+    @staticmethod
+    def save_device_inference_times(profile: ModelProfile, device_layers_inference_time: list):
+        """Update the device times of the profile with the layer times reported by a device, and its device times file.
+
+        The profile is the one saved in the snapshot, so it is kept as recent as the file.
+        """
+        num_layers = min(len(device_layers_inference_time), len(profile.device_inference_times))
+        profile.device_inference_times[:num_layers] = device_layers_inference_time[:num_layers]
+        if profile.data_file_path_device is None:
+            return
+        with open(profile.data_file_path_device, 'r') as f:
+            device_inference_times = json.load(f)
+        for l_id, inference_time in enumerate(device_layers_inference_time):
+            device_inference_times[f"layer_{l_id}"] = inference_time
+        with open(profile.data_file_path_device, 'w') as f:
+            json.dump(device_inference_times, f)
+
+    @staticmethod
+    def register_device_timings(profile: ModelProfile, message_data: MqttMessageData) -> str | None:
+        """Record the class and the calibration times sent by a device with its registration.
+
+        Returns:
+            str | None: The class of the device, None if not sent.
+        """
+        device_class, calibration_times = MqttMessageData.get_device_info(message_data.payload)
+        if profile.timing_model is None:
+            return device_class
+        if device_class is not None:
+            profile.timing_model.set_device_class(message_data.device_id, device_class)
+        if calibration_times:
+            profile.timing_model.update(message_data.device_id, calibration_times)
+        return device_class
+
+    def decode_layer_output(self, message_data: MqttMessageData) -> dict:
+        """Reconstruct a delta encoded layer output in place.
+
+        Returns:
+            dict: The fields of the end computation message: the acknowledged frame, or a resync request
+            when the reference of the delta was lost.
+        """
+        if not is_delta_encoded(message_data.layer_output):
+            return {}
+        frame = message_data.layer_output
+        try:
+            message_data.layer_output = self.delta_decoder.decode(
+                message_data.device_id, message_data.offloading_layer_index, frame
+            )
+        except DeltaDecodeError as e:
+            logger.debug(f"{e}, asking {message_data.device_id} to resync")
+            self.delta_decoder.reset(message_data.device_id, message_data.offloading_layer_index)
+            return {"resync": True}
+        return {"delta_ack": frame["sequence"]}
+
+    def submit_edge_layers(self, request: InferenceRequest | None, message_data: MqttMessageData) -> Future | None:
+        """Submit the layers after the split of a request, from the layer output sent by the device.
+
+        The layers are batched with the requests offloading at the same layer of the same model and run in the
+        inference pool of the model, the calling thread only hands the tensor over.
+        The computation stops at the first confident early exit when the model has exit heads, the exits
+        evaluated on the edge are recorded in the exit statistics of the model.
+        The same layer output entering the same layer of the same model is answered from the inference cache.
+
+        Returns:
+            Future | None: The future of the edge prediction and of its exit layer, None when the edge has nothing
+                to compute (e.g. the device took an early exit).
+        """
+        if (self.model_registry is None or not self.models_ready.is_set() or request is None
+                or request.model_key is None or message_data.layer_output is None
+                or message_data.offloading_layer_index is None
+                or MqttMessageData.get_exit_layer(message_data.message_content) is not None):
+            return None
+        start_layer = int(message_data.offloading_layer_index) + 1
+        if start_layer >= len(request.profile.device_inference_times):
+            return None
+        model_id, version = request.model_key
+        layer_output = np.asarray(message_data.layer_output, dtype=np.float32)
+        key = get_tensor_key(f"{model_id}:{version}", start_layer, layer_output)
+        cached_prediction = self.inference_cache.get(key)
+        if cached_prediction is not None:
+            # the exits were not evaluated again, nothing to record
+            prediction = Future()
+            prediction.set_result((cached_prediction, None))
+            return prediction
+        try:
+            prediction = self.batching_scheduler.submit(model_id, start_layer, message_data.message_id, layer_output,
+                                                        version=version)
+        except Exception as e:
+            logger.error(f"Failed to submit the edge layers of {message_data.message_id}: {e}")
+            return None
+        submit_time = time.perf_counter()
+        prediction.add_done_callback(
+            lambda future: self.record_edge_prediction(request.profile, start_layer, key, future, submit_time)
+        )
+        return prediction
+
+    def record_edge_prediction(self, profile: ModelProfile, start_layer: int, key: bytes, prediction: Future,
+                               submit_time: float):
+        """Cache an edge prediction and record the exits evaluated and the time taken by the edge layers.
+
+        The time of the edge layers is measured from the submission, batching and queueing included.
+        """
+        if prediction.exception() is not None:
+            return
+        tail_time = time.perf_counter() - submit_time
+        output, exit_layer = prediction.result()
+        self.inference_cache.put(key, np.asarray(output), tail_time)
+        last_layer = len(profile.device_inference_times) - 1
+        profile.exit_statistics.update(exit_layer, last_layer, first_layer=start_layer)
+        profile.add_edge_tail_time(start_layer, last_layer if exit_layer is None else exit_layer, tail_time)
+
+    def end_request(self, message_data: MqttMessageData, delta_fields: dict, prediction: Future | None = None):
+        """End the computation of a request, once the edge prediction is done if the edge computes layers."""
+        prediction_fields = {}
+        if prediction is not None:
+            try:
+                output, _ = prediction.result()
+                prediction_fields["prediction"] = np.asarray(output).tolist()
+            except Exception as e:
+                logger.error(f"Failed to compute the edge layers of {message_data.message_id}: {e}")
+        self.end_computation(
+            ask_device_id=message_data.device_id, message_id=message_data.message_id, **delta_fields,
+            **prediction_fields
+        )
+        self.complete_request(message_data.message_id, message_data.device_id)
+
+    def reject_infeasible_request(self, message_data: MqttMessageData, min_data_size: float, max_data_size: float):
+        """Reject a request without a feasible split, telling the device whether to retry.
+
+        When even the smallest tensor does not fit the memory left, the request is deferred if the
+        tensor fits once the in-flight tensors are released and rejected otherwise. Else the deadline
+        cannot be met.
+        """
+        if min_data_size > max_data_size and min_data_size <= self.tensor_memory.get_capacity():
+            self.tensor_memory.metrics.deferred += 1
+            self.reject_request(message_data.device_id, message_data.message_id, DefaultMessages.memory_deferred_msg,
+                                retry_after=self.requests.get_edge_backlog())
+        elif min_data_size > max_data_size:
+            self.tensor_memory.metrics.rejected += 1
+            self.reject_request(message_data.device_id, message_data.message_id, DefaultMessages.memory_rejected_msg)
+        else:
+            self.deadline_metrics.rejected_infeasible += 1
+            self.reject_request(message_data.device_id, message_data.message_id)
+
+    def complete_request(self, message_id, device_id):
+        """Release the edge backlog and the tensor memory of a request and count whether it met its deadline."""
+        self.tensor_memory.release(message_id, device_id)
+        request = self.requests.pop(message_id, device_id)
+        if request is None or request.deadline == float('inf'):
+            return
+        if self.get_current_timestamp() <= request.deadline:
+            self.deadline_metrics.met += 1
+        else:
+            self.deadline_metrics.missed += 1
+
+    def expire_request(self, request: InferenceRequest):
+        """Release the tensor memory of a request dropped without its result, past its deadline or its time-to-live."""
+        logger.debug(f"Request {request.message_id} of {request.device_id} expired in flight")
+        self.tensor_memory.release(request.message_id, request.device_id)
+        self.deadline_metrics.expired_in_flight += 1
+
+    def reject_request(self, ask_device_id, message_id, template=DefaultMessages.deadline_rejected_msg, **fields):
+        logger.debug(f"Rejecting request {message_id} of {ask_device_id}: {template['message_content']}")
+        self.tensor_memory.release(message_id, ask_device_id)
+        self.requests.pop(message_id, ask_device_id)
+        message_data = DefaultMessages.build(
+            template, timestamp=self.get_ntp_timestamp(), message_id=message_id, **fields
+        )
+        self.publish(Topics.end_computation.value, json.dumps(message_data))
+
+    def get_current_timestamp(self) -> float:
+        """Current NTP time, extrapolated from the initial NTP timestamp with the monotonic clock."""
+        return float(self.start_timestamp) + time.monotonic() - self.start_monotonic
+
+    def get_deadline_metrics(self) -> dict:
+        return self.deadline_metrics.__dict__
+
+    def get_tensor_memory_metrics(self) -> dict:
+        return self.tensor_memory.get_metrics()
+
+    def get_inference_cache_metrics(self) -> dict:
+        return self.inference_cache.get_metrics()
+
+    def get_model_profile(self, message_data: MqttMessageData) -> ModelProfile:
+        """Get the offloading profile of the model named in the registration message.
+
+        Args:
+            message_data (MqttMessageData): The registration message data.
+
+        Returns:
+            ModelProfile: The profile of the model, or the one of the loaded stats without a model registry,
+                None if the stats failed to load.
+        """
+        if self.model_registry is None:
+            return self.default_profile
+        return self.model_registry.get_profile(*MqttMessageData.get_model_info(message_data.payload))
+
+    def get_model_key(self, message_data: MqttMessageData) -> tuple | None:
+        """Get the (model id, version) named in the registration message, None without a model registry."""
+        if self.model_registry is None:
+            return None
+        return self.model_registry.get_spec(*MqttMessageData.get_model_info(message_data.payload)).key
 
     def ask_for_prediction(self, ask_device_id, message_id, best_offloading_layer: int):
         logger.debug(f"Sending inference request to {ask_device_id}")
-        message_data = DefaultMessages.ask_for_inference_msg
-        message_data["timestamp"] = self.get_ntp_timestamp()
-        message_data['message_id'] = message_id
-        message_data['offloading_layer_index'] = best_offloading_layer
+        message_data = DefaultMessages.build(
+            DefaultMessages.ask_for_inference_msg,
+            timestamp=self.get_ntp_timestamp(),
+            message_id=message_id,
+            offloading_layer_index=best_offloading_layer
+        )
         self.publish(Topics.device_inference.value, json.dumps(message_data))
 
-    def end_computation(self, ask_device_id, message_id):
+    def end_computation(self, ask_device_id, message_id, **fields):
         logger.debug(f"Sending end computation to {ask_device_id}")
-        message_data = DefaultMessages.end_computation_msg
-        message_data["timestamp"] = self.get_ntp_timestamp()
-        message_data['message_id'] = message_id
+        message_data = DefaultMessages.build(
+            DefaultMessages.end_computation_msg, timestamp=self.get_ntp_timestamp(), message_id=message_id, **fields
+        )
         self.publish(Topics.end_computation.value, json.dumps(message_data))
 
     def load_stats(self):
@@ -1,5 +1,6 @@
 import enum
 from dataclasses import dataclass
+from types import MappingProxyType
 
 from paho.mqtt import client as mqtt
 
@@ -24,32 +25,120 @@ class MqttClientConfig:
     )
     protocol: mqtt.MQTTv311 = mqtt.MQTTv311
     ntp_server: str = "time.google.com"
+    # the clock is synced in the background, retried with exponential backoff up to the sync interval
+    ntp_timeout: float = 1.0
+    ntp_sync_interval: float = 60.0
+    # load the registered models in the background at startup, instead of on first use
+    preload_models: bool = True
+    edf_scheduling: bool = False
+    # priority of the requests without a valid one, among equal deadlines
+    default_priority: int = 0
+    # seconds the queued messages loop waits for a message before checking whether the client stopped
+    queue_poll_interval: float = 1.0
+    offloading_percentile: float | None = None
+    # maximum number of in-flight requests of a device, the registrations beyond it are rejected
+    pipeline_depth: int = 4
+    # seconds a request without a deadline stays in flight waiting for the device result
+    request_ttl: float | None = 60.0
+    # bytes of offloaded tensors held by the edge at once, globally and for each device
+    tensor_memory_budget: float = 512 * 1024 * 1024
+    device_tensor_memory_budget: float = 64 * 1024 * 1024
+
+
+@dataclass
+class DeltaCodecConfig:
+    # frames between two key frames
+    key_frame_interval: int = 30
+    # quantization step of the differences, the reconstruction error of each element is at most half of it
+    quantization_step: float = 1e-3
+    # delta frames changing more than this fraction of the elements are sent as key frames
+    max_delta_ratio: float = 0.5
+    # decoded tensors kept by the edge as references of the next deltas
+    reference_history: int = 4
+    # smoothing of the encoded to full size ratio of each session, used by the offloading cost model
+    size_ratio_smoothing: float = 0.1
+    # smallest expected size ratio, a frame carries its sequence, shape and encoding even when nothing changed
+    min_size_ratio: float = 0.02
+
 
 @dataclass
 class DefaultMessages:
-    ask_for_inference_msg = {
+    # read-only templates, every reply is built as a new dict with build()
+    ask_for_inference_msg = MappingProxyType({
         "device_id": "edge",
         "message_id": "edge",
         "timestamp": None,
         "message_content": "AskInference",
         "offloading_layer_index": None,
-        "input_data": [
-            [255, 255, 255, 255, 255, 255, 255, 255, 255, 255],
-            [255, 255, 255, 255, 255, 255, 255, 255, 255, 255],
-            [255, 255, 0, 0, 0, 255, 255, 255, 255, 255],
-            [255, 255, 0, 0, 255, 0, 0, 255, 255, 255],
-            [255, 255, 0, 0, 255, 0, 0, 255, 255, 255],
-            [255, 255, 0, 0, 255, 255, 255, 255, 255, 255],
-            [255, 255, 255, 255, 255, 0, 0, 255, 255, 255],
-            [255, 255, 0, 0, 255, 0, 0, 255, 255, 255],
-            [255, 255, 0, 0, 255, 0, 0, 255, 255, 255],
-            [255, 255, 255, 255, 255, 255, 255, 255, 255, 255]
-        ]
-    }
+        "input_data": (
+            (255, 255, 255, 255, 255, 255, 255, 255, 255, 255),
+            (255, 255, 255, 255, 255, 255, 255, 255, 255, 255),
+            (255, 255, 0, 0, 0, 255, 255, 255, 255, 255),
+            (255, 255, 0, 0, 255, 0, 0, 255, 255, 255),
+            (255, 255, 0, 0, 255, 0, 0, 255, 255, 255),
+            (255, 255, 0, 0, 255, 255, 255, 255, 255, 255),
+            (255, 255, 255, 255, 255, 0, 0, 255, 255, 255),
+            (255, 255, 0, 0, 255, 0, 0, 255, 255, 255),
+            (255, 255, 0, 0, 255, 0, 0, 255, 255, 255),
+            (255, 255, 255, 255, 255, 255, 255, 255, 255, 255)
+        )
+    })
 
-    end_computation_msg = {
+    end_computation_msg = MappingProxyType({
         "device_id": "edge",
         "message_id": "edge",
         "timestamp": None,
         "message_content": "EndComputation"
-    }
+    })
+
+    deadline_rejected_msg = MappingProxyType({
+        "device_id": "edge",
+        "message_id": "edge",
+        "timestamp": None,
+        "message_content": "DeadlineRejected"
+    })
+
+    pipeline_full_msg = MappingProxyType({
+        "device_id": "edge",
+        "message_id": "edge",
+        "timestamp": None,
+        "message_content": "PipelineFull"
+    })
+
+    # no split fits the memory left on the edge now, the device can register again after retry_after seconds
+    memory_deferred_msg = MappingProxyType({
+        "device_id": "edge",
+        "message_id": "edge",
+        "timestamp": None,
+        "message_content": "MemoryDeferred",
+        "retry_after": None
+    })
+
+    # no split fits the memory budget of the edge
+    memory_rejected_msg = MappingProxyType({
+        "device_id": "edge",
+        "message_id": "edge",
+        "timestamp": None,
+        "message_content": "MemoryRejected"
+    })
+
+    # the model named by the device is not registered on the edge
+    unknown_model_msg = MappingProxyType({
+        "device_id": "edge",
+        "message_id": "edge",
+        "timestamp": None,
+        "message_content": "UnknownModel"
+    })
+
+    # the edge failed to load its offloading profiles, it cannot choose a split
+    profiles_unavailable_msg = MappingProxyType({
+        "device_id": "edge",
+        "message_id": "edge",
+        "timestamp": None,
+        "message_content": "ProfilesUnavailable"
+    })
+
+    @staticmethod
+    def build(template: MappingProxyType, **fields) -> dict:
+        """Build a message of a request from a template, without touching the template."""
+        return {**template, **fields}
@@ -1,11 +1,13 @@
 import json
+import math
 import os
 import random
 from dataclasses import dataclass
 
-import pandas as pd
+from src.logger.log import get_logger
+from src.mqtt_client.mqtt_configs import MqttClientConfig
 
-from src.logger.log import logger
+logger = get_logger("mqtt_client")
 
 
 @dataclass
@@ -52,6 +54,8 @@ class MqttMessageData:
 
     @staticmethod
     def save_to_file(file_path: str, data_dict: dict):
+        # pandas is slow to import, the edge imports it in the background at startup
+        import pandas as pd
         # check if the file already exists
         file_exists = os.path.isfile(file_path)
         try:
@@ -91,6 +95,54 @@ class MqttMessageData:
             avg_speed = 0
         return avg_speed
 
+    @staticmethod
+    def get_model_info(payload: str) -> tuple:
+        # model id and version named by the device, None to use the default model
+        message_data = json.loads(payload)
+        return message_data.get("model_id", None), message_data.get("model_version", None)
+
+    @staticmethod
+    def get_deadline_info(payload: str) -> tuple:
+        # latency budget in seconds from the message timestamp and priority, best-effort by default
+        message_data = json.loads(payload)
+        deadline = MqttMessageData.parse_number(message_data.get("deadline", None))
+        if deadline is None:
+            if message_data.get("deadline", None) is not None:
+                logger.warning(f"Invalid deadline {message_data['deadline']!r} of message "
+                               f"{message_data.get('message_id')}, serving it best-effort")
+            deadline = float('inf')
+        priority = MqttMessageData.parse_number(message_data.get("priority", None))
+        if priority is None or not math.isfinite(priority):
+            if message_data.get("priority", None) is not None:
+                logger.warning(f"Invalid priority {message_data['priority']!r} of message "
+                               f"{message_data.get('message_id')}, using the default priority")
+            priority = MqttClientConfig.default_priority
+        return deadline, int(priority)
+
+    @staticmethod
+    def parse_number(value) -> float | None:
+        # a number sent as a JSON number or string, None if missing or not a number
+        if value is None or isinstance(value, bool):
+            return None
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            return None
+        return None if math.isnan(number) else number
+
+    @staticmethod
+    def get_device_info(payload: str) -> tuple:
+        # class of the device and the times of the layers it measured at startup ({layer: seconds}), both optional
+        message_data = json.loads(payload)
+        return message_data.get("device_class", None), message_data.get("calibration_times", None)
+
+    @staticmethod
+    def get_exit_layer(message_content: dict) -> int | None:
+        # early exit taken on the device, None if the device computed all its layers
+        if not isinstance(message_content, dict):
+            return None
+        return message_content.get("exit_layer", None)
+
     @staticmethod
     def get_offloading_info(message_content: dict) -> tuple:
         # check if layer_output and offloading_layer_index exist in message_content
@@ -0,0 +1,108 @@
+import threading
+from dataclasses import dataclass, field
+
+from src.mqtt_client.mqtt_configs import MqttClientConfig
+
+
+@dataclass
+class TensorMemoryMetrics:
+    high_water_mark: float = 0.0
+    # device id -> highest bytes held at once for the device
+    device_high_water_marks: dict = field(default_factory=dict)
+    deferred: int = 0
+    rejected: int = 0
+
+
+class TensorMemoryBudget:
+    """Accounting of the bytes of the offloaded tensors held by the edge, per device and globally.
+
+    A request reserves the size of its offloaded tensor when its split is chosen, the reservation is
+    resized to the received payload and released when the request ends. The tensors a device keeps
+    across its requests (e.g. the delta references) are held under a holder name instead.
+
+    Args:
+        budget: The maximum bytes of in-flight tensors, infinite for no limit.
+        device_budget: The maximum bytes of in-flight tensors of each device, infinite for no limit.
+    """
+
+    def __init__(self, budget: float = MqttClientConfig.tensor_memory_budget,
+                 device_budget: float = MqttClientConfig.device_tensor_memory_budget):
+        self.budget = budget
+        self.device_budget = device_budget
+        # (device id, message id or holder) -> reserved bytes
+        self.reservations = {}
+        self.device_in_use = {}
+        self.in_use = 0.0
+        self.metrics = TensorMemoryMetrics()
+        self.lock = threading.Lock()
+
+    def get_capacity(self) -> float:
+        """The largest tensor admitted once the in-flight tensors are released."""
+        return min(self.budget, self.device_budget)
+
+    def get_available(self, device_id: str) -> float:
+        """The largest tensor of a device admitted now."""
+        with self.lock:
+            return min(self.budget - self.in_use, self.device_budget - self.device_in_use.get(device_id, 0.0))
+
+    def reserve(self, message_id: str, device_id: str, size: float) -> bool:
+        """Reserve the memory of the offloaded tensor of a request.
+        Returns:
+            False if the tensor does not fit in the global or device budget.
+        """
+        with self.lock:
+            device_in_use = self.device_in_use.get(device_id, 0.0)
+            if self.in_use + size > self.budget or device_in_use + size > self.device_budget:
+                return False
+            self.reservations[(device_id, message_id)] = size
+            self.account(device_id, size)
+            return True
+
+    def resize(self, message_id: str, device_id: str, size: float) -> None:
+        """Set the reservation of a request to the size actually received, the data is already held."""
+        with self.lock:
+            if (device_id, message_id) not in self.reservations:
+                return
+            reserved_size = self.reservations[(device_id, message_id)]
+            self.reservations[(device_id, message_id)] = size
+            self.account(device_id, size - reserved_size)
+
+    def hold(self, holder: str, device_id: str, size: float) -> None:
+        """Set the bytes held for a device outside of any request (e.g. the delta references), counted in the budgets.
+
+        The bytes are already held, so they are accounted even beyond the budgets, leaving less for the requests.
+        """
+        with self.lock:
+            held_size = self.reservations.pop((device_id, holder), 0.0)
+            if size > 0:
+                self.reservations[(device_id, holder)] = size
+            self.account(device_id, size - held_size)
+            if self.device_in_use[device_id] <= 0:
+                del self.device_in_use[device_id]
+
+    def release(self, message_id: str, device_id: str) -> None:
+        with self.lock:
+            size = self.reservations.pop((device_id, message_id), None)
+            if size is not None:
+                self.account(device_id, -size)
+                if self.device_in_use[device_id] <= 0:
+                    del self.device_in_use[device_id]
+
+    def account(self, device_id: str, size: float) -> None:
+        self.in_use += size
+        self.device_in_use[device_id] = self.device_in_use.get(device_id, 0.0) + size
+        self.metrics.high_water_mark = max(self.metrics.high_water_mark, self.in_use)
+        self.metrics.device_high_water_marks[device_id] = max(
+            self.metrics.device_high_water_marks.get(device_id, 0.0), self.device_in_use[device_id]
+        )
+
+    def get_metrics(self) -> dict:
+        with self.lock:
+            return {
+                "in_use": self.in_use,
+                "device_in_use": dict(self.device_in_use),
+                "high_water_mark": self.metrics.high_water_mark,
+                "device_high_water_marks": dict(self.metrics.device_high_water_marks),
+                "deferred": self.metrics.deferred,
+                "rejected": self.metrics.rejected,
+            }
@@ -0,0 +1,228 @@
+import csv
+import json
+from statistics import NormalDist
+
+import numpy as np
+
+from src.offloading_algo.offloading_algo_config import DeviceTimingModelConfig
+
+# features of each layer used to predict its device time, as saved by the edge initialization
+LAYER_FEATURES = ("flops", "param_bytes", "output_bytes")
+
+
+def load_layer_features(file_path: str) -> np.ndarray:
+    """Load a layer features JSON file ({layer: {feature: value}}) as a (layers, features) array."""
+    with open(file_path, 'r') as file:
+        return np.array([[layer[feature] for feature in LAYER_FEATURES] for layer in json.load(file).values()],
+                        dtype=float)
+
+
+def load_timing_history(file_paths: list[str]) -> list[tuple[str, list]]:
+    """Read the layer times reported by the devices from evaluation files.
+    Returns:
+        The (device id, layers times) of each inference result, in file order.
+    """
+    history = []
+    for file_path in file_paths:
+        with open(file_path, 'r', newline='') as file:
+            for row in csv.DictReader(file):
+                if row.get("device_layers_inference_time"):
+                    history.append((row["device_id"], json.loads(row["device_layers_inference_time"])))
+    return history
+
+
+class DeviceTimingModel:
+    """Regression of the device time of each layer of a model, shared by the devices of the edge.
+
+    The log time of a layer on a device is a linear function of the log features of the layer
+    (FLOPs, parameter bytes, output bytes) plus a speed offset of the device. The offset of a device
+    without reports is the mean offset of its device class, a few calibration layers measured on the
+    device are enough to estimate its own. The measured layers of a device are predicted from both
+    the regression and their measurements, weighted by their confidence. The reports are refitted in
+    batches of refit_interval, in between only the measurements of the devices are updated.
+
+    Args:
+        layer_features: The (layers, features) array of the model.
+        regularization: The ridge regularization of the layer feature weights.
+        iterations: The alternating fits of the weights and the device offsets at each refit.
+        min_variance: The smallest variance of the log times, and of the device offsets.
+        confidence: The coverage of the confidence intervals.
+        refit_interval: The reports added by update between two refits.
+    """
+
+    def __init__(
+            self,
+            layer_features: np.ndarray,
+            regularization: float = DeviceTimingModelConfig.REGULARIZATION,
+            iterations: int = DeviceTimingModelConfig.ITERATIONS,
+            min_variance: float = DeviceTimingModelConfig.MIN_VARIANCE,
+            confidence: float = DeviceTimingModelConfig.CONFIDENCE,
+            refit_interval: int = DeviceTimingModelConfig.REFIT_INTERVAL
+    ):
+        layer_features = np.asarray(layer_features, dtype=float)
+        self.layer_features = layer_features
+        # log features and an intercept
+        self.design = np.column_stack([np.ones(len(layer_features)), np.log1p(layer_features)])
+        self.regularization = regularization
+        self.iterations = iterations
+        self.min_variance = min_variance
+        self.confidence = confidence
+        self.refit_interval = refit_interval
+        self.pending_reports = 0
+        self.device_ids = {}
+        self.device_classes = {}
+        # (devices, layers) count, sum and sum of squares of the observed log times
+        self.counts = np.zeros((0, self.num_layers))
+        self.sums = np.zeros((0, self.num_layers))
+        self.squares = np.zeros((0, self.num_layers))
+        self.weights = np.zeros(self.design.shape[1])
+        self.weights_covariance = np.zeros((self.design.shape[1],) * 2)
+        self.offsets = np.zeros(0)
+        self.offsets_variance = np.zeros(0)
+        self.variance = 1.0
+        # variance of the offsets around their class offset, and around 0 for the devices without a class
+        self.offset_variance = 1.0
+        self.population_offset_variance = 1.0
+        self.class_offsets = {}
+
+    @property
+    def num_layers(self) -> int:
+        return len(self.layer_features)
+
+    def is_fitted(self) -> bool:
+        return bool(len(self.offsets))
+
+    def get_device_index(self, device_id: str) -> int:
+        if device_id not in self.device_ids:
+            self.device_ids[device_id] = len(self.device_ids)
+            self.counts = np.vstack([self.counts, np.zeros(self.num_layers)])
+            self.sums = np.vstack([self.sums, np.zeros(self.num_layers)])
+            self.squares = np.vstack([self.squares, np.zeros(self.num_layers)])
+        return self.device_ids[device_id]
+
+    def set_device_class(self, device_id: str, device_class: str) -> None:
+        self.device_classes[device_id] = device_class
+
+    def add(self, device_id: str, layers_times: list | dict) -> None:
+        """Add the times measured on a device, without refitting.
+        Args:
+            device_id: The device the times were measured on.
+            layers_times: The time of the first layers, or of any layers ({layer: time}) for calibrations.
+        """
+        if not isinstance(layers_times, dict):
+            layers_times = dict(enumerate(layers_times))
+        device_index = self.get_device_index(device_id)
+        for layer, layer_time in layers_times.items():
+            layer = int(layer)
+            if layer < self.num_layers and layer_time is not None and layer_time > 0:
+                log_time = np.log(layer_time)
+                self.counts[device_index, layer] += 1
+                self.sums[device_index, layer] += log_time
+                self.squares[device_index, layer] += log_time ** 2
+
+    def update(self, device_id: str, layers_times: list | dict) -> None:
+        """Refine the model with the times reported by a device, refitting every refit_interval reports.
+
+        A device without a fitted offset yet (e.g. a new device sending its calibration) is refitted at once.
+        """
+        self.add(device_id, layers_times)
+        self.pending_reports += 1
+        if self.pending_reports >= self.refit_interval or self.device_ids[device_id] >= len(self.offsets):
+            self.fit()
+
+    def fit(self) -> None:
+        """Fit the layer weights and the device offsets to the observed times."""
+        self.pending_reports = 0
+        if not self.counts.sum():
+            return
+        device_counts = self.counts.sum(axis=1)
+        layer_counts = self.counts.sum(axis=0)
+        # the intercept is not regularized, the log times are far from 0
+        penalty = self.regularization * np.diag([0.0] + [1.0] * (len(self.weights) - 1))
+        precision = self.design.T @ (layer_counts[:, None] * self.design) + penalty
+        offsets = np.zeros(len(self.device_ids))
+        priors = np.zeros(len(self.device_ids))
+        for _ in range(self.iterations):
+            # weights fitted to the log times without the device offsets
+            targets = (self.sums - self.counts * offsets[:, None]).sum(axis=0)
+            self.weights = np.linalg.solve(precision, self.design.T @ targets)
+            predictions = self.design @ self.weights
+            residuals = self.sums - self.counts * predictions
+            # offsets shrunk toward the mean offset of their device class
+            priors = self.get_offset_priors(offsets)
+            offsets_precision = device_counts / self.variance + 1 / self.offset_variance
+            offsets = (residuals.sum(axis=1) / self.variance + priors / self.offset_variance) / offsets_precision
+            squared_errors = (self.squares - 2 * (predictions + offsets[:, None]) * self.sums
+                              + self.counts * (predictions + offsets[:, None]) ** 2)
+            self.variance = max(squared_errors.sum() / self.counts.sum(), self.min_variance)
+            if len(offsets) > 1:
+                self.offset_variance = max(float(np.var(offsets - priors)), self.min_variance)
+        self.offsets = offsets
+        if len(offsets) > 1:
+            self.population_offset_variance = max(float(np.mean(offsets ** 2)), self.offset_variance)
+        self.offsets_variance = 1 / (device_counts / self.variance + 1 / self.offset_variance)
+        self.weights_covariance = self.variance * np.linalg.inv(precision)
+        self.class_offsets = self.get_class_offsets(offsets)
+
+    def get_class_offsets(self, offsets: np.ndarray) -> dict:
+        class_offsets = {}
+        for device_id, device_index in self.device_ids.items():
+            if device_id in self.device_classes:
+                class_offsets.setdefault(self.device_classes[device_id], []).append(offsets[device_index])
+        return {device_class: float(np.mean(values)) for device_class, values in class_offsets.items()}
+
+    def get_offset_priors(self, offsets: np.ndarray) -> np.ndarray:
+        """The prior offset of each device: the mean offset of the other devices of its class, 0 otherwise.
+
+        The mean of the others is the sum of the class without the device, in linear time of the devices.
+        """
+        class_labels = np.full(len(offsets), -1)
+        class_indices = {}
+        for device_id, device_index in self.device_ids.items():
+            device_class = self.device_classes.get(device_id)
+            if device_class is not None:
+                class_labels[device_index] = class_indices.setdefault(device_class, len(class_indices))
+        classified = class_labels >= 0
+        class_sums = np.bincount(class_labels[classified], weights=offsets[classified], minlength=len(class_indices))
+        class_counts = np.bincount(class_labels[classified], minlength=len(class_indices))
+        num_others = np.zeros(len(offsets))
+        num_others[classified] = class_counts[class_labels[classified]] - 1
+        with_others = num_others > 0
+        priors = np.zeros(len(offsets))
+        priors[with_others] = (
+                (class_sums[class_labels[with_others]] - offsets[with_others]) / num_others[with_others]
+        )
+        return priors
+
+    def predict(self, device_id: str | None = None,
+                device_class: str | None = None) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Predict the time of each layer on a device.
+
+        Args:
+            device_id: The device, known from its reports or calibrations, or a new one.
+            device_class: The class of a new device, the offset of its class is used.
+        Returns:
+            The predicted time of each layer and the lower and upper bounds of its confidence interval.
+        """
+        device_class = self.device_classes.get(device_id, device_class)
+        device_index = self.device_ids.get(device_id)
+        if device_index is not None and device_index < len(self.offsets):
+            offset, offset_variance = self.offsets[device_index], self.offsets_variance[device_index]
+        elif device_class in self.class_offsets:
+            # a new device, or one added since the last refit
+            offset, offset_variance = self.class_offsets[device_class], self.offset_variance
+        else:
+            offset, offset_variance = 0.0, self.population_offset_variance
+        if device_index is None:
+            counts = sums = np.zeros(self.num_layers)
+        else:
+            counts, sums = self.counts[device_index], self.sums[device_index]
+        means = self.design @ self.weights + offset
+        variances = (self.variance + offset_variance
+                     + np.einsum('ij,jk,ik->i', self.design, self.weights_covariance, self.design))
+        # the measured layers combine the regression with their own measurements
+        precisions = 1 / variances + counts / self.variance
+        means = (means / variances + sums / self.variance) / precisions
+        variances = 1 / precisions
+        margins = NormalDist().inv_cdf((1 + self.confidence) / 2) * np.sqrt(variances)
+        return np.exp(means), np.exp(means - margins), np.exp(means + margins)
@@ -0,0 +1,52 @@
+from src.offloading_algo.offloading_algo_config import ExitStatisticsConfig
+
+
+class ExitStatistics:
+    """Historical exit probability of each early exit of a model.
+
+    The exit probability of an exit is conditional on the input reaching it: the fraction of the
+    inputs evaluated by the exit head that were confident enough to stop there.
+
+    Args:
+        exit_layers: The layers followed by an exit head, exits first taken later are added on the fly.
+        prior_probability: The exit probability assumed before the first observations.
+        prior_weight: The number of observations the prior is worth.
+    """
+
+    def __init__(
+            self,
+            exit_layers: tuple = (),
+            prior_probability: float = ExitStatisticsConfig.PRIOR_PROBABILITY,
+            prior_weight: float = ExitStatisticsConfig.PRIOR_WEIGHT
+    ):
+        self.prior_probability = prior_probability
+        self.prior_weight = prior_weight
+        self.reached = {exit_layer: 0 for exit_layer in exit_layers}
+        self.taken = {exit_layer: 0 for exit_layer in exit_layers}
+
+    def update(self, exit_layer: int | None, last_layer: int, first_layer: int = 0) -> None:
+        """Record an inference.
+        Args:
+            exit_layer: The exit taken, None if the inference did not stop early.
+            last_layer: The last layer computed when no exit was taken.
+            first_layer: The first layer computed, the exits before it were evaluated elsewhere.
+        """
+        if exit_layer is None and last_layer is None:
+            return
+        if exit_layer is not None and exit_layer not in self.reached:
+            self.reached[exit_layer] = 0
+            self.taken[exit_layer] = 0
+        last_layer = last_layer if exit_layer is None else exit_layer
+        for layer in self.reached:
+            if first_layer <= layer <= last_layer:
+                self.reached[layer] += 1
+        if exit_layer is not None:
+            self.taken[exit_layer] += 1
+
+    def get_exit_probabilities(self) -> dict:
+        """The exit probability of each exit, given the input reaches it."""
+        return {
+            layer: (self.taken[layer] + self.prior_probability * self.prior_weight)
+                   / (self.reached[layer] + self.prior_weight)
+            for layer in sorted(self.reached)
+        }
@@ -0,0 +1,115 @@
+from dataclasses import dataclass, field
+
+from src.logger.log import get_logger
+from src.offloading_algo.offloading_algo import OffloadingAlgo
+
+logger = get_logger("offloading_algo")
+
+
+@dataclass
+class LayerNode:
+    """A layer of a (possibly non-sequential) model graph.
+
+    Attributes:
+        name: The name of the layer.
+        inbound: The names of the layers whose outputs are consumed by this layer.
+        output_size: The size in bytes of the layer output.
+    """
+    name: str
+    inbound: list = field(default_factory=list)
+    output_size: float = 0.0
+
+
+@dataclass
+class GraphCut:
+    """A cut of the model graph: the device runs the layers up to last_device_layer, the edge the rest.
+
+    Attributes:
+        last_device_layer: The index (topological order) of the last layer computed on the device.
+        tensors: The names of the layers whose outputs cross the cut.
+        size: The total size in bytes of the tensors crossing the cut.
+    """
+    last_device_layer: int
+    tensors: list
+    size: float
+
+
+def enumerate_cuts(nodes: list[LayerNode]) -> list[GraphCut]:
+    """Enumerate the valid cuts of a model graph given in topological order.
+
+    Every prefix of a topological order is closed under predecessors, so each prefix is a valid
+    device partition. The tensors crossing the cut are the outputs of device layers consumed by at
+    least one edge layer, the output of the last layer is always sent back as the model result.
+
+    Args:
+        nodes: The layers of the model, in topological order.
+    Returns:
+        The list of cuts, one for each layer.
+    """
+    positions = {node.name: position for position, node in enumerate(nodes)}
+    # last consumer position of each layer output
+    last_use = {node.name: position for position, node in enumerate(nodes)}
+    for position, node in enumerate(nodes):
+        for inbound_name in node.inbound:
+            if positions[inbound_name] >= position:
+                raise ValueError(f"Layers are not in topological order: {inbound_name} -> {node.name}")
+            last_use[inbound_name] = max(last_use[inbound_name], position)
+    last_use[nodes[-1].name] = len(nodes)
+
+    cuts = []
+    for last_device_layer in range(len(nodes)):
+        tensors = [
+            node.name for node in nodes[:last_device_layer + 1]
+            if last_use[node.name] > last_device_layer
+        ]
+        size = sum(nodes[positions[name]].output_size for name in tensors)
+        cuts.append(GraphCut(last_device_layer=last_device_layer, tensors=tensors, size=size))
+    return cuts
+
+
+class GraphOffloadingAlgo:
+    """Offloading over the cuts of a model graph, using the cost model of OffloadingAlgo.
+
+    Args:
+        avg_speed: The average transmission speed.
+        nodes: The layers of the model, in topological order.
+        inference_time_device: The device inference time of each layer.
+        inference_time_edge: The edge inference time of each layer.
+    """
+
+    def __init__(self,
+                 avg_speed: float,
+                 nodes: list[LayerNode],
+                 inference_time_device: list,
+                 inference_time_edge: list
+                 ) -> None:
+        self.avg_speed = avg_speed
+        self.nodes = nodes
+        self.inference_time_device = inference_time_device
+        self.inference_time_edge = inference_time_edge
+        self.cuts = enumerate_cuts(nodes)
+        self.best_cut = None
+        self.lowest_evaluation = float('inf')
+
+    def static_offloading(self) -> int:
+        """Perform Static Offloading over the graph cuts
+        Return:
+            best_offloading_layer: the index of the last layer computed on the device
+        """
+        logger.info(f"Performing Graph Offloading:")
+        logger.info(f"Total Neural Network Layers: {len(self.nodes)}, Valid Cuts: {len(self.cuts)}")
+        for cut in self.cuts:
+            evaluation = OffloadingAlgo.evaluation(
+                initial_cost=sum(self.inference_time_device[:cut.last_device_layer + 1]),
+                layer_data_size=cut.size,
+                edge_computation_cost=sum(self.inference_time_edge[cut.last_device_layer + 1:]),
+                avg_speed=self.avg_speed,
+            )
+            if evaluation < self.lowest_evaluation:
+                self.lowest_evaluation = evaluation
+                self.best_cut = cut
+        logger.info(f"Best Cut: {self.best_cut}")
+        return self.best_cut.last_device_layer
+
+    def get_info(self):
+        return self.__dict__
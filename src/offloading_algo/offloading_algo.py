@@ -1,4 +1,8 @@
-from src.logger.log import logger
+from logging import INFO
+
+from src.logger.log import get_logger
+
+logger = get_logger("offloading_algo")
 
 
 class OffloadingAlgo:
@@ -7,16 +11,48 @@ class OffloadingAlgo:
                  num_layers: int,
                  layers_sizes: list,
                  inference_time_device: list,
-                 inference_time_edge: list
+                 inference_time_edge: list,
+                 deadline: float = float('inf'),
+                 edge_backlog: float = 0.0,
+                 max_data_size: float = float('inf'),
+                 exit_probabilities: dict | None = None
                  ) -> None:
         self.avg_speed = avg_speed
         self.num_layers = num_layers
         self.layers_sizes = layers_sizes
-        self.inference_time_device = inference_time_device
-        self.inference_time_edge = inference_time_edge
+        # probability of each layer being computed, below 1 after an early exit
+        self.reach_probabilities = self.get_reach_probabilities(
+            max(len(inference_time_device), len(inference_time_edge)), exit_probabilities or {}
+        )
+        # expected time of each layer, the layers skipped after a confident exit cost nothing
+        self.inference_time_device = [t * p for t, p in zip(inference_time_device, self.reach_probabilities)]
+        self.inference_time_edge = [t * p for t, p in zip(inference_time_edge, self.reach_probabilities)]
+        # latency budget of the request and queued work waiting on the edge, in seconds
+        self.deadline = deadline
+        self.edge_backlog = edge_backlog
+        # memory available on the edge for the offloaded tensor, larger splits are not admitted
+        self.max_data_size = max_data_size
         self.best_offloading_layer = 0
+        self.best_edge_computation_cost = 0
+        self.best_layer_data_size = 0
         self.lowest_evaluation = float('inf')
 
+    @staticmethod
+    def get_reach_probabilities(num_layers: int, exit_probabilities: dict) -> list:
+        """Probability of each layer being computed
+        Args:
+            num_layers: the number of layers
+            exit_probabilities: the probability of stopping at the exit after each layer, given it is reached
+        Return:
+            the probability of each layer being reached
+        """
+        reach_probabilities = []
+        reach_probability = 1.0
+        for layer in range(num_layers):
+            reach_probabilities.append(reach_probability)
+            reach_probability *= 1 - exit_probabilities.get(layer, 0.0)
+        return reach_probabilities
+
     @staticmethod
     def evaluation(initial_cost: float, layer_data_size: float, edge_computation_cost: list, avg_speed: float) -> float:
         """Perform Evaluation
@@ -28,17 +64,85 @@ class OffloadingAlgo:
         Return:
              evaluation: the evaluation
         """
-        logger.info(f"Performing Evaluation:")
-        logger.info(f"DS:           {layer_data_size}")
-        logger.info(f"IC:           {initial_cost}")
-        logger.info(f"CE:           {edge_computation_cost}")
-        logger.info(f"AvgSpeed:     {avg_speed}")
+        # the evaluation runs for every candidate layer, skip building the log lines when they are filtered out
+        if logger.isEnabledFor(INFO):
+            logger.info(f"Performing Evaluation:")
+            logger.info(f"DS:           {layer_data_size}")
+            logger.info(f"IC:           {initial_cost}")
+            logger.info(f"CE:           {edge_computation_cost}")
+            logger.info(f"AvgSpeed:     {avg_speed}")
         if avg_speed == 0:
             avg_speed = 1
         evaluation = initial_cost + (layer_data_size / avg_speed) + edge_computation_cost
-        logger.info(f"Evaluation =  {evaluation}")
+        if logger.isEnabledFor(INFO):
+            logger.info(f"Evaluation =  {evaluation}")
         return evaluation
 
+    def expected_latency(self, initial_cost: float, layer_data_size: float, edge_computation_cost: float) -> float:
+        """Evaluate a split, adding the edge backlog when the split uses the edge
+        Args:
+            initial_cost: initial cost
+            layer_data_size: layer data size
+            edge_computation_cost: edge computation cost
+        Return:
+             the expected latency of the split
+        """
+        evaluation = self.evaluation(
+            initial_cost=initial_cost,
+            layer_data_size=layer_data_size,
+            avg_speed=self.avg_speed,
+            edge_computation_cost=edge_computation_cost,
+        )
+        return evaluation + (self.edge_backlog if edge_computation_cost > 0 else 0)
+
+    def update_best(self, layer: int, evaluation: float, edge_computation_cost: float,
+                    layer_data_size: float = 0.0) -> None:
+        """Keep the split if it meets the deadline and the memory budget and improves the lowest evaluation"""
+        if layer_data_size > self.max_data_size:
+            return
+        if evaluation <= self.deadline and evaluation < self.lowest_evaluation:
+            self.lowest_evaluation = evaluation
+            self.best_offloading_layer = layer
+            self.best_edge_computation_cost = edge_computation_cost
+            self.best_layer_data_size = layer_data_size
+
+    def get_edge_only_candidate(self) -> tuple[int, float, float, float]:
+        """The edge only split
+        Return:
+             offloading layer, initial cost, layer data size, edge computation cost
+        """
+        return 0, 0, self.layers_sizes[0], sum(self.inference_time_edge[:self.num_layers + 1])
+
+    def get_mixed_candidates(self) -> list[tuple[int, float, float, float]]:
+        """The partial offloading splits, one per offloading layer
+        Return:
+             offloading layer, initial cost, layer data size, edge computation cost of each split
+        """
+        return [
+            (
+                layer,
+                0 if layer == 0 else sum(self.inference_time_device[:layer]),
+                self.layers_sizes[layer + 1],
+                sum(self.inference_time_edge[layer:self.num_layers])
+            )
+            for layer in range(0, self.num_layers - 1)
+        ]
+
+    def get_device_only_candidate(self) -> tuple[int, float, float, float]:
+        """The device only split
+        Return:
+             offloading layer, initial cost, layer data size, edge computation cost
+        """
+        initial_cost = sum(self.inference_time_device[:self.num_layers + 1])
+        return self.num_layers, initial_cost, self.layers_sizes[self.num_layers], 0
+
+    def get_candidates(self) -> list[tuple[int, float, float, float]]:
+        """The candidate splits in evaluation order: edge only, partial offloading at each layer, device only
+        Return:
+             offloading layer, initial cost, layer data size, edge computation cost of each split
+        """
+        return [self.get_edge_only_candidate(), *self.get_mixed_candidates(), self.get_device_only_candidate()]
+
     def edge_only_computation_evaluation(self):
         """Perform Edge Only Offloading
         Return:
@@ -46,16 +150,14 @@ class OffloadingAlgo:
         """
         logger.info(f"Performing Edge Only Offloading:")
 
-        initial_cost = 0
-        first_layer_size = self.layers_sizes[0]
-        edge_computation_cost = sum(self.inference_time_edge[:self.num_layers + 1])
+        _, initial_cost, first_layer_size, edge_computation_cost = self.get_edge_only_candidate()
 
-        self.lowest_evaluation = self.evaluation(
+        evaluation = self.expected_latency(
             initial_cost=initial_cost,
             layer_data_size=first_layer_size,
-            avg_speed=self.avg_speed,
             edge_computation_cost=edge_computation_cost,
         )
+        self.update_best(0, evaluation, edge_computation_cost, first_layer_size)
 
     def mixed_computation_evaluation(self):
         """Perform Partial Offloading
@@ -63,21 +165,14 @@ class OffloadingAlgo:
              None
         """
         logger.info(f"Performing Partial Offloading:")
-        for layer in range(0, self.num_layers - 1):
-            initial_cost = (0 if layer == 0 else sum(self.inference_time_device[:layer]))
-            edge_computation_cost = sum(self.inference_time_edge[layer:self.num_layers])
-            layer_data_size = self.layers_sizes[layer + 1]
-
-            evaluation = self.evaluation(
+        for layer, initial_cost, layer_data_size, edge_computation_cost in self.get_mixed_candidates():
+            # the tensor is only uploaded when no exit on the device was confident
+            evaluation = self.expected_latency(
                 initial_cost=initial_cost,
-                layer_data_size=layer_data_size,
-                avg_speed=self.avg_speed,
+                layer_data_size=layer_data_size * self.reach_probabilities[layer],
                 edge_computation_cost=edge_computation_cost,
             )
-
-            if evaluation < self.lowest_evaluation:
-                self.lowest_evaluation = evaluation
-                self.best_offloading_layer = layer
+            self.update_best(layer, evaluation, edge_computation_cost, layer_data_size)
 
     def device_only_evaluation(self):
         """Perform Device Only Offloading
@@ -85,24 +180,19 @@ class OffloadingAlgo:
              None
         """
         logger.info(f"Performing Device Only Offloading:")
-        initial_cost = sum(self.inference_time_device[:self.num_layers + 1])
-        layer_data_size = self.layers_sizes[self.num_layers]
-        edge_computation_cost = 0
+        _, initial_cost, layer_data_size, edge_computation_cost = self.get_device_only_candidate()
         # No Offloading: Device Only Computation
-        last_evaluation = self.evaluation(
+        last_evaluation = self.expected_latency(
             initial_cost=initial_cost,
             layer_data_size=layer_data_size,
-            avg_speed=self.avg_speed,
             edge_computation_cost=edge_computation_cost,
         )
-        if last_evaluation < self.lowest_evaluation:
-            self.best_offloading_layer = self.num_layers
-            self.lowest_evaluation = last_evaluation
+        self.update_best(self.num_layers, last_evaluation, edge_computation_cost, layer_data_size)
 
-    def static_offloading(self) -> int:
+    def static_offloading(self) -> int | None:
         """Perform Static Offloading
         Return:
-            best_offloading_layer: int
+            best_offloading_layer: int, None if no split meets the deadline and the memory budget
         """
         logger.info(f"Performing Static Offloading:")
         logger.info(f"Total Neural Network Layers: {self.num_layers}")
@@ -115,6 +205,9 @@ class OffloadingAlgo:
         logger.info(f"Lowest Evaluation: {self.lowest_evaluation}")
         logger.info(f"Best Offloading Layer: {self.best_offloading_layer}")
         logger.info(f"Ended Offloading Process")
+        if self.lowest_evaluation == float('inf'):
+            logger.info(f"No offloading layer meets the deadline {self.deadline} and the memory {self.max_data_size}")
+            return None
         return self.best_offloading_layer
 
     def get_info(self):
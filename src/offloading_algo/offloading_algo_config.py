@@ -0,0 +1,36 @@
+from dataclasses import dataclass
+
+
+@dataclass
+class TimingHistogramsConfig:
+    # log-spaced bins of about 4% from 1 microsecond to 1000 seconds
+    MIN_TIME: float = 1e-6
+    MAX_TIME: float = 1e3
+    NUM_BINS: int = 512
+    DECAY: float = 0.99
+
+
+@dataclass
+class PercentileOffloadingConfig:
+    PERCENTILE: float = 95.0
+    NUM_SAMPLES: int = 1024
+    SEED: int = 0
+
+
+@dataclass
+class ExitStatisticsConfig:
+    # exit probability assumed before the first observations of an exit, weighted as PRIOR_WEIGHT observations
+    PRIOR_PROBABILITY: float = 0.0
+    PRIOR_WEIGHT: float = 1.0
+
+
+@dataclass
+class DeviceTimingModelConfig:
+    # ridge regularization of the weights of the log layer features
+    REGULARIZATION: float = 1.0
+    ITERATIONS: int = 5
+    # floor of the variances of the log times, a single device or a perfect fit would give 0
+    MIN_VARIANCE: float = 1e-4
+    CONFIDENCE: float = 0.95
+    # reports added between two refits, the first report of a device is fitted at once
+    REFIT_INTERVAL: int = 32
@@ -0,0 +1,118 @@
+import numpy as np
+
+from src.logger.log import get_logger
+from src.offloading_algo.offloading_algo_config import PercentileOffloadingConfig
+from src.offloading_algo.timing_histograms import LayerTimingHistograms
+
+logger = get_logger("offloading_algo")
+
+
+class PercentileOffloadingAlgo:
+    """Offloading that minimizes a percentile of the end-to-end latency instead of its mean.
+
+    The candidate splits and their cost terms are the same as OffloadingAlgo: device time of the
+    computed layers, transfer time of the offloaded layer and edge time of the remaining layers.
+    Each term is a distribution: the layer times are stratified samples of the timing histograms
+    and the transfer time is either deterministic or sampled from the observed link speeds. All the
+    candidates are evaluated at once as (candidates, layers) @ (layers, samples) products.
+
+    Args:
+        avg_speed: The average transmission speed.
+        num_layers: The index of the last layer.
+        layers_sizes: The size of each layer.
+        device_histograms: The timing histograms of the device layers.
+        edge_histograms: The timing histograms of the edge layers.
+        percentile: The percentile of the end-to-end latency to minimize.
+        speed_samples: Optional observed link speeds, used instead of avg_speed for the transfer time.
+        deadline: The latency budget, the percentile latency of the chosen split must meet it.
+        edge_backlog: The queued work on the edge, added to the splits using the edge.
+        max_data_size: The memory available on the edge for the offloaded tensor, larger splits are not admitted.
+    """
+
+    def __init__(self,
+                 avg_speed: float,
+                 num_layers: int,
+                 layers_sizes: list,
+                 device_histograms: LayerTimingHistograms,
+                 edge_histograms: LayerTimingHistograms,
+                 percentile: float = PercentileOffloadingConfig.PERCENTILE,
+                 speed_samples: list | None = None,
+                 deadline: float = float('inf'),
+                 edge_backlog: float = 0.0,
+                 max_data_size: float = float('inf')
+                 ) -> None:
+        self.avg_speed = avg_speed if avg_speed != 0 else 1
+        self.num_layers = num_layers
+        self.layers_sizes = np.asarray(layers_sizes, dtype=float)
+        self.device_histograms = device_histograms
+        self.edge_histograms = edge_histograms
+        self.percentile = percentile
+        self.speed_samples = speed_samples
+        self.deadline = deadline
+        self.edge_backlog = edge_backlog
+        self.max_data_size = max_data_size
+        self.best_offloading_layer = 0
+        self.best_layer_data_size = 0.0
+        self.best_edge_computation_cost = 0.0
+        self.lowest_evaluation = float('inf')
+        self.evaluations = None
+
+    def get_candidates(self) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Build the candidate splits of OffloadingAlgo as layer masks.
+        Return:
+            offloading layers, device layers mask, edge layers mask, transferred data sizes
+        """
+        num_profiled_layers = self.device_histograms.num_layers
+        layer_ids = np.arange(num_profiled_layers)
+        mixed_layers = np.arange(0, self.num_layers - 1)
+        # edge only, partial offloading at each layer, device only
+        offloading_layers = np.concatenate([[0], mixed_layers, [self.num_layers]])
+        device_ends = np.concatenate([[0], mixed_layers, [self.num_layers + 1]])
+        edge_starts = np.concatenate([[0], mixed_layers, [num_profiled_layers]])
+        edge_ends = np.concatenate([[self.num_layers + 1], np.full(len(mixed_layers), self.num_layers), [0]])
+        data_sizes = self.layers_sizes[np.concatenate([[0], mixed_layers + 1, [self.num_layers]])]
+        device_mask = layer_ids[None, :] < device_ends[:, None]
+        edge_mask = (layer_ids[None, :] >= edge_starts[:, None]) & (layer_ids[None, :] < edge_ends[:, None])
+        return offloading_layers, device_mask, edge_mask, data_sizes
+
+    def percentile_offloading(self) -> int | None:
+        """Perform Percentile Offloading
+        Return:
+            best_offloading_layer: int, None if no split meets the deadline and the memory budget
+        """
+        rng = np.random.default_rng(PercentileOffloadingConfig.SEED)
+        num_samples = PercentileOffloadingConfig.NUM_SAMPLES
+        offloading_layers, device_mask, edge_mask, data_sizes = self.get_candidates()
+
+        device_samples = self.device_histograms.get_quantile_samples(num_samples, rng)
+        edge_samples = self.edge_histograms.get_quantile_samples(num_samples, rng)
+        if self.speed_samples is None:
+            transfer_samples = (data_sizes / self.avg_speed)[:, None]
+        else:
+            speeds = rng.choice(np.asarray(self.speed_samples, dtype=float), size=num_samples)
+            transfer_samples = data_sizes[:, None] / np.where(speeds > 0, speeds, 1)[None, :]
+        uses_edge = edge_mask.any(axis=1)
+
+        latencies = (
+                device_mask.astype(float) @ device_samples
+                + transfer_samples
+                + edge_mask.astype(float) @ edge_samples
+                + np.where(uses_edge, self.edge_backlog, 0)[:, None]
+        )
+        self.evaluations = np.percentile(latencies, self.percentile, axis=1)
+        is_feasible = (self.evaluations <= self.deadline) & (data_sizes <= self.max_data_size)
+        feasible_evaluations = np.where(is_feasible, self.evaluations, np.inf)
+        best_candidate = int(np.argmin(feasible_evaluations))
+        self.lowest_evaluation = float(feasible_evaluations[best_candidate])
+        logger.info(f"Percentile Offloading: p{self.percentile} latency {self.lowest_evaluation}")
+        if self.lowest_evaluation == float('inf'):
+            logger.info(f"No offloading layer meets the deadline {self.deadline} and the memory {self.max_data_size}")
+            return None
+        self.best_offloading_layer = int(offloading_layers[best_candidate])
+        self.best_layer_data_size = float(data_sizes[best_candidate])
+        # mean edge time of the layers the split leaves to the edge, as in OffloadingAlgo
+        self.best_edge_computation_cost = float(edge_mask[best_candidate] @ self.edge_histograms.get_mean())
+        return self.best_offloading_layer
+
+    def get_info(self):
+        return self.__dict__
@@ -0,0 +1,109 @@
+import json
+
+import numpy as np
+
+from src.offloading_algo.offloading_algo_config import TimingHistogramsConfig
+
+
+class LayerTimingHistograms:
+    """Log-spaced histograms of the inference time of each layer, stored as one (layers, bins) array.
+
+    The bins have the same relative width from min_time to max_time, so the times of the fast layers and
+    of the slow devices are resolved alike. The first bin collects the times below min_time (e.g. 0 for
+    the layers without computation) and the last one the times beyond max_time.
+
+    Args:
+        num_layers: The number of layers.
+        min_time: The lower edge in seconds of the first log-spaced bin.
+        max_time: The upper edge in seconds of the last bin.
+        num_bins: The number of bins of each histogram.
+        decay: The factor applied to the counts at each update, 1 to weight all the history equally.
+    """
+
+    def __init__(
+            self,
+            num_layers: int,
+            min_time: float = TimingHistogramsConfig.MIN_TIME,
+            max_time: float = TimingHistogramsConfig.MAX_TIME,
+            num_bins: int = TimingHistogramsConfig.NUM_BINS,
+            decay: float = TimingHistogramsConfig.DECAY
+    ):
+        self.min_time = min_time
+        self.max_time = max_time
+        self.num_bins = num_bins
+        self.decay = decay
+        self.edges = np.concatenate([[0.0], np.geomspace(min_time, max_time, num_bins)])
+        # geometric center of the log-spaced bins, the middle of the first bin
+        self.centers = np.concatenate([[min_time / 2], np.sqrt(self.edges[1:-1] * self.edges[2:])])
+        self.counts = np.zeros((num_layers, num_bins))
+
+    @property
+    def num_layers(self) -> int:
+        return self.counts.shape[0]
+
+    @classmethod
+    def from_times(cls, layers_times: list, **kwargs) -> "LayerTimingHistograms":
+        """Create the histograms from one observed time per layer (e.g. the scalar profiles)."""
+        histograms = cls(len(layers_times), **kwargs)
+        histograms.update(layers_times)
+        return histograms
+
+    def get_bins(self, times: np.ndarray) -> np.ndarray:
+        bins = np.searchsorted(self.edges, np.asarray(times, dtype=float), side='right') - 1
+        return np.clip(bins, 0, self.num_bins - 1)
+
+    def update(self, layers_times: list, first_layer: int = 0) -> None:
+        """Add the times observed for consecutive layers from first_layer, the first layers for a device report."""
+        layers_times = np.asarray(layers_times, dtype=float)[:max(self.num_layers - first_layer, 0)]
+        layers = np.arange(first_layer, first_layer + len(layers_times))
+        if self.decay != 1:
+            self.counts[layers] *= self.decay
+        self.counts[layers, self.get_bins(layers_times)] += 1
+
+    def get_centers(self) -> np.ndarray:
+        return self.centers
+
+    def get_mean(self) -> np.ndarray:
+        """The mean time of each layer, 0 for the layers without observations."""
+        totals = self.counts.sum(axis=1)
+        return np.divide(self.counts @ self.get_centers(), totals, out=np.zeros(self.num_layers), where=totals > 0)
+
+    def get_quantile_samples(self, num_samples: int, rng: np.random.Generator) -> np.ndarray:
+        """Draw stratified samples of the time of each layer, independently shuffled across layers.
+
+        Args:
+            num_samples: The number of samples per layer.
+            rng: The random generator used to shuffle the samples.
+        Returns:
+            The (layers, samples) array of times, 0 for the layers without observations.
+        """
+        totals = self.counts.sum(axis=1, keepdims=True)
+        cdf = np.cumsum(self.counts, axis=1) / np.where(totals > 0, totals, 1)
+        quantiles = (np.arange(num_samples) + 0.5) / num_samples
+        bins = np.stack([np.searchsorted(layer_cdf, quantiles) for layer_cdf in cdf])
+        samples = np.where(totals > 0, self.centers[np.minimum(bins, self.num_bins - 1)], 0)
+        return rng.permuted(samples, axis=1)
+
+    def get_parameters(self) -> dict:
+        """The bins and the decay of the histograms, without their counts."""
+        return {"min_time": self.min_time, "max_time": self.max_time, "decay": self.decay}
+
+    def to_dict(self) -> dict:
+        return {**self.get_parameters(), "counts": self.counts.tolist()}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "LayerTimingHistograms":
+        counts = np.asarray(data["counts"], dtype=float)
+        histograms = cls(counts.shape[0], min_time=data["min_time"], max_time=data["max_time"],
+                         num_bins=counts.shape[1], decay=data["decay"])
+        histograms.counts = counts
+        return histograms
+
+    def save(self, file_path: str) -> None:
+        with open(file_path, 'w') as f:
+            json.dump(self.to_dict(), f)
+
+    @classmethod
+    def load(cls, file_path: str) -> "LayerTimingHistograms":
+        with open(file_path, 'r') as f:
+            return cls.from_dict(json.load(f))
@@ -0,0 +1,360 @@
+import argparse
+import json
+import queue
+import random
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from types import SimpleNamespace
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+import paho.mqtt.client as mqtt
+
+from src.commons import OffloadingDataFiles
+from src.logger.log import get_logger
+from src.models.model_registry import load_profile_values
+from src.mqtt_client.mqtt_configs import MqttClientConfig, Topics
+from src.simulator.simulator_config import SimulatorConfig
+
+logger = get_logger("simulator")
+
+
+class InProcessBroker:
+    """In-process stand-in for the MQTT broker: exact topic matching, delivery in publish order on one thread."""
+
+    def __init__(self):
+        # topic -> callbacks (topic, payload)
+        self.subscribers = {}
+        self.queue = queue.SimpleQueue()
+        self.thread = threading.Thread(target=self.dispatch, daemon=True)
+        self.thread.start()
+
+    def subscribe(self, topic: str, callback: Callable) -> None:
+        self.subscribers.setdefault(topic, []).append(callback)
+
+    def publish(self, topic: str, payload: bytes) -> None:
+        self.queue.put((topic, payload))
+
+    def dispatch(self) -> None:
+        while (item := self.queue.get()) is not None:
+            topic, payload = item
+            for callback in list(self.subscribers.get(topic, [])):
+                try:
+                    callback(topic, payload)
+                except Exception as e:
+                    logger.error(f"Subscriber of {topic} failed: {e}")
+
+    def stop(self) -> None:
+        self.queue.put(None)
+        self.thread.join()
+
+
+class InProcessClient:
+    """Stand-in for the paho client of the edge MqttClient, publishing to an InProcessBroker."""
+
+    def __init__(self, broker: InProcessBroker, on_message: Callable):
+        self.broker = broker
+        self.on_message = on_message
+
+    def publish(self, topic: str, payload, qos: int = 0, retain: bool = False) -> None:
+        self.broker.publish(topic, payload.encode() if isinstance(payload, str) else payload)
+
+    def subscribe(self, topic: str) -> None:
+        self.broker.subscribe(
+            topic, lambda t, p: self.on_message(self, None, SimpleNamespace(topic=t, payload=p))
+        )
+
+    def connect(self, *args, **kwargs) -> None:
+        pass
+
+    def loop_forever(self) -> None:
+        pass
+
+    def disconnect(self) -> None:
+        pass
+
+
+def attach_edge(broker: InProcessBroker, edge) -> None:
+    """Connect an edge MqttClient to the in-process broker instead of the real one."""
+    edge.client = InProcessClient(broker, edge.on_message)
+    for topic in edge.subscribed_topics:
+        edge.client.subscribe(topic)
+
+
+class MqttTransport:
+    """Single MQTT connection shared by all the simulated devices."""
+
+    def __init__(self, broker_url: str, broker_port: int, client_id: str = "device_simulator"):
+        self.callbacks = {}
+        self.client = mqtt.Client(client_id=client_id, protocol=MqttClientConfig.protocol)
+        self.client.on_message = self.on_message
+        self.client.connect(broker_url, broker_port, 60)
+        self.client.loop_start()
+
+    def on_message(self, client, userdata, message) -> None:
+        for callback in self.callbacks.get(message.topic, []):
+            callback(message.topic, message.payload)
+
+    def subscribe(self, topic: str, callback: Callable) -> None:
+        self.callbacks.setdefault(topic, []).append(callback)
+        self.client.subscribe(topic)
+
+    def publish(self, topic: str, payload: bytes) -> None:
+        self.client.publish(topic, payload, qos=2)
+
+    def stop(self) -> None:
+        self.client.loop_stop()
+        self.client.disconnect()
+
+
+@dataclass
+class RequestRecord:
+    device_id: str
+    message_id: str
+    start_time: float
+    ask_time: float = None
+    result_time: float = None
+    end_time: float = None
+    offloading_layer_index: int = None
+    error: str = None
+
+
+class DeviceFleet:
+    """Simulated devices speaking the edge protocol: registration, AskInference reply, EndComputation.
+
+    Each device is a thread capturing frames following its arrival process and keeping up to
+    pipeline_depth requests in flight, its layers computing one request at a time. Transmissions are delayed
+    by the link model (base latency plus size over a log-normal speed) and the device layers by the
+    compute profile, scaled by compute_scale. Edge messages are routed to devices by message id.
+
+    Args:
+        transport: The broker connection (InProcessBroker or MqttTransport).
+        device_inference_times: The device inference time of each layer.
+        layers_sizes: The output size in bytes of each layer.
+        arrival_process: 'poisson' or 'periodic'.
+        arrival_rate: The requests per second of each device.
+        link_speed: The median link speed in bytes per second.
+        link_speed_sigma: The log-normal sigma of the link speed of each request, 0 for a constant speed.
+        link_base_latency: The fixed latency of each transmission, in seconds.
+        compute_scale: The factor applied to the device inference times.
+        response_timeout: The time a device waits for each edge message, in seconds.
+        pipeline_depth: The maximum number of in-flight requests of a device.
+    """
+
+    def __init__(
+            self,
+            transport,
+            device_inference_times: list,
+            layers_sizes: list,
+            arrival_process: str = SimulatorConfig.ARRIVAL_PROCESS,
+            arrival_rate: float = SimulatorConfig.ARRIVAL_RATE,
+            link_speed: float = SimulatorConfig.LINK_SPEED,
+            link_speed_sigma: float = SimulatorConfig.LINK_SPEED_SIGMA,
+            link_base_latency: float = SimulatorConfig.LINK_BASE_LATENCY,
+            compute_scale: float = SimulatorConfig.COMPUTE_SCALE,
+            response_timeout: float = SimulatorConfig.RESPONSE_TIMEOUT,
+            pipeline_depth: int = SimulatorConfig.PIPELINE_DEPTH
+    ):
+        if arrival_process not in ("poisson", "periodic"):
+            raise ValueError(f"Unknown arrival process: {arrival_process}")
+        self.transport = transport
+        self.device_inference_times = list(device_inference_times)
+        self.layers_sizes = list(layers_sizes)
+        self.arrival_process = arrival_process
+        self.arrival_rate = arrival_rate
+        self.link_speed = link_speed
+        self.link_speed_sigma = link_speed_sigma
+        self.link_base_latency = link_base_latency
+        self.compute_scale = compute_scale
+        self.response_timeout = response_timeout
+        self.pipeline_depth = pipeline_depth
+        # message id -> inbox of the device waiting for it
+        self.inboxes = {}
+        self.records = []
+        self.lock = threading.Lock()
+        self.transport.subscribe(Topics.device_inference.value, self.on_edge_message)
+        self.transport.subscribe(Topics.end_computation.value, self.on_edge_message)
+
+    def on_edge_message(self, topic: str, payload: bytes) -> None:
+        message_data = json.loads(payload)
+        inbox = self.inboxes.get(message_data.get("message_id"))
+        if inbox is not None:
+            inbox.put(message_data)
+
+    def get_interarrival_time(self, rng: random.Random) -> float:
+        if self.arrival_process == "poisson":
+            return rng.expovariate(self.arrival_rate)
+        return 1 / self.arrival_rate
+
+    def transmit(self, topic: str, message_data: dict, link_speed: float) -> None:
+        payload = json.dumps(message_data).encode()
+        time.sleep(self.link_base_latency + len(payload) / link_speed)
+        self.transport.publish(topic, payload)
+
+    def receive(self, inbox: queue.SimpleQueue) -> dict:
+        try:
+            return inbox.get(timeout=self.response_timeout)
+        except queue.Empty:
+            raise TimeoutError
+
+    def run_request(self, device_id: str, rng: random.Random, compute_lock: threading.Lock) -> RequestRecord:
+        """Run one registration -> inference -> end cycle, computing the device layers under compute_lock."""
+        message_id = uuid.uuid4().hex[:8]
+        inbox = queue.SimpleQueue()
+        self.inboxes[message_id] = inbox
+        record = RequestRecord(device_id=device_id, message_id=message_id, start_time=time.time())
+        link_speed = self.link_speed * rng.lognormvariate(0, self.link_speed_sigma)
+        try:
+            self.transmit(Topics.registration.value, {
+                "timestamp": str(time.time()),
+                "message_id": message_id,
+                "device_id": device_id,
+                "message_content": "HelloWorld!",
+            }, link_speed)
+            ask_message = self.receive(inbox)
+            record.ask_time = time.time()
+            if ask_message["message_content"] != "AskInference":
+                record.error = ask_message["message_content"]
+                return record
+
+            # compute the layers up to the offloading one and send the layer output
+            offloading_layer_index = int(ask_message["offloading_layer_index"])
+            record.offloading_layer_index = offloading_layer_index
+            layers_inference_time = self.device_inference_times[:offloading_layer_index + 1]
+            with compute_lock:
+                time.sleep(sum(layers_inference_time) * self.compute_scale)
+            output_size = self.layers_sizes[min(offloading_layer_index, len(self.layers_sizes) - 1)]
+            self.transmit(Topics.device_inference_result.value, {
+                "timestamp": str(time.time()),
+                "message_id": message_id,
+                "device_id": device_id,
+                "message_content": {
+                    "layer_output": ["0.0"] * int(output_size // 4),
+                    "offloading_layer_index": offloading_layer_index,
+                    "layers_inference_time": layers_inference_time,
+                },
+            }, link_speed)
+            record.result_time = time.time()
+
+            end_message = self.receive(inbox)
+            record.end_time = time.time()
+            if end_message["message_content"] != "EndComputation":
+                record.error = end_message["message_content"]
+        except TimeoutError:
+            record.error = "timeout"
+        finally:
+            self.inboxes.pop(message_id, None)
+        return record
+
+    def run_device(self, device_id: str, stop_event: threading.Event) -> None:
+        rng = random.Random(device_id)
+        compute_lock = threading.Lock()
+        pipeline = threading.BoundedSemaphore(self.pipeline_depth)
+        requests = []
+
+        def run_pipelined_request():
+            try:
+                record = self.run_request(device_id, rng, compute_lock)
+                with self.lock:
+                    self.records.append(record)
+            finally:
+                pipeline.release()
+
+        while not stop_event.wait(self.get_interarrival_time(rng)):
+            # the next frame waits for a free pipeline slot
+            pipeline.acquire()
+            request = threading.Thread(target=run_pipelined_request, daemon=True)
+            request.start()
+            requests.append(request)
+            requests = [request for request in requests if request.is_alive()]
+        for request in requests:
+            request.join()
+
+    def run_stage(self, num_devices: int, duration: float) -> dict:
+        """Run num_devices devices for duration seconds and summarize their requests."""
+        stop_event = threading.Event()
+        first_record = len(self.records)
+        devices = [
+            threading.Thread(target=self.run_device, args=(f"sim_{num_devices}_{i}", stop_event), daemon=True)
+            for i in range(num_devices)
+        ]
+        start_time = time.time()
+        for device in devices:
+            device.start()
+        time.sleep(duration)
+        stop_event.set()
+        for device in devices:
+            device.join()
+        with self.lock:
+            stage_records = self.records[first_record:]
+        return summarize_records(stage_records, num_devices, time.time() - start_time)
+
+    def run_ramp(self, device_counts: list[int], stage_duration: float) -> pd.DataFrame:
+        stages = []
+        for num_devices in device_counts:
+            logger.info(f"Simulating {num_devices} devices for {stage_duration} seconds")
+            stages.append(self.run_stage(num_devices, stage_duration))
+        return pd.DataFrame(stages)
+
+
+def summarize_records(records: list[RequestRecord], num_devices: int, elapsed_time: float) -> dict:
+    """Throughput, error rate and per-phase latency percentiles (in ms) of a set of requests."""
+    frame = pd.DataFrame([record.__dict__ for record in records], columns=list(RequestRecord.__annotations__))
+    completed = frame[frame["error"].isna()]
+    phases = {
+        "decision": completed["ask_time"] - completed["start_time"],
+        "device": completed["result_time"] - completed["ask_time"],
+        "completion": completed["end_time"] - completed["result_time"],
+        "end_to_end": completed["end_time"] - completed["start_time"],
+    }
+    summary = {
+        "devices": num_devices,
+        "requests": len(frame),
+        "throughput_rps": len(completed) / elapsed_time,
+        "error_rate": 1 - len(completed) / len(frame) if len(frame) else 0.0,
+    }
+    for phase, latencies in phases.items():
+        latencies = latencies.to_numpy(dtype=float) * 1000
+        for q in (50, 95, 99):
+            summary[f"{phase}_p{q}_ms"] = np.percentile(latencies, q) if len(latencies) else float('nan')
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the edge with simulated devices")
+    parser.add_argument("--in-process", action="store_true", help="run the edge and a stand-in broker in process")
+    parser.add_argument("--broker-url", default=MqttClientConfig.broker_url)
+    parser.add_argument("--broker-port", type=int, default=MqttClientConfig.broker_port)
+    parser.add_argument("--device-counts", type=int, nargs="+", default=list(SimulatorConfig.DEVICE_COUNTS))
+    parser.add_argument("--stage-duration", type=float, default=SimulatorConfig.STAGE_DURATION)
+    parser.add_argument("--arrival-process", choices=["poisson", "periodic"], default=SimulatorConfig.ARRIVAL_PROCESS)
+    parser.add_argument("--arrival-rate", type=float, default=SimulatorConfig.ARRIVAL_RATE)
+    parser.add_argument("--link-speed", type=float, default=SimulatorConfig.LINK_SPEED)
+    parser.add_argument("--compute-scale", type=float, default=SimulatorConfig.COMPUTE_SCALE)
+    parser.add_argument("--pipeline-depth", type=int, default=SimulatorConfig.PIPELINE_DEPTH)
+    args = parser.parse_args()
+
+    if args.in_process:
+        from src.mqtt_client.mqtt_client import MqttClient
+        simulator_transport = InProcessBroker()
+        edge = MqttClient(subscribed_topics=MqttClientConfig.subscribe_topics)
+        attach_edge(simulator_transport, edge)
+    else:
+        simulator_transport = MqttTransport(args.broker_url, args.broker_port)
+
+    fleet = DeviceFleet(
+        transport=simulator_transport,
+        device_inference_times=load_profile_values(OffloadingDataFiles.data_file_path_device),
+        layers_sizes=load_profile_values(OffloadingDataFiles.data_file_path_sizes),
+        arrival_process=args.arrival_process,
+        arrival_rate=args.arrival_rate,
+        link_speed=args.link_speed,
+        compute_scale=args.compute_scale,
+        pipeline_depth=args.pipeline_depth,
+    )
+    results = fleet.run_ramp(args.device_counts, args.stage_duration)
+    print(results.to_string(index=False, float_format=lambda value: f"{value:.2f}"))
+    simulator_transport.stop()
@@ -0,0 +1,18 @@
+from dataclasses import dataclass
+
+
+@dataclass
+class SimulatorConfig:
+    ARRIVAL_PROCESS: str = "poisson"
+    ARRIVAL_RATE: float = 1.0
+    LINK_SPEED: float = 250_000.0
+    LINK_SPEED_SIGMA: float = 0.3
+    LINK_BASE_LATENCY: float = 0.005
+    COMPUTE_SCALE: float = 1.0
+    RESPONSE_TIMEOUT: float = 10.0
+    DEVICE_COUNTS: tuple = (1, 2, 4, 8, 16)
+    STAGE_DURATION: float = 10.0
+    # in-flight requests of a device, 1 for the sequential registration -> inference -> end cycle
+    PIPELINE_DEPTH: int = 1
+    # requests the edge computes at once in the trace replay
+    EDGE_SERVERS: int = 1
@@ -0,0 +1,326 @@
+import argparse
+import heapq
+import time
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+from src.commons import OffloadingDataFiles
+from src.logger.log import get_logger
+from src.models.model_registry import load_profile_values
+from src.offloading_algo.offloading_algo import OffloadingAlgo
+from src.offloading_algo.percentile_offloading_algo import PercentileOffloadingAlgo
+from src.offloading_algo.timing_histograms import LayerTimingHistograms
+from src.simulator.simulator_config import SimulatorConfig
+
+logger = get_logger("simulator")
+
+# columns of the evaluation files needed to replay the registrations
+TRACE_COLUMNS = ["topic", "device_id", "message_id", "timestamp", "avg_speed"]
+TRACE_DTYPES = {"topic": str, "device_id": str, "message_id": str, "timestamp": np.float64, "avg_speed": np.float64}
+
+
+def load_request_trace(file_paths: list[str], chunk_size: int = 100_000) -> pd.DataFrame:
+    """Read the registrations of evaluation files as requests.
+    Returns:
+        The device id, arrival time (seconds from the first request) and measured link speed of each
+        request, in arrival order.
+    """
+    registrations = []
+    for file_path in file_paths:
+        for chunk in pd.read_csv(file_path, usecols=TRACE_COLUMNS, dtype=TRACE_DTYPES, chunksize=chunk_size):
+            # the registration topic has an empty last level, matching any device id
+            is_registration = chunk["topic"].str.rsplit("/", n=1).str[-1] == ""
+            registrations.append(chunk.loc[is_registration, ["device_id", "timestamp", "avg_speed"]])
+    trace = pd.concat(registrations, ignore_index=True).rename(columns={"timestamp": "arrival_time"})
+    trace = trace.sort_values("arrival_time", kind="stable", ignore_index=True)
+    trace["arrival_time"] -= trace["arrival_time"].min()
+    return trace
+
+
+def load_bandwidth_trace(file_path: str) -> tuple[np.ndarray, np.ndarray]:
+    """Read link speed samples ('timestamp' and 'speed' in bytes per second columns), in time order."""
+    samples = pd.read_csv(file_path, usecols=["timestamp", "speed"], dtype=np.float64).sort_values("timestamp")
+    return samples["timestamp"].to_numpy(), samples["speed"].to_numpy()
+
+
+def make_synthetic_trace(num_requests: int, num_devices: int, arrival_rate: float = SimulatorConfig.ARRIVAL_RATE,
+                         link_speed: float = SimulatorConfig.LINK_SPEED,
+                         link_speed_sigma: float = SimulatorConfig.LINK_SPEED_SIGMA, seed: int = 0) -> pd.DataFrame:
+    """A trace of Poisson arrivals from num_devices devices, each at arrival_rate, with log-normal link speeds."""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "device_id": rng.integers(num_devices, size=num_requests).astype(str),
+        "arrival_time": np.cumsum(rng.exponential(1 / (arrival_rate * num_devices), size=num_requests)),
+        "avg_speed": link_speed * rng.lognormal(0, link_speed_sigma, size=num_requests),
+    })
+
+
+def get_split_costs(device_inference_times: list, edge_inference_times: list,
+                    layers_sizes: list) -> tuple[dict, dict, dict]:
+    """The device time, transferred bytes and edge time of each split, from the candidates of OffloadingAlgo.
+
+    The costs of a split are the ones OffloadingAlgo evaluated when it returned it, keyed by the offloading
+    layer. Split 0 is both the edge only split and the partial offloading at layer 0, it is replayed as the
+    edge only split, which OffloadingAlgo keeps on equal evaluations.
+    """
+    offloading_algo = OffloadingAlgo(
+        avg_speed=1,
+        num_layers=len(layers_sizes) - 1,
+        layers_sizes=layers_sizes,
+        inference_time_device=device_inference_times,
+        inference_time_edge=edge_inference_times
+    )
+    device_costs, data_sizes, edge_costs = {}, {}, {}
+    for layer, initial_cost, layer_data_size, edge_computation_cost in offloading_algo.get_candidates():
+        if layer not in device_costs:
+            device_costs[layer] = float(initial_cost)
+            data_sizes[layer] = float(layer_data_size)
+            edge_costs[layer] = float(edge_computation_cost)
+    return device_costs, data_sizes, edge_costs
+
+
+def static_offloading_policy(device_inference_times: list, edge_inference_times: list,
+                             layers_sizes: list) -> Callable:
+    """The policy of the edge: OffloadingAlgo.static_offloading with the current edge backlog."""
+    num_layers = len(layers_sizes) - 1
+
+    def decide(avg_speed: float, edge_backlog: float) -> int:
+        offloading_algo = OffloadingAlgo(
+            avg_speed=avg_speed,
+            num_layers=num_layers,
+            layers_sizes=layers_sizes,
+            inference_time_device=device_inference_times,
+            inference_time_edge=edge_inference_times,
+            edge_backlog=edge_backlog
+        )
+        best_offloading_layer = offloading_algo.static_offloading()
+        return num_layers if best_offloading_layer is None else best_offloading_layer
+    return decide
+
+
+def percentile_offloading_policy(device_inference_times: list, edge_inference_times: list, layers_sizes: list,
+                                 percentile: float) -> Callable:
+    """PercentileOffloadingAlgo on histograms of the profiled times, with the current edge backlog.
+
+    Without link speed samples the transfer time of a candidate is deterministic and only shifts its
+    latency percentile, as does the backlog, so the sampled percentiles are computed once.
+    """
+    offloading_algo = PercentileOffloadingAlgo(
+        avg_speed=float('inf'),
+        num_layers=len(layers_sizes) - 1,
+        layers_sizes=layers_sizes,
+        device_histograms=LayerTimingHistograms.from_times(device_inference_times),
+        edge_histograms=LayerTimingHistograms.from_times(edge_inference_times),
+        percentile=percentile
+    )
+    offloading_algo.percentile_offloading()
+    offloading_layers, _, edge_mask, data_sizes = offloading_algo.get_candidates()
+    compute_latencies = offloading_algo.evaluations
+    uses_edge = edge_mask.any(axis=1)
+
+    def decide(avg_speed: float, edge_backlog: float) -> int:
+        latencies = compute_latencies + data_sizes / (avg_speed or 1) + uses_edge * edge_backlog
+        return int(offloading_layers[np.argmin(latencies)])
+    return decide
+
+
+def fixed_split_policy(split: int) -> Callable:
+    return lambda avg_speed, edge_backlog: split
+
+
+class TraceReplay:
+    """Discrete-event replay of a request trace through an offloading policy.
+
+    The requests arrive at their recorded times with their recorded link speed, or the speed of the
+    bandwidth trace at that time. Each device computes its layers one request at a time and uploads
+    its tensors one at a time, so requests queue behind the previous ones of the same device. The
+    edge serves the received tensors first come first served on edge_servers servers. The policy of
+    each request sees the edge backlog the edge would see: the edge work of the requests decided and
+    not yet completed.
+
+    A policy is any callable (avg_speed, edge_backlog) -> split, see static_offloading_policy.
+
+    Args:
+        trace: The requests, with device_id, arrival_time and avg_speed columns.
+        device_inference_times: The device time of each layer.
+        edge_inference_times: The edge time of each layer.
+        layers_sizes: The output size in bytes of each layer.
+        bandwidth_trace: Optional (timestamps, speeds) link speed samples, on the time scale of the trace.
+        edge_servers: The requests the edge computes at once.
+        link_base_latency: The fixed latency of each transmission, in seconds.
+        time_scale: The factor applied to the interarrival times, below 1 to replay a heavier load.
+    """
+
+    def __init__(
+            self,
+            trace: pd.DataFrame,
+            device_inference_times: list,
+            edge_inference_times: list,
+            layers_sizes: list,
+            bandwidth_trace: tuple[np.ndarray, np.ndarray] | None = None,
+            edge_servers: int = SimulatorConfig.EDGE_SERVERS,
+            link_base_latency: float = SimulatorConfig.LINK_BASE_LATENCY,
+            time_scale: float = 1.0
+    ):
+        self.arrival_times = trace["arrival_time"].to_numpy(dtype=float) * time_scale
+        self.device_indices = pd.factorize(trace["device_id"])[0]
+        self.num_devices = int(self.device_indices.max()) + 1 if len(trace) else 0
+        if bandwidth_trace is None:
+            speeds = trace["avg_speed"].to_numpy(dtype=float)
+        else:
+            timestamps, samples = bandwidth_trace
+            sample_indices = np.searchsorted(timestamps, trace["arrival_time"].to_numpy(dtype=float), side="right")
+            speeds = samples[np.clip(sample_indices - 1, 0, len(samples) - 1)]
+        # the recorded speeds are negative or missing under clock skew, replaced by the median valid speed
+        is_valid = np.isfinite(speeds) & (speeds > 0)
+        fallback_speed = float(np.median(speeds[is_valid])) if is_valid.any() else SimulatorConfig.LINK_SPEED
+        self.speeds = np.where(is_valid, speeds, fallback_speed)
+        self.device_costs, self.data_sizes, self.edge_costs = get_split_costs(
+            device_inference_times, edge_inference_times, layers_sizes
+        )
+        self.edge_servers = edge_servers
+        self.link_base_latency = link_base_latency
+
+    def replay(self, policy: Callable) -> dict:
+        """Replay the trace through a policy.
+        Returns:
+            The split, end time, edge wait and edge time of each request.
+        """
+        num_requests = len(self.arrival_times)
+        splits = np.empty(num_requests, dtype=np.int64)
+        end_times = np.empty(num_requests)
+        edge_waits = np.zeros(num_requests)
+        device_free = [0.0] * self.num_devices
+        link_free = [0.0] * self.num_devices
+        server_free = [0.0] * self.edge_servers
+        # (reception time, request) of the tensors waiting for the edge, (end time, edge time) of the edge work
+        received = []
+        edge_work = []
+        edge_backlog = 0.0
+        edge_busy_time = 0.0
+        # python scalars, the loop runs once per request
+        arrival_times, device_indices, speeds = (
+            self.arrival_times.tolist(), self.device_indices.tolist(), self.speeds.tolist()
+        )
+        device_costs, data_sizes, edge_costs = self.device_costs, self.data_sizes, self.edge_costs
+        base_latency = self.link_base_latency
+
+        def serve(reception_time: float, request: int) -> None:
+            nonlocal edge_busy_time
+            edge_cost = edge_costs[splits[request]]
+            start_time = max(reception_time, server_free[0])
+            heapq.heapreplace(server_free, start_time + edge_cost)
+            heapq.heappush(edge_work, (start_time + edge_cost, edge_cost))
+            edge_waits[request] = start_time - reception_time
+            end_times[request] = start_time + edge_cost + base_latency
+            edge_busy_time += edge_cost
+
+        for request in range(num_requests):
+            arrival_time = arrival_times[request]
+            # the edge serves the tensors received before this registration, in reception order
+            while received and received[0][0] <= arrival_time:
+                serve(*heapq.heappop(received))
+            while edge_work and edge_work[0][0] <= arrival_time:
+                edge_backlog -= heapq.heappop(edge_work)[1]
+            split = policy(speeds[request], max(edge_backlog, 0.0))
+            splits[request] = split
+            edge_backlog += edge_costs[split]
+
+            # registration and AskInference, then the device layers and the upload queue behind the previous requests
+            device = device_indices[request]
+            device_end = max(arrival_time + 2 * base_latency, device_free[device]) + device_costs[split]
+            device_free[device] = device_end
+            reception_time = max(device_end, link_free[device]) + base_latency + data_sizes[split] / speeds[request]
+            link_free[device] = reception_time
+            if edge_costs[split] > 0:
+                heapq.heappush(received, (reception_time, request))
+            else:
+                edge_backlog -= edge_costs[split]
+                end_times[request] = reception_time + base_latency
+        while received:
+            serve(*heapq.heappop(received))
+        return {
+            "splits": splits,
+            "end_times": end_times,
+            "edge_waits": edge_waits,
+            "edge_busy_time": edge_busy_time,
+        }
+
+    def compare(self, policies: dict) -> pd.DataFrame:
+        """Replay the trace through each policy and summarize them side by side."""
+        summaries = []
+        for name, policy in policies.items():
+            start_time = time.perf_counter()
+            result = self.replay(policy)
+            replay_time = time.perf_counter() - start_time
+            logger.info(f"Replayed {len(self.arrival_times)} requests through {name} in {replay_time:.2f} seconds")
+            summaries.append({"policy": name, **self.summarize(result), "replay_s": replay_time})
+        return pd.DataFrame(summaries)
+
+    def summarize(self, result: dict) -> dict:
+        """Throughput, latency and edge wait percentiles (in ms), edge utilization and split shares of a replay."""
+        if not len(self.arrival_times):
+            return {"requests": 0}
+        latencies = (result["end_times"] - self.arrival_times) * 1000
+        makespan = float(result["end_times"].max() - self.arrival_times.min())
+        summary = {
+            "requests": len(latencies),
+            "throughput_rps": len(latencies) / makespan if makespan > 0 else float('nan'),
+            "edge_utilization": result["edge_busy_time"] / (self.edge_servers * makespan) if makespan > 0 else 0.0,
+        }
+        for q in (50, 95, 99):
+            summary[f"latency_p{q}_ms"] = np.percentile(latencies, q)
+        summary["edge_wait_p95_ms"] = np.percentile(result["edge_waits"], 95) * 1000
+        split_counts = np.bincount(result["splits"], minlength=max(self.edge_costs) + 1)
+        summary["edge_only_share"] = split_counts[0] / len(latencies)
+        summary["device_only_share"] = split_counts[-1] / len(latencies)
+        return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay request traces through offloading policies")
+    parser.add_argument("traces", nargs="*", help="evaluations.csv files, in chronological order")
+    parser.add_argument("--synthetic", type=int, default=None, help="replay a synthetic trace of this many requests")
+    parser.add_argument("--devices", type=int, default=16, help="devices of the synthetic trace")
+    parser.add_argument("--arrival-rate", type=float, default=SimulatorConfig.ARRIVAL_RATE,
+                        help="requests per second of each device of the synthetic trace")
+    parser.add_argument("--bandwidth", default=None, help="optional CSV of link speed samples (timestamp, speed)")
+    parser.add_argument("--policies", nargs="+", default=["static", "percentile", "edge_only", "device_only"],
+                        choices=["static", "percentile", "edge_only", "device_only"])
+    parser.add_argument("--percentile", type=float, default=95.0)
+    parser.add_argument("--edge-servers", type=int, default=SimulatorConfig.EDGE_SERVERS)
+    parser.add_argument("--time-scale", type=float, default=1.0, help="factor applied to the interarrival times")
+    parser.add_argument("--output", default=None, help="optional CSV file for the comparison table")
+    parser.add_argument("--algo-log-level", default="WARNING",
+                        help="level of the offloading algorithm logs, INFO logs every evaluation of every request")
+    args = parser.parse_args()
+    get_logger("offloading_algo").setLevel(args.algo_log_level)
+
+    if args.synthetic is not None:
+        request_trace = make_synthetic_trace(args.synthetic, args.devices, args.arrival_rate)
+    elif args.traces:
+        request_trace = load_request_trace(args.traces)
+    else:
+        parser.error("give trace files or --synthetic")
+    device_times = load_profile_values(OffloadingDataFiles.data_file_path_device)
+    edge_times = load_profile_values(OffloadingDataFiles.data_file_path_edge)
+    sizes = load_profile_values(OffloadingDataFiles.data_file_path_sizes)
+    available_policies = {
+        "static": lambda: static_offloading_policy(device_times, edge_times, sizes),
+        "percentile": lambda: percentile_offloading_policy(device_times, edge_times, sizes, args.percentile),
+        "edge_only": lambda: fixed_split_policy(0),
+        "device_only": lambda: fixed_split_policy(len(sizes) - 1),
+    }
+
+    trace_replay = TraceReplay(
+        request_trace, device_times, edge_times, sizes,
+        bandwidth_trace=None if args.bandwidth is None else load_bandwidth_trace(args.bandwidth),
+        edge_servers=args.edge_servers,
+        time_scale=args.time_scale,
+    )
+    comparison = trace_replay.compare({name: available_policies[name]() for name in args.policies})
+    print(comparison.to_string(index=False, float_format=lambda value: f"{value:.3f}"))
+    if args.output is not None:
+        comparison.to_csv(args.output, index=False)
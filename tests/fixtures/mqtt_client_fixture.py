@@ -1,6 +1,11 @@
+import shutil
+
 from pytest import fixture
 
+from src.commons import OffloadingDataFiles
+from src.models.model_registry import ModelRegistry, ModelSpec
 from src.mqtt_client.mqtt_client import MqttClient
+from tests.commons import TestSamples
 
 
 @fixture
@@ -11,3 +16,23 @@ def mqtt_client_fixture():
 @fixture
 def device_fixture(mqtt_client_fixture):
     return MqttClient()
+
+
+@fixture
+def edge_client_fixture(tmp_path, monkeypatch):
+    # an edge serving the default model from copies of the test samples, without loading any model
+    monkeypatch.setattr(OffloadingDataFiles, "evaluation_file_path", str(tmp_path / "evaluations.csv"))
+    model_registry = ModelRegistry(loader=lambda spec: spec.model_path, size_estimator=len)
+    model_registry.register(ModelSpec(
+        model_id="resnet_model",
+        version="1",
+        model_path="resnet_model.keras",
+        data_file_path_device=shutil.copy(TestSamples.data_file_path_device, tmp_path),
+        data_file_path_edge=TestSamples.data_file_path_edge,
+        data_file_path_sizes=TestSamples.data_file_path_sizes,
+        data_file_path_features=str(tmp_path / "layer_features.json"),
+        evaluation_file_path=str(tmp_path / "evaluations.csv"),
+    ))
+    edge_client = MqttClient(model_registry=model_registry, snapshot_file_path=None, preload_models=False)
+    edge_client.models_ready.wait()
+    return edge_client
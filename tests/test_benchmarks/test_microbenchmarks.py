@@ -0,0 +1,32 @@
+import pytest
+
+from src.benchmarks.microbenchmarks import compare, run_benchmarks
+
+
+def make_results(**medians):
+    return {"results": {name: {"median_us": median} for name, median in medians.items()}}
+
+
+def test_compare_flags_regressions():
+    baseline = make_results(fast=10.0, slow=10.0, removed=10.0)
+    current = make_results(fast=10.5, slow=12.0, added=1.0)
+    rows = {row["name"]: row for row in compare(baseline, current, threshold=0.1)}
+    # only the benchmarks of both runs are compared
+    assert set(rows) == {"fast", "slow"}
+    assert rows["fast"]["change"] == pytest.approx(0.05)
+    assert not rows["fast"]["regression"]
+    assert rows["slow"]["change"] == pytest.approx(0.2)
+    assert rows["slow"]["regression"]
+    assert rows["slow"]["baseline_us"] == 10.0 and rows["slow"]["current_us"] == 12.0
+
+
+def test_mqtt_benchmarks_run():
+    results = run_benchmarks(
+        ["mqtt_message_from_raw", "extend_message_data", "save_to_file"], warmup=0, repetitions=1, min_time=0.0
+    )
+    assert set(results["results"]) == {"mqtt_message_from_raw", "extend_message_data", "save_to_file"}
+    assert results["skipped"] == {}
+
+
+if __name__ == "__main__":
+    pytest.main()
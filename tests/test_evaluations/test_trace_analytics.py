@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.evaluations.trace_analytics import StreamingHistogram, analyze
+
+
+def request_rows(message_id, start, offloading_layer_index, phases=4):
+    topics = ["devices/", "device_01/model_inference", "device_01/model_inference_result",
+              "device_01/end_computation"]
+    return [
+        {
+            "topic": topic, "payload": "{}", "device_id": "device_01", "message_id": message_id,
+            "message_content": "", "timestamp": start + i, "received_timestamp": start + i + 0.5,
+            "payload_size": 100, "synthetic_latency": 1, "latency": 0.5, "avg_speed": 200,
+            "offloading_layer_index": offloading_layer_index if i == 2 else np.nan,
+            "layer_output": None, "device_layers_inference_time": None,
+        }
+        for i, topic in enumerate(topics[:phases])
+    ]
+
+
+@pytest.fixture
+def trace_file(tmp_path):
+    # the message id 'a' is reused by a later request, the last request never ends
+    rows = (request_rows("a", 0, 1) + request_rows("b", 10, 2) + request_rows("a", 20, 2)
+            + request_rows("c", 30, 0, phases=3))
+    file_path = tmp_path / "evaluations.csv"
+    pd.DataFrame(rows).to_csv(file_path, index=False)
+    return file_path
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 100])
+def test_analyze(trace_file, chunk_size):
+    analytics = analyze([trace_file], chunk_size=chunk_size)
+    assert analytics.rows == 15
+    assert analytics.completed_requests == 3
+    assert len(analytics.pending) == 3
+    assert analytics.split_distribution()["requests"].to_dict() == {1: 1, 2: 2}
+    summary = analytics.summary()
+    assert summary.loc["end_to_end", "count"] == 3
+    assert summary.loc["end_to_end", "mean"] == pytest.approx(3.5)
+    assert summary.loc["latency_registration", "p50"] == pytest.approx(0.5, rel=0.02)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 100])
+def test_lost_requests_are_evicted(tmp_path, chunk_size):
+    # the device results of 'b' and 'c' are lost, the trace goes on long after them
+    rows = (request_rows("a", 0, 1) + request_rows("b", 10, 2, phases=2) + request_rows("c", 20, 0, phases=3)
+            + request_rows("d", 1000, 2) + request_rows("e", 1010, 1, phases=3))
+    file_path = tmp_path / "evaluations.csv"
+    pd.DataFrame(rows).to_csv(file_path, index=False)
+    analytics = analyze([file_path], chunk_size=chunk_size, pending_horizon=100.0)
+    assert analytics.completed_requests == 2
+    assert analytics.lost_requests.to_dict() == {"ask_inference": 1, "inference_result": 1}
+    # the last request is still within the horizon
+    assert set(analytics.pending["message_id"]) == {"e"}
+    assert analytics.summary().loc["end_to_end", "count"] == 2
+
+
+def test_streaming_histogram_signed_values():
+    histogram = StreamingHistogram()
+    histogram.update(np.array([-2.0, -1.0, 1.0, 2.0, 4.0]))
+    assert histogram.percentile(10) == pytest.approx(-2.0, rel=0.02)
+    assert histogram.percentile(50) == pytest.approx(1.0, rel=0.02)
+    assert histogram.summary()["max"] == 4.0
+
+
+if __name__ == "__main__":
+    pytest.main()
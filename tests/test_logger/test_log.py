@@ -0,0 +1,56 @@
+import atexit
+import io
+from logging import DEBUG, INFO, WARNING, getLogger
+
+import pytest
+
+from src.logger.log import LocalQueueHandler, get_logger, setup_logger
+from src.logger.log_config import LoggerConfig
+
+
+@pytest.fixture
+def test_logger():
+    test_logger = getLogger("test_log")
+    yield test_logger
+    for handler in list(test_logger.handlers):
+        test_logger.removeHandler(handler)
+        handler.close()
+
+
+def test_queue_logging(tmp_path, test_logger):
+    stream = io.StringIO()
+    listener = setup_logger(test_logger, queue_logging=True, log_folder=str(tmp_path), stream=stream)
+    try:
+        # the caller only enqueues the record, the listener thread formats and writes it
+        assert [type(handler) for handler in test_logger.handlers] == [LocalQueueHandler]
+        test_logger.info("queued message")
+        test_logger.debug("debug message")
+    finally:
+        listener.stop()
+        atexit.unregister(listener.stop)
+    assert "queued message" in stream.getvalue()
+    # each file handler keeps its own level
+    assert "queued message" in (tmp_path / "INFO.log").read_text()
+    assert "debug message" not in (tmp_path / "INFO.log").read_text()
+    assert not test_logger.propagate
+
+
+def test_synchronous_logging(tmp_path, test_logger):
+    stream = io.StringIO()
+    assert setup_logger(test_logger, queue_logging=False, log_folder=str(tmp_path), stream=stream) is None
+    test_logger.warning("direct message")
+    assert "direct message" in stream.getvalue()
+    assert "direct message" in (tmp_path / "WARNING.log").read_text()
+
+
+def test_subsystem_levels():
+    assert LoggerConfig.SUBSYSTEM_LEVELS["offloading_algo"] == "WARNING"
+    assert get_logger("offloading_algo").getEffectiveLevel() == WARNING
+    assert get_logger("mqtt_client").getEffectiveLevel() == INFO
+    assert not get_logger("offloading_algo").isEnabledFor(INFO)
+    # the subsystems not listed inherit the level of the main logger
+    assert get_logger("unlisted").getEffectiveLevel() == DEBUG
+
+
+if __name__ == "__main__":
+    pytest.main()
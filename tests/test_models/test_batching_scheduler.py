@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+from src.models.batching_scheduler import BatchingScheduler
+
+
+@pytest.fixture
+def batches():
+    return []
+
+
+@pytest.fixture
+def scheduler(batches):
+    def predict(model_id, version, start_layer_id, batch):
+        batches.append((model_id, start_layer_id, batch.shape[0]))
+        return batch * 10, None
+
+    batching_scheduler = BatchingScheduler(predict=predict, max_batch_size=4, max_wait=0.05)
+    batching_scheduler.start()
+    yield batching_scheduler
+    batching_scheduler.stop()
+
+
+def test_full_batch(scheduler, batches):
+    futures = [scheduler.submit("model", 2, f"msg_{i}", np.full((1, 3), i)) for i in range(4)]
+    for i, future in enumerate(futures):
+        np.testing.assert_array_equal(future.result(timeout=5)[0], np.full((1, 3), i * 10))
+    assert batches == [("model", 2, 4)]
+
+
+def test_partial_batch_after_wait(scheduler, batches):
+    future = scheduler.submit("model", 2, "msg", np.ones((1, 3)))
+    np.testing.assert_array_equal(future.result(timeout=5)[0], np.full((1, 3), 10))
+    assert batches == [("model", 2, 1)]
+
+
+def test_keys_not_mixed(scheduler, batches):
+    futures = [scheduler.submit("model", layer_id, "msg", np.ones((1, 3))) for layer_id in (1, 2, 1)]
+    for future in futures:
+        future.result(timeout=5)
+    assert sorted(batches) == [("model", 1, 2), ("model", 2, 1)]
+
+
+def test_versions_not_mixed():
+    versions = []
+
+    def predict(model_id, version, start_layer_id, batch):
+        versions.append((version, batch.shape[0]))
+        return batch, 3
+
+    batching_scheduler = BatchingScheduler(predict=predict, max_batch_size=4, max_wait=0.05, concurrent_batches=2)
+    batching_scheduler.start()
+    futures = [batching_scheduler.submit("model", 2, "msg", np.ones((1, 3)), version=version)
+               for version in ("1", "2", "1")]
+    # the exit layer of a batch is the exit of each of its requests
+    assert [future.result(timeout=5)[1] for future in futures] == [3, 3, 3]
+    batching_scheduler.stop()
+    assert sorted(versions) == [("1", 2), ("2", 1)]
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from src.models.inference_cache import InferenceCache, get_tensor_key
+
+
+def test_tensor_key():
+    tensor = np.ones((1, 5, 5, 64), dtype=np.float32)
+    assert get_tensor_key("v1", 2, tensor) == get_tensor_key("v1", 2, tensor.copy())
+    assert get_tensor_key("v1", 2, tensor) != get_tensor_key("v2", 2, tensor)
+    assert get_tensor_key("v1", 2, tensor) != get_tensor_key("v1", 3, tensor)
+    assert get_tensor_key("v1", 2, tensor) != get_tensor_key("v1", 2, tensor.reshape(1, 25, 64))
+
+
+def test_get_or_compute():
+    inference_cache = InferenceCache(max_bytes=1024, ttl=None)
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return np.zeros(5, dtype=np.float32)
+
+    inference_cache.get_or_compute(b"key", compute)
+    result = inference_cache.get_or_compute(b"key", compute)
+    assert len(calls) == 1
+    assert result.shape == (5,)
+    assert inference_cache.metrics.hit_ratio == 0.5
+
+
+def test_results_are_read_only():
+    inference_cache = InferenceCache(max_bytes=1024, ttl=None)
+    first = inference_cache.get_or_compute(b"key", lambda: np.zeros(5, dtype=np.float32))
+    with pytest.raises(ValueError):
+        first[0] = 1.0
+    # a caller copy can be changed without altering the cached result
+    copy = inference_cache.get(b"key").copy()
+    copy[0] = 1.0
+    assert inference_cache.get(b"key")[0] == 0.0
+
+
+def test_size_bound():
+    inference_cache = InferenceCache(max_bytes=100, ttl=None)
+    for i in range(4):
+        inference_cache.put(bytes([i]), np.zeros(10, dtype=np.float32))
+    # each result is 40 bytes, only the last two fit
+    assert list(inference_cache.entries) == [bytes([2]), bytes([3])]
+    assert inference_cache.size == 80
+    assert inference_cache.metrics.evictions == 2
+
+
+def test_ttl():
+    inference_cache = InferenceCache(max_bytes=100, ttl=-1.0)
+    inference_cache.put(b"key", np.zeros(1))
+    assert inference_cache.get(b"key") is None
+    assert inference_cache.metrics.expirations == 1
+
+
+if __name__ == "__main__":
+    pytest.main()
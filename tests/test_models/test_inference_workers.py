@@ -0,0 +1,81 @@
+import os
+import time
+
+import numpy as np
+import pytest
+
+from src.models.inference_workers import InferenceWorkerPool, SharedTensorRing
+
+
+def _sum_predictor_factory(model_path: str):
+    # stands in for a loaded model: the tail "prediction" is the input plus the start layer id, exiting at layer 3
+    def predict(start_layer_id, tensor):
+        if start_layer_id < 0:
+            os._exit(1)
+        return tensor + start_layer_id, 3 if start_layer_id <= 3 else None
+    return predict
+
+
+def _failing_predictor_factory(model_path: str):
+    raise FileNotFoundError(f"No model at {model_path}")
+
+
+@pytest.fixture
+def worker_pool():
+    pool = InferenceWorkerPool(
+        model_path="test_model", num_workers=2, slots_per_worker=2, slot_size=1024,
+        predictor_factory=_sum_predictor_factory
+    )
+    pool.start()
+    yield pool
+    pool.stop()
+
+
+def test_shared_tensor_ring():
+    ring = SharedTensorRing(slots=2, slot_size=64)
+    try:
+        tensor = np.arange(8, dtype=np.float32).reshape(2, 4)
+        shape, dtype = ring.write(1, tensor)
+        np.testing.assert_array_equal(ring.read(1, shape, dtype), tensor)
+        with pytest.raises(ValueError):
+            ring.write(0, np.zeros(32, dtype=np.float32))
+    finally:
+        ring.close(unlink=True)
+
+
+def test_worker_pool_predict(worker_pool):
+    futures = [worker_pool.submit(layer_id, np.ones((1, 4), dtype=np.float32)) for layer_id in range(4)]
+    for layer_id, future in enumerate(futures):
+        prediction, exit_layer = future.result(timeout=60)
+        np.testing.assert_array_equal(prediction, np.full((1, 4), 1 + layer_id))
+        assert exit_layer == 3
+    assert sum(metrics["completed"] for metrics in worker_pool.get_metrics()) == 4
+
+
+def test_worker_pool_restart(worker_pool):
+    with pytest.raises(RuntimeError):
+        worker_pool.predict(-1, np.ones(1), timeout=60)
+    assert sum(metrics["restarts"] for metrics in worker_pool.get_metrics()) == 1
+    np.testing.assert_array_equal(worker_pool.predict(1, np.ones(1), timeout=60)[0], np.full(1, 2))
+
+
+def test_worker_pool_gives_up_failing_workers():
+    pool = InferenceWorkerPool(
+        model_path="missing_model", num_workers=1, slots_per_worker=1, slot_size=1024,
+        predictor_factory=_failing_predictor_factory, max_restarts=2
+    )
+    pool.start()
+    try:
+        deadline = time.monotonic() + 60
+        while not pool.is_failed() and time.monotonic() < deadline:
+            time.sleep(0.1)
+        assert pool.is_failed()
+        assert pool.get_metrics()[0]["restarts"] == 2
+        with pytest.raises(RuntimeError, match="No model at missing_model"):
+            pool.submit(0, np.ones(1))
+    finally:
+        pool.stop()
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,166 @@
+import json
+import os
+import re
+
+import numpy as np
+import pytest
+
+tf = pytest.importorskip("tensorflow")
+
+from src.models import model_build_split  # noqa: E402
+from src.models.model_build_split import (  # noqa: E402
+    attach_exit_heads, build_exit_head, build_split_artifacts, exit_head_hash, get_segment_boundaries,
+    layer_content_hash, segment_header_names, train_exit_heads, write_c_header
+)
+from src.models.model_manager import ModelManager  # noqa: E402
+
+
+def make_model(seed=0):
+    tf.keras.utils.set_random_seed(seed)
+    return tf.keras.Sequential([
+        tf.keras.Input(shape=(4,)),
+        tf.keras.layers.Dense(3, activation='relu'),
+        tf.keras.layers.Dense(2, activation='softmax'),
+    ])
+
+
+class InlineExecutor:
+    """Stand-in for the process pool, converting the segments in the test process."""
+
+    def __init__(self, max_workers=None, mp_context=None):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def map(self, function, *iterables):
+        return map(function, *iterables)
+
+
+@pytest.fixture
+def converted(monkeypatch):
+    """Record the converted segments, writing empty artifacts instead of running the TFLite converter."""
+    converted = []
+
+    def convert_segment(root_folder, name, header_name, array_name):
+        for artifact_path in (f"{root_folder}/layers/tflite/{name}.tflite", f"{root_folder}/layers/h/{header_name}.h"):
+            open(artifact_path, 'w').close()
+        converted.append(name)
+        return name
+
+    monkeypatch.setattr(model_build_split, "ProcessPoolExecutor", InlineExecutor)
+    monkeypatch.setattr(model_build_split, "_convert_segment", convert_segment)
+    return converted
+
+
+def test_segment_header_names():
+    # the single-layer headers keep the names included by the device firmware
+    assert segment_header_names(0, 0) == ("layer_0", "layer_-1")
+    assert segment_header_names(3, 3) == ("layer_3", "layer_2")
+    assert segment_header_names(2, 3) == ("segment_2_3", "segment_2_3")
+
+
+def test_get_segment_boundaries():
+    assert get_segment_boundaries(5) == [(0, 0), (1, 1), (2, 2), (3, 3), (4, 4)]
+    assert get_segment_boundaries(5, segment_size=2) == [(0, 1), (2, 3), (4, 4)]
+    assert get_segment_boundaries(4, segment_size=8) == [(0, 3)]
+
+
+def test_layer_content_hash_is_stable():
+    model, same_model = make_model(), make_model()
+    assert [layer_content_hash(layer) for layer in model.layers] == \
+           [layer_content_hash(layer) for layer in same_model.layers]
+    # new weights change the hash of their layer only
+    kernel, bias = same_model.layers[1].get_weights()
+    same_model.layers[1].set_weights([kernel + 1, bias])
+    assert layer_content_hash(model.layers[0]) == layer_content_hash(same_model.layers[0])
+    assert layer_content_hash(model.layers[1]) != layer_content_hash(same_model.layers[1])
+
+
+def test_write_c_header_streams_every_byte(tmp_path):
+    content = bytes(range(256)) * 3
+    (tmp_path / "model.tflite").write_bytes(content)
+    for chunk_size in (7, 4096):
+        header_path = tmp_path / f"model_{chunk_size}.h"
+        write_c_header(str(tmp_path / "model.tflite"), str(header_path), "model", chunk_size=chunk_size)
+        header = header_path.read_text()
+        assert header.startswith("#pragma once")
+        values = re.search(r"model\[\] = \{(.*)\};", header, re.S).group(1)
+        assert bytes(int(value) for value in values.split(",")) == content
+
+
+def test_manifest_skips_unchanged_segments(tmp_path, converted):
+    root_folder = str(tmp_path)
+    model = make_model()
+    manifest = build_split_artifacts(model, root_folder)
+    assert converted == ["segment_0_0", "segment_1_1"]
+    with open(os.path.join(root_folder, "layers", "manifest.json")) as f:
+        assert json.load(f) == manifest
+
+    # nothing changed, nothing is converted again
+    converted.clear()
+    build_split_artifacts(model, root_folder)
+    assert converted == []
+
+    # a changed layer and a missing artifact are rebuilt
+    kernel, bias = model.layers[1].get_weights()
+    model.layers[1].set_weights([kernel, np.ones_like(bias)])
+    os.remove(os.path.join(root_folder, "layers", "h", "layer_0.h"))
+    build_split_artifacts(model, root_folder)
+    assert sorted(converted) == ["segment_0_0", "segment_1_1"]
+
+
+
+def test_exit_head_hash_is_stable():
+    model = make_model()
+    assert exit_head_hash(build_exit_head(model, 0)) == exit_head_hash(build_exit_head(model, 0))
+    assert exit_head_hash(build_exit_head(model, 0)) != exit_head_hash(build_exit_head(model, 0, seed=1))
+
+
+def test_early_exit_on_tiny_model(tmp_path, converted):
+    root_folder = str(tmp_path)
+    tf.keras.utils.set_random_seed(0)
+    model = tf.keras.Sequential([
+        tf.keras.Input(shape=(4,)),
+        tf.keras.layers.Dense(16, activation='relu'),
+        tf.keras.layers.Dense(2, activation='softmax'),
+    ])
+    rng = np.random.default_rng(0)
+    x = rng.normal(size=(256, 4)).astype(np.float32)
+    y = (x[:, 0] > 0).astype(int)
+    exit_heads = train_exit_heads(model, attach_exit_heads(model, exit_layers=(0,)), x, y, epochs=100)
+    features = model.layers[0](x).numpy()
+    assert (exit_heads[0].predict(features, verbose=0).argmax(axis=-1) == y).mean() > 0.8
+
+    model.save(f"{root_folder}/model.keras")
+    build_split_artifacts(model, root_folder, exit_heads=exit_heads, exit_threshold=0.5)
+    assert "exit_0" in converted
+    # the trained head is unchanged, it is not converted again
+    converted.clear()
+    build_split_artifacts(model, root_folder, exit_heads=exit_heads, exit_threshold=0.5)
+    assert converted == []
+
+    model_manager = ModelManager(model_path=f"{root_folder}/model.keras")
+    model_manager.load_model(model_manager.model_path)
+    # only the exit heads of the model spec are loaded
+    model_manager.load_exit_heads(exit_layers=(1,))
+    assert model_manager.exit_heads == {}
+    model_manager.load_exit_heads()
+    # two classes, the most likely one always reaches a 0.5 confidence
+    prediction, exit_layer = model_manager.predict_with_early_exit(0, x[:8])
+    assert exit_layer == 0
+    assert np.allclose(prediction, exit_heads[0].predict(features[:8], verbose=0), atol=1e-5)
+
+    # no exit is confident enough, the whole model runs
+    exit_head, _ = model_manager.exit_heads[0]
+    model_manager.exit_heads[0] = (exit_head, 1.01)
+    prediction, exit_layer = model_manager.predict_with_early_exit(0, x[:8])
+    assert exit_layer is None
+    assert np.allclose(prediction, model.predict(x[:8], verbose=0), atol=1e-5)
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+tf = pytest.importorskip("tensorflow")
+
+from src.models.model_build_split import build_residual_resnet, build_resnet_from_scratch  # noqa: E402
+from src.models.model_graph import export_cut_subgraphs, extract_layer_graph  # noqa: E402
+from src.offloading_algo.graph_offloading_algo import enumerate_cuts  # noqa: E402
+
+
+@pytest.fixture
+def residual_model():
+    tf.keras.utils.set_random_seed(0)
+    return build_residual_resnet()
+
+
+def test_extract_residual_graph(residual_model):
+    nodes = extract_layer_graph(residual_model)
+    assert [node.name for node in nodes] == [layer.name for layer in residual_model.layers]
+    add_node = next(node for node in nodes if node.name.startswith("add"))
+    # the add layer consumes the residual branch and the shortcut
+    assert len(add_node.inbound) == 2
+    assert all(node.inbound == [] for node in nodes if node.name.startswith("input"))
+
+    cuts = enumerate_cuts(nodes)
+    assert len(cuts) == len(nodes)
+    assert any(len(cut.tensors) == 2 for cut in cuts)
+
+
+def test_extract_sequential_graph():
+    nodes = extract_layer_graph(build_resnet_from_scratch())
+    assert nodes[0].inbound == []
+    assert [node.inbound for node in nodes[1:]] == [[node.name] for node in nodes[:-1]]
+
+
+def test_export_cut_subgraphs(residual_model):
+    nodes = extract_layer_graph(residual_model)
+    cuts = enumerate_cuts(nodes)
+    inputs = np.random.default_rng(0).random((2, 10, 10, 3)).astype(np.float32)
+    expected = residual_model.predict(inputs, verbose=0)
+
+    # exporting twice leaves the model graph untouched
+    for _ in range(2):
+        for cut in cuts[:-1]:
+            device_model, edge_model = export_cut_subgraphs(residual_model, cut)
+            device_outputs = device_model.predict(inputs, verbose=0)
+            if len(cut.tensors) == 1:
+                device_outputs = [device_outputs]
+            assert len(device_outputs) == len(cut.tensors)
+            assert np.allclose(edge_model.predict(device_outputs, verbose=0), expected, atol=1e-5)
+    assert extract_layer_graph(residual_model) == nodes
+
+
+if __name__ == "__main__":
+    pytest.main()
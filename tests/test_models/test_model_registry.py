@@ -0,0 +1,66 @@
+import pytest
+
+from src.models.model_registry import ModelRegistry, ModelSpec
+from tests.commons import TestSamples
+
+
+@pytest.fixture
+def model_registry():
+    # models are plain strings sized by their length, no tensorflow needed
+    registry = ModelRegistry(memory_budget=10, loader=lambda spec: spec.model_path, size_estimator=len)
+    for model_id, model_path in [("a", "aaaa"), ("b", "bbbb"), ("c", "cccc")]:
+        registry.register(ModelSpec(
+            model_id=model_id,
+            version="1",
+            model_path=model_path,
+            data_file_path_device=TestSamples.data_file_path_device,
+            data_file_path_edge=TestSamples.data_file_path_edge,
+            data_file_path_sizes=TestSamples.data_file_path_sizes,
+        ))
+    return registry
+
+
+def test_lazy_loading(model_registry):
+    assert len(model_registry.loaded_models) == 0
+    assert model_registry.get_model("a", "1") == "aaaa"
+    assert model_registry.get_model("a", "1") == "aaaa"
+    assert model_registry.metrics.loads == 1
+    assert model_registry.metrics.hits == 1
+
+
+def test_lru_eviction(model_registry):
+    model_registry.get_model("a", "1")
+    model_registry.get_model("b", "1")
+    # touch 'a' so that 'b' becomes the least recently used model
+    model_registry.get_model("a", "1")
+    model_registry.get_model("c", "1")
+    assert list(model_registry.loaded_models) == [("a", "1"), ("c", "1")]
+    assert model_registry.metrics.evictions == 1
+    assert model_registry.metrics.resident_bytes == 8
+    assert model_registry.metrics.peak_resident_bytes == 12
+
+
+def test_unloaded_models_are_released(model_registry):
+    released = []
+    model_registry.unloader = released.append
+    for model_id in ("a", "b", "c"):
+        model_registry.get_model(model_id, "1")
+    # the budget holds two models, the least recently used one is released
+    assert released == ["aaaa"]
+    model_registry.unload_all()
+    assert released == ["aaaa", "bbbb", "cccc"]
+    assert model_registry.metrics.resident_bytes == 0
+
+def test_get_profile(model_registry):
+    profile = model_registry.get_profile("b", "1")
+    assert len(profile.layers_sizes) == len(profile.device_inference_times)
+    assert model_registry.get_profile("b", "1") is profile
+
+
+def test_unregistered_model(model_registry):
+    with pytest.raises(KeyError):
+        model_registry.get_model("d", "1")
+
+
+if __name__ == "__main__":
+    pytest.main()
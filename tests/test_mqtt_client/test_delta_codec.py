@@ -0,0 +1,87 @@
+import json
+
+import numpy as np
+import pytest
+
+from src.mqtt_client.delta_codec import DeltaDecodeError, DeltaDecoder, DeltaEncoder
+from src.mqtt_client.tensor_memory import TensorMemoryBudget
+
+
+def static_scene(num_frames, seed=0):
+    """Layer outputs of a mostly static scene: a few elements change at each frame."""
+    rng = np.random.default_rng(seed)
+    frame = rng.random((1, 8, 8, 4), dtype=np.float32)
+    for _ in range(num_frames):
+        frame = frame.copy()
+        changed = rng.choice(frame.size, size=8, replace=False)
+        frame.ravel()[changed] += rng.normal(0, 0.1, size=8).astype(np.float32)
+        yield frame
+
+
+def test_round_trip_without_drift():
+    encoder = DeltaEncoder(key_frame_interval=50, quantization_step=1e-3)
+    decoder = DeltaDecoder()
+    encodings = []
+    for tensor in static_scene(40):
+        # through the JSON payload, as sent by the device
+        frame = json.loads(json.dumps(encoder.encode(tensor)))
+        decoded = decoder.decode("device_01", 2, frame)
+        encoder.acknowledge(frame["sequence"])
+        encodings.append(frame["encoding"])
+        # the error does not accumulate over the delta frames
+        assert np.abs(decoded - tensor).max() <= 0.5e-3 + 1e-6
+    assert encodings[0] == "key"
+    assert encodings[1:].count("delta") == 39
+    # about 2 * 8 of 256 elements are sent for each delta frame, only for the output offloaded at layer 2
+    expected_sizes = decoder.get_expected_sizes("device_01", [1000.0] * 5)
+    assert expected_sizes[3] < 500
+    assert expected_sizes[:3] + expected_sizes[4:] == [1000.0] * 4
+    assert decoder.get_expected_sizes("device_02", [1000.0] * 5) == [1000.0] * 5
+
+
+def test_expected_size_floor():
+    decoder = DeltaDecoder(min_size_ratio=0.1)
+    decoder.size_ratios[("device_01", 1)] = 0.0
+    assert decoder.get_expected_sizes("device_01", [1000.0] * 4) == [1000.0, 1000.0, 100.0, 1000.0]
+
+
+def test_references_held_in_tensor_memory():
+    tensor_memory = TensorMemoryBudget(budget=float('inf'), device_budget=float('inf'))
+    encoder = DeltaEncoder()
+    decoder = DeltaDecoder(reference_history=2, tensor_memory=tensor_memory)
+    for tensor in static_scene(3):
+        frame = encoder.encode(tensor)
+        decoder.decode("device_01", 2, frame)
+        encoder.acknowledge(frame["sequence"])
+    assert tensor_memory.get_metrics()["device_in_use"] == {"device_01": 2 * tensor.nbytes}
+    decoder.reset("device_01", 2)
+    assert tensor_memory.get_metrics()["in_use"] == 0.0
+
+
+def test_periodic_key_frames():
+    encoder = DeltaEncoder(key_frame_interval=5)
+    encodings = []
+    for tensor in static_scene(10):
+        frame = encoder.encode(tensor)
+        encoder.acknowledge(frame["sequence"])
+        encodings.append(frame["encoding"])
+    assert [i for i, encoding in enumerate(encodings) if encoding == "key"] == [0, 5]
+
+
+def test_resync_after_lost_reference():
+    encoder = DeltaEncoder()
+    decoder = DeltaDecoder()
+    frames = static_scene(3)
+    key_frame = encoder.encode(next(frames))
+    decoder.decode("device_01", 2, key_frame)
+    encoder.acknowledge(key_frame["sequence"])
+    # the edge restarted and lost the reference
+    decoder.reset("device_01", 2)
+    with pytest.raises(DeltaDecodeError):
+        decoder.decode("device_01", 2, encoder.encode(next(frames)))
+    encoder.resync()
+    assert encoder.encode(next(frames))["encoding"] == "key"
+
+
+if __name__ == "__main__":
+    pytest.main()
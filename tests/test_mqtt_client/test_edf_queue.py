@@ -0,0 +1,27 @@
+import pytest
+
+from src.mqtt_client.edf_queue import EdfMessageQueue
+from src.mqtt_client.mqtt_custom_message import MqttMessageData
+
+
+def make_message(message_id):
+    return MqttMessageData(topic="devices/", payload="{}", device_id="device_01", message_id=message_id,
+                           message_content="HelloWorld!", timestamp="0")
+
+
+def test_earliest_deadline_first():
+    message_queue = EdfMessageQueue()
+    message_queue.put(make_message("best_effort"))
+    message_queue.put(make_message("late"), deadline=20.0)
+    message_queue.put(make_message("early"), deadline=10.0)
+    message_queue.put(make_message("best_effort_high_priority"), priority=1)
+    order = [message_queue.get(timeout=1).message_data.message_id for _ in range(4)]
+    assert order == ["early", "late", "best_effort_high_priority", "best_effort"]
+
+
+def test_empty_queue_timeout():
+    assert EdfMessageQueue().get(timeout=0.01) is None
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,69 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from src.models.model_registry import ModelProfile
+from src.mqtt_client.delta_codec import DeltaDecoder, DeltaEncoder
+from src.mqtt_client.edge_snapshot import is_snapshot_fresh, load_snapshot, restore_delta_decoder, save_snapshot
+from src.offloading_algo.exit_statistics import ExitStatistics
+
+
+def make_profile():
+    profile = ModelProfile(
+        device_inference_times=[0.01, 0.02, 0.03],
+        edge_inference_times=[0.001, 0.002, 0.003],
+        layers_sizes=[400, 200, 40, 10],
+        exit_statistics=ExitStatistics((1,))
+    )
+    profile.split_table["device_01"] = 2
+    profile.device_histograms.update([0.012, 0.018])
+    profile.exit_statistics.update(1, 2)
+    return profile
+
+
+def test_round_trip_restores_profiles_and_sessions(tmp_path):
+    file_path = str(tmp_path / "snapshot.npz")
+    encoder, decoder = DeltaEncoder(), DeltaDecoder()
+    tensor = np.arange(16, dtype=np.float32).reshape(4, 4)
+    frame = json.loads(json.dumps(encoder.encode(tensor)))
+    decoder.decode("device_01", 2, frame)
+    encoder.acknowledge(frame["sequence"])
+    profile = make_profile()
+    save_snapshot(file_path, {"default": profile, "model:v1": make_profile()}, decoder)
+
+    snapshot = load_snapshot(file_path)
+    assert set(snapshot["profiles"]) == {"default", "model:v1"}
+    restored = snapshot["profiles"]["default"]
+    assert restored.device_inference_times == profile.device_inference_times
+    assert restored.layers_sizes == profile.layers_sizes
+    assert restored.split_table == {"device_01": 2}
+    assert np.array_equal(restored.device_histograms.counts, profile.device_histograms.counts)
+    assert restored.exit_statistics.get_exit_probabilities() == profile.exit_statistics.get_exit_probabilities()
+
+    # the device keeps sending deltas against the frame acknowledged before the restart
+    restored_decoder = DeltaDecoder()
+    restore_delta_decoder(restored_decoder, snapshot)
+    next_tensor = tensor.copy()
+    next_tensor[0, 0] += 0.5
+    next_frame = json.loads(json.dumps(encoder.encode(next_tensor)))
+    assert next_frame["encoding"] == "delta"
+    assert np.allclose(restored_decoder.decode("device_01", 2, next_frame), next_tensor, atol=1e-3)
+    assert restored_decoder.size_ratios.keys() == decoder.size_ratios.keys() == {("device_01", 2)}
+
+
+def test_stale_snapshot(tmp_path):
+    file_path = str(tmp_path / "snapshot.npz")
+    stats_file = tmp_path / "layer_sizes.json"
+    assert not is_snapshot_fresh(file_path, [str(stats_file)])
+    stats_file.write_text("{}")
+    save_snapshot(file_path, {"default": make_profile()})
+    assert is_snapshot_fresh(file_path, [str(stats_file)])
+    # the stats changed after the snapshot was written
+    os.utime(stats_file, (os.path.getmtime(file_path) + 1,) * 2)
+    assert not is_snapshot_fresh(file_path, [str(stats_file)])
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,70 @@
+import pytest
+
+from src.mqtt_client.inference_request import InFlightRequests
+from src.mqtt_client.mqtt_configs import DefaultMessages
+
+
+def test_pipeline_depth_per_device():
+    requests = InFlightRequests(pipeline_depth=2)
+    assert requests.register("m1", "device_01") is not None
+    assert requests.register("m2", "device_01") is not None
+    assert requests.register("m3", "device_01") is None
+    # other devices have their own pipeline
+    assert requests.register("m4", "device_02") is not None
+    requests.pop("m1", "device_01")
+    assert requests.register("m3", "device_01") is not None
+    assert requests.get_depth("device_01") == 2
+
+
+def test_edge_backlog_of_in_flight_requests():
+    requests = InFlightRequests(pipeline_depth=4, clock=lambda: 0.0)
+    requests.register("m1", "device_01", deadline=10.0).edge_computation_cost = 0.5
+    requests.register("m2", "device_01").edge_computation_cost = 0.25
+    assert requests.get_edge_backlog() == 0.75
+    assert requests.pop("m1", "device_01").deadline == 10.0
+    assert requests.get_edge_backlog() == 0.25
+    assert requests.pop("m1", "device_01") is None
+
+
+def test_message_ids_are_scoped_by_device():
+    requests = InFlightRequests(pipeline_depth=4)
+    requests.register("m1", "device_01").edge_computation_cost = 0.5
+    requests.register("m1", "device_02").edge_computation_cost = 0.25
+    # rejecting the request of one device leaves the request of the other one in flight
+    assert requests.pop("m1", "device_02").edge_computation_cost == 0.25
+    assert requests.get("m1", "device_01").edge_computation_cost == 0.5
+    assert requests.get("m1", "device_02") is None
+
+
+def test_lost_requests_expire():
+    now = [0.0]
+    expired = []
+    requests = InFlightRequests(pipeline_depth=2, ttl=10.0, clock=lambda: now[0], on_expired=expired.append)
+    requests.register("m1", "device_01", deadline=5.0).edge_computation_cost = 0.5
+    requests.register("m2", "device_01").edge_computation_cost = 0.25
+    assert requests.register("m3", "device_01") is None
+
+    # the first request is past its deadline, the second one within its time-to-live
+    now[0] = 6.0
+    assert requests.get_edge_backlog() == 0.25
+    assert [request.message_id for request in expired] == ["m1"]
+    assert requests.register("m3", "device_01") is not None
+
+    # the results of both requests are lost, their slots are freed once expired
+    now[0] = 20.0
+    assert requests.register("m4", "device_01") is not None
+    assert [request.message_id for request in expired] == ["m1", "m2", "m3"]
+    assert requests.get_depth("device_01") == 1
+
+
+def test_messages_do_not_mutate_templates():
+    first = DefaultMessages.build(DefaultMessages.end_computation_msg, message_id="m1", timestamp="1")
+    second = DefaultMessages.build(DefaultMessages.end_computation_msg, message_id="m2", timestamp="2")
+    assert (first["message_id"], second["message_id"]) == ("m1", "m2")
+    assert DefaultMessages.end_computation_msg["message_id"] == "edge"
+    with pytest.raises(TypeError):
+        DefaultMessages.end_computation_msg["message_id"] = "m3"
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -1,5 +1,52 @@
+import csv
+import json
+import time
+from dataclasses import replace
+from types import SimpleNamespace
+
+import numpy as np
 import pytest
 
+from src.commons import OffloadingDataFiles
+from src.models.inference_workers import InferenceWorkerPool
+from src.mqtt_client.delta_codec import DeltaEncoder
+from src.mqtt_client.edf_queue import EdfMessageQueue
+from src.mqtt_client.mqtt_client import MqttClient
+from src.mqtt_client.mqtt_configs import Topics
+from src.mqtt_client.mqtt_custom_message import MqttMessageData
+from src.mqtt_client.tensor_memory import TensorMemoryBudget
+
+
+def send(edge_client, topic, message_id, message_content, device_id="device_01", **fields):
+    """Deliver a device message to the edge client, as received from the broker."""
+    payload = {
+        "device_id": device_id, "message_id": message_id, "message_content": message_content,
+        "timestamp": edge_client.get_ntp_timestamp(), **fields
+    }
+    edge_client.on_message(None, None, SimpleNamespace(topic=topic, payload=json.dumps(payload).encode()))
+
+
+def get_replies(publish):
+    return [json.loads(call.args[1]) for call in publish.call_args_list]
+
+
+def wait_for_replies(publish, message_content, count=1, timeout=60):
+    """Wait for the replies ended asynchronously, once their edge layers are computed."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        replies = [reply for reply in get_replies(publish) if reply["message_content"] == message_content]
+        if len(replies) >= count:
+            return replies
+        time.sleep(0.05)
+    raise TimeoutError(f"Less than {count} {message_content} replies after {timeout} seconds")
+
+
+def _double_predictor_factory(model_path):
+    # stands in for a model loaded in an inference worker
+    def predict(start_layer_id, tensor):
+        return tensor * 2, None
+    return predict
+
 
 def test_create_random_payload(mqtt_client_fixture):
     # Test the payload creation
@@ -46,5 +93,285 @@ def test_disconnect(mocker, mqtt_client_fixture):
     mock_client.assert_called_once()
 
 
+def test_unknown_model_is_rejected(mocker, edge_client_fixture):
+    publish = mocker.patch.object(edge_client_fixture.client, "publish")
+    send(edge_client_fixture, Topics.registration.value, "m1", "Registration", model_id="other")
+    assert [reply["message_content"] for reply in get_replies(publish)] == ["UnknownModel"]
+    assert edge_client_fixture.requests.get_depth("device_01") == 0
+
+
+def test_result_updates_the_model_device_times(mocker, edge_client_fixture):
+    publish = mocker.patch.object(edge_client_fixture.client, "publish")
+    send(edge_client_fixture, Topics.registration.value, "m1", "Registration", model_id="resnet_model")
+    assert get_replies(publish)[-1]["message_content"] == "AskInference"
+    times = [0.5, 0.4, 0.3, 0.2, 0.1]
+    send(edge_client_fixture, Topics.device_inference_result.value, "m1",
+         {"offloading_layer_index": 4, "layer_output": [0.0], "layers_inference_time": times})
+    assert get_replies(publish)[-1]["message_content"] == "EndComputation"
+    spec = edge_client_fixture.model_registry.get_spec()
+    with open(spec.data_file_path_device) as f:
+        assert list(json.load(f).values()) == times
+    # the profile saved in the snapshot holds the same times as the file
+    assert edge_client_fixture.model_registry.get_profile().device_inference_times == times
+
+
+def write_layer_features(spec):
+    with open(spec.data_file_path_features, 'w') as f:
+        json.dump({f"layer_{i}": {"flops": 1e6, "param_bytes": 1e3, "output_bytes": 1e3} for i in range(5)}, f)
+
+
+def write_timing_history(spec, device_ids):
+    """Write the layer features of a 5 layers model and the layer times reported for it."""
+    write_layer_features(spec)
+    with open(spec.evaluation_file_path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=["device_id", "device_layers_inference_time"])
+        writer.writeheader()
+        for device_id in device_ids:
+            writer.writerow({"device_id": device_id, "device_layers_inference_time": json.dumps([0.1] * 5)})
+
+
+def test_restored_profiles_get_a_timing_model(tmp_path, edge_client_fixture):
+    model_registry = edge_client_fixture.model_registry
+    spec = model_registry.get_spec()
+    write_timing_history(spec, ["device_01"])
+    model_registry.get_profile()
+    edge_client_fixture.snapshot_file_path = str(tmp_path / "snapshot.npz")
+    edge_client_fixture.save_snapshot()
+
+    model_registry.profiles.clear()
+    edge_client = MqttClient(model_registry=model_registry, snapshot_file_path=str(tmp_path / "snapshot.npz"),
+                             preload_models=False)
+    edge_client.models_ready.wait()
+    assert edge_client.startup_metrics.restored_from_snapshot
+    # fitted on the reports of the model
+    assert model_registry.profiles[spec.key].timing_model.is_fitted()
+
+
+def test_registry_profiles_are_fitted_on_their_history(mocker, tmp_path, edge_client_fixture):
+    model_registry = edge_client_fixture.model_registry
+    spec = replace(model_registry.get_spec(), version="2", evaluation_file_path=str(tmp_path / "evaluations_2.csv"))
+    model_registry.register(spec)
+    write_layer_features(spec)
+    # the results of the model are saved in its own history
+    mocker.patch.object(edge_client_fixture.client, "publish")
+    for message_id, device_id in (("m1", "device_01"), ("m2", "device_02")):
+        send(edge_client_fixture, Topics.registration.value, message_id, "Registration", device_id=device_id,
+             model_version="2")
+        send(edge_client_fixture, Topics.device_inference_result.value, message_id,
+             {"offloading_layer_index": 4, "layer_output": [0.0], "layers_inference_time": [0.2] * 5},
+             device_id=device_id)
+    with open(spec.evaluation_file_path, newline='') as f:
+        assert [row["device_id"] for row in csv.DictReader(f)] == ["device_01", "device_02"]
+    # the profile loaded again is fitted on that history
+    model_registry.profiles.clear()
+    timing_model = model_registry.get_profile("resnet_model", "2").timing_model
+    assert timing_model.is_fitted()
+    assert set(timing_model.device_ids) == {"device_01", "device_02"}
+
+
+def test_requests_are_rejected_without_profiles(mocker, tmp_path, monkeypatch):
+    monkeypatch.setattr(OffloadingDataFiles, "evaluation_file_path", str(tmp_path / "evaluations.csv"))
+    monkeypatch.setattr(OffloadingDataFiles, "data_file_path_device", str(tmp_path / "missing.json"))
+    edge_client = MqttClient(snapshot_file_path=None, preload_models=False)
+    edge_client.models_ready.wait()
+    assert edge_client.default_profile is None
+    publish = mocker.patch.object(edge_client.client, "publish")
+    send(edge_client, Topics.registration.value, "m1", "Registration")
+    send(edge_client, Topics.device_inference_result.value, "m2",
+         {"offloading_layer_index": 4, "layer_output": [0.0], "layers_inference_time": [0.1]})
+    assert [reply["message_content"] for reply in get_replies(publish)] == ["ProfilesUnavailable", "EndComputation"]
+    assert edge_client.requests.get_depth("device_01") == 0
+
+
+def test_repeated_layer_output_is_answered_from_the_cache(mocker, edge_client_fixture):
+    calls = []
+
+    class Model:
+        def predict_tail(self, start_layer, layer_input_data):
+            calls.append(start_layer)
+            return layer_input_data * 2, None
+
+    edge_client_fixture.model_registry.loader = lambda spec: Model()
+    edge_client_fixture.model_registry.size_estimator = lambda model: 0
+    publish = mocker.patch.object(edge_client_fixture.client, "publish")
+    for count, message_id in enumerate(("m1", "m2"), start=1):
+        send(edge_client_fixture, Topics.registration.value, message_id, "Registration")
+        send(edge_client_fixture, Topics.device_inference_result.value, message_id,
+             {"offloading_layer_index": 1, "layer_output": [1.0, 2.0], "layers_inference_time": [0.1, 0.1]})
+        wait_for_replies(publish, "EndComputation", count=count)
+    predictions = [reply["prediction"] for reply in get_replies(publish) if "prediction" in reply]
+    assert predictions == [[2.0, 4.0], [2.0, 4.0]]
+    assert calls == [2]
+    assert edge_client_fixture.get_inference_cache_metrics()["hits"] == 1
+
+
+def test_edge_layers_are_batched_by_model_version(mocker, edge_client_fixture):
+    batches = []
+
+    class Model:
+        def __init__(self, version):
+            self.version = version
+
+        def predict_tail(self, start_layer, layer_input_data):
+            batches.append((self.version, start_layer, layer_input_data.shape[0]))
+            return layer_input_data * 2, None
+
+    model_registry = edge_client_fixture.model_registry
+    model_registry.register(replace(model_registry.get_spec(), version="2"))
+    model_registry.loader = lambda spec: Model(spec.version)
+    model_registry.size_estimator = lambda model: 0
+    edge_client_fixture.batching_scheduler.max_wait = 0.5
+    publish = mocker.patch.object(edge_client_fixture.client, "publish")
+    for message_id, version in (("m1", "1"), ("m2", "2"), ("m3", "1")):
+        send(edge_client_fixture, Topics.registration.value, message_id, "Registration",
+             device_id=f"device_{message_id}", model_version=version)
+        send(edge_client_fixture, Topics.device_inference_result.value, message_id,
+             {"offloading_layer_index": 1, "layer_output": [[1.0, 2.0]], "layers_inference_time": [0.1, 0.1]},
+             device_id=f"device_{message_id}")
+    replies = wait_for_replies(publish, "EndComputation", count=3)
+    assert all(reply["prediction"] == [[2.0, 4.0]] for reply in replies)
+    assert sorted(batches) == [("1", 2, 2), ("2", 2, 1)]
+
+
+def test_edge_exits_are_recorded(mocker, edge_client_fixture):
+    class Model:
+        def predict_tail(self, start_layer, layer_input_data):
+            # the exit head after layer 3 is confident enough
+            return layer_input_data[:, :1], 3
+
+    model_registry = edge_client_fixture.model_registry
+    model_registry.register(replace(model_registry.get_spec(), exit_layers=(0, 3)))
+    model_registry.loader = lambda spec: Model()
+    model_registry.size_estimator = lambda model: 0
+    publish = mocker.patch.object(edge_client_fixture.client, "publish")
+    send(edge_client_fixture, Topics.registration.value, "m1", "Registration")
+    send(edge_client_fixture, Topics.device_inference_result.value, "m1",
+         {"offloading_layer_index": 1, "layer_output": [[1.0, 2.0]], "layers_inference_time": [0.1, 0.1]})
+    assert wait_for_replies(publish, "EndComputation")[0]["prediction"] == [[1.0]]
+    profile = model_registry.get_profile()
+    # the exit of the device was reached without being taken, the exit of the edge was taken
+    assert profile.exit_statistics.reached == {0: 1, 3: 1}
+    assert profile.exit_statistics.taken == {0: 0, 3: 1}
+    # the measured time of the edge layers up to the exit is added to their timing distributions
+    np.testing.assert_allclose(profile.edge_histograms.counts.sum(axis=1), [1, 1, 1.99, 1.99, 1])
+
+
+def test_edge_layers_run_in_the_inference_pool(mocker, edge_client_fixture):
+    inference_pool = InferenceWorkerPool(model_path="resnet_model.keras", num_workers=1, slots_per_worker=2,
+                                         slot_size=1024, predictor_factory=_double_predictor_factory)
+    inference_pool.start()
+    submit = mocker.spy(inference_pool, "submit")
+    model_registry = edge_client_fixture.model_registry
+    model_registry.loader = lambda spec: inference_pool
+    model_registry.size_estimator = lambda model: 0
+    model_registry.unloader = InferenceWorkerPool.stop
+    publish = mocker.patch.object(edge_client_fixture.client, "publish")
+    send(edge_client_fixture, Topics.registration.value, "m1", "Registration")
+    send(edge_client_fixture, Topics.device_inference_result.value, "m1",
+         {"offloading_layer_index": 1, "layer_output": [1.0, 2.0], "layers_inference_time": [0.1, 0.1]})
+    replies = wait_for_replies(publish, "EndComputation")
+    assert replies[0]["prediction"] == [2.0, 4.0]
+    assert submit.call_args.args[0] == 2
+    assert inference_pool.get_metrics()[0]["completed"] == 1
+    # the inference pools are stopped with the client
+    mocker.patch.object(edge_client_fixture.client, "disconnect")
+    edge_client_fixture.stop()
+    assert inference_pool.workers == []
+
+
+@pytest.mark.parametrize(
+    "budget, held, expected",
+    [
+        # even the smallest tensor of the model does not fit the budget
+        (1000, 0, "MemoryRejected"),
+        # it fits once the tensor held for another request is released
+        (50000, 49000, "MemoryDeferred"),
+    ],
+)
+def test_memory_rejections(mocker, edge_client_fixture, budget, held, expected):
+    edge_client_fixture.tensor_memory = TensorMemoryBudget(budget=budget, device_budget=budget)
+    edge_client_fixture.tensor_memory.reserve("m0", "device_02", held)
+    publish = mocker.patch.object(edge_client_fixture.client, "publish")
+    send(edge_client_fixture, Topics.registration.value, "m1", "Registration")
+    reply = get_replies(publish)[-1]
+    assert reply["message_content"] == expected
+    assert (reply.get("retry_after") is not None) == (expected == "MemoryDeferred")
+    assert edge_client_fixture.get_tensor_memory_metrics()["in_use"] == held
+    assert edge_client_fixture.requests.get_depth("device_01") == 0
+
+
+def test_failed_reservation_defers_the_request(mocker, edge_client_fixture):
+    # the memory left when the split was chosen is taken before the reservation
+    mocker.patch.object(edge_client_fixture.tensor_memory, "reserve", return_value=False)
+    mocker.patch.object(edge_client_fixture.tensor_memory, "get_available", side_effect=[float('inf'), 0.0])
+    publish = mocker.patch.object(edge_client_fixture.client, "publish")
+    send(edge_client_fixture, Topics.registration.value, "m1", "Registration")
+    assert [reply["message_content"] for reply in get_replies(publish)] == ["MemoryDeferred"]
+    assert edge_client_fixture.requests.get_depth("device_01") == 0
+
+
+def test_delta_encoded_output_holds_the_decoded_tensor(mocker, edge_client_fixture):
+    resize = mocker.spy(edge_client_fixture.tensor_memory, "resize")
+    mocker.patch.object(edge_client_fixture.client, "publish")
+    encoder = DeltaEncoder()
+    tensor = np.zeros((1, 16, 16), dtype=np.float32)
+    encodings = []
+    for message_id in ("m1", "m2"):
+        frame = json.loads(json.dumps(encoder.encode(tensor)))
+        send(edge_client_fixture, Topics.registration.value, message_id, "Registration")
+        send(edge_client_fixture, Topics.device_inference_result.value, message_id,
+             {"offloading_layer_index": 4, "layer_output": frame, "layers_inference_time": [0.1] * 5})
+        encoder.acknowledge(frame["sequence"])
+        encodings.append(frame["encoding"])
+    assert encodings == ["key", "delta"]
+    # the request holds the tensor decoded from the frame, whatever the size of the JSON payload
+    assert [call.args[2] for call in resize.call_args_list] == [tensor.nbytes] * 2
+
+
+@pytest.mark.parametrize(
+    "fields, expected",
+    [
+        ({"deadline": 2.5, "priority": 3}, (2.5, 3)),
+        ({"deadline": "2.5", "priority": 1.0}, (2.5, 1)),
+        # missing, null or non-numeric values are served best-effort with the default priority
+        ({}, (float('inf'), 0)),
+        ({"deadline": None, "priority": None}, (float('inf'), 0)),
+        ({"deadline": "soon", "priority": "high"}, (float('inf'), 0)),
+        ({"deadline": [1], "priority": float('inf')}, (float('inf'), 0)),
+    ],
+)
+def test_deadline_info(fields, expected):
+    assert MqttMessageData.get_deadline_info(json.dumps(fields)) == expected
+
+
+def test_invalid_deadline_is_served_best_effort(mocker, edge_client_fixture):
+    publish = mocker.patch.object(edge_client_fixture.client, "publish")
+    send(edge_client_fixture, Topics.registration.value, "m1", "Registration", deadline=None, priority="high")
+    assert get_replies(publish)[-1]["message_content"] == "AskInference"
+    assert edge_client_fixture.requests.get("m1", "device_01").deadline == float('inf')
+
+
+def test_queued_messages_loop_ends_with_the_client(mocker, edge_client_fixture):
+    edge_client_fixture.message_queue = EdfMessageQueue()
+    for method in ("connect", "loop_forever", "disconnect"):
+        mocker.patch.object(edge_client_fixture.client, method)
+    edge_client_fixture.run()
+    assert edge_client_fixture.queue_thread.is_alive()
+    edge_client_fixture.stop()
+    assert not edge_client_fixture.queue_thread.is_alive()
+
+
+def test_expired_request_releases_its_memory(mocker, edge_client_fixture):
+    mocker.patch.object(edge_client_fixture.client, "publish")
+    send(edge_client_fixture, Topics.registration.value, "m1", "Registration", deadline=1e6)
+    assert edge_client_fixture.get_tensor_memory_metrics()["in_use"] > 0
+    # the result of the device is lost, the request is dropped after its time-to-live
+    ttl = edge_client_fixture.requests.ttl
+    edge_client_fixture.requests.clock = lambda: edge_client_fixture.get_current_timestamp() + ttl + 1
+    assert edge_client_fixture.requests.get_edge_backlog() == 0
+    assert edge_client_fixture.get_tensor_memory_metrics()["in_use"] == 0
+    assert edge_client_fixture.get_deadline_metrics()["expired_in_flight"] == 1
+
+
 if __name__ == "__main__":
     pytest.main()
@@ -0,0 +1,35 @@
+import pytest
+
+from src.mqtt_client.tensor_memory import TensorMemoryBudget
+
+
+def test_device_and_global_budgets():
+    tensor_memory = TensorMemoryBudget(budget=100, device_budget=60)
+    assert tensor_memory.reserve("m1", "device_01", 50)
+    assert tensor_memory.get_available("device_01") == 10
+    assert tensor_memory.get_available("device_02") == 50
+    assert not tensor_memory.reserve("m2", "device_01", 20)
+    assert tensor_memory.reserve("m3", "device_02", 50)
+    assert not tensor_memory.reserve("m4", "device_03", 1)
+    assert tensor_memory.get_capacity() == 60
+
+
+def test_release_and_high_water_marks():
+    tensor_memory = TensorMemoryBudget(budget=100, device_budget=100)
+    tensor_memory.reserve("m1", "device_01", 30)
+    tensor_memory.reserve("m2", "device_02", 20)
+    # the received payload is larger than the estimate
+    tensor_memory.resize("m1", "device_01", 40)
+    tensor_memory.release("m1", "device_01")
+    tensor_memory.release("m1", "device_01")
+    # the same message id of another device is not released
+    tensor_memory.release("m2", "device_01")
+    metrics = tensor_memory.get_metrics()
+    assert metrics["in_use"] == 20
+    assert metrics["device_in_use"] == {"device_02": 20}
+    assert metrics["high_water_mark"] == 60
+    assert metrics["device_high_water_marks"] == {"device_01": 40, "device_02": 20}
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+
+from src.models.model_registry import ModelProfile
+from src.offloading_algo.device_timing_model import DeviceTimingModel
+
+# flops, parameter bytes and output bytes of each layer
+LAYER_FEATURES = np.array([
+    [2e6, 4e3, 4e4], [8e6, 1.6e4, 2e4], [3e7, 6e4, 1e4], [1e5, 0, 1e4], [4e5, 2e5, 4e1],
+])
+CLASS_SPEEDS = {"fast": 0.2, "slow": 2.0}
+
+
+def true_times(device_class, device_speed=1.0):
+    # time proportional to the flops, scaled by the speed of the device class
+    return 1e-8 * LAYER_FEATURES[:, 0] * CLASS_SPEEDS[device_class] * device_speed
+
+
+def make_model(rng, num_reports=20):
+    timing_model = DeviceTimingModel(LAYER_FEATURES)
+    devices = {"fast_1": ("fast", 0.9), "fast_2": ("fast", 1.1), "slow_1": ("slow", 0.95), "slow_2": ("slow", 1.05)}
+    for device_id, (device_class, device_speed) in devices.items():
+        timing_model.set_device_class(device_id, device_class)
+        for _ in range(num_reports):
+            noise = rng.lognormal(0, 0.05, len(LAYER_FEATURES))
+            timing_model.add(device_id, (true_times(device_class, device_speed) * noise).tolist())
+    timing_model.fit()
+    return timing_model
+
+
+def test_predicts_new_device_from_its_class():
+    timing_model = make_model(np.random.default_rng(0))
+    predicted, lower, upper = timing_model.predict("slow_3", device_class="slow")
+    assert np.allclose(predicted, true_times("slow"), rtol=0.3)
+    assert (lower <= true_times("slow")).all() and (true_times("slow") <= upper).all()
+    # without a class the device is assumed in the middle of the known devices
+    unknown, unknown_lower, unknown_upper = timing_model.predict("other")
+    assert (true_times("fast") < unknown).all() and (unknown < true_times("slow")).all()
+    assert (unknown_upper / unknown_lower > upper / lower).all()
+
+
+def test_calibration_and_reports_refine_a_new_device():
+    timing_model = make_model(np.random.default_rng(1))
+    # a new board three times slower than the slow class, measured on two layers only
+    actual = true_times("slow", 3.0)
+    timing_model.update("board", {0: actual[0], 3: actual[3]})
+    predicted, lower, upper = timing_model.predict("board")
+    assert np.allclose(predicted, actual, rtol=0.3)
+    assert (lower <= actual).all() and (actual <= upper).all()
+
+    for _ in range(10):
+        timing_model.update("board", actual.tolist())
+    refined, refined_lower, refined_upper = timing_model.predict("board")
+    assert np.allclose(refined, actual, rtol=0.05)
+    assert (refined_upper / refined_lower < upper / lower).all()
+
+
+def test_reports_are_refitted_periodically():
+    timing_model = make_model(np.random.default_rng(2))
+    timing_model.refit_interval = 3
+    weights = timing_model.weights.copy()
+    for _ in range(2):
+        timing_model.update("fast_1", true_times("fast").tolist())
+    assert np.array_equal(timing_model.weights, weights)
+    # a new device is fitted at once
+    timing_model.update("board", true_times("slow").tolist())
+    assert len(timing_model.offsets) == 5
+    assert timing_model.pending_reports == 0
+
+
+def test_offset_priors_leave_the_device_out():
+    timing_model = DeviceTimingModel(LAYER_FEATURES)
+    for device_id, device_class in (("a", "fast"), ("b", "fast"), ("c", "fast"), ("d", "slow"), ("e", None)):
+        timing_model.get_device_index(device_id)
+        if device_class is not None:
+            timing_model.set_device_class(device_id, device_class)
+    priors = timing_model.get_offset_priors(np.array([1.0, 2.0, 6.0, 4.0, 5.0]))
+    assert np.allclose(priors, [4.0, 3.5, 1.5, 0.0, 0.0])
+
+def test_profile_falls_back_to_its_times_without_reports():
+    profile = ModelProfile(
+        device_inference_times=[0.1] * 5, edge_inference_times=[0.01] * 5, layers_sizes=[1] * 5,
+        timing_model=DeviceTimingModel(LAYER_FEATURES)
+    )
+    assert profile.get_device_inference_times("device_01") == [0.1] * 5
+    profile.timing_model.update("device_01", true_times("fast").tolist())
+    assert profile.get_device_inference_times("device_01") == pytest.approx(true_times("fast"), rel=0.15)
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,39 @@
+import pytest
+
+from src.offloading_algo.exit_statistics import ExitStatistics
+from src.offloading_algo.offloading_algo import OffloadingAlgo
+
+
+def test_exit_probabilities_are_conditional_on_reaching_the_exit():
+    exit_statistics = ExitStatistics(exit_layers=(1, 3), prior_weight=0)
+    exit_statistics.update(exit_layer=1, last_layer=1)
+    exit_statistics.update(exit_layer=3, last_layer=3)
+    exit_statistics.update(exit_layer=None, last_layer=4)
+    exit_statistics.update(exit_layer=None, last_layer=4)
+    # the edge tail from layer 2 does not evaluate the exit at layer 1
+    exit_statistics.update(exit_layer=None, last_layer=4, first_layer=2)
+    assert exit_statistics.get_exit_probabilities() == {1: 0.25, 3: 0.25}
+
+
+def test_reach_probabilities():
+    assert OffloadingAlgo.get_reach_probabilities(4, {1: 0.5, 2: 0.5}) == [1.0, 1.0, 0.5, 0.25]
+
+
+def test_confident_exits_favor_device_computation(layers_sizes_offloading_data, device_offloading_data):
+    offloading_params = dict(
+        avg_speed=1e4,
+        num_layers=len(layers_sizes_offloading_data) - 1,
+        layers_sizes=list(layers_sizes_offloading_data),
+        inference_time_device=list(device_offloading_data),
+        inference_time_edge=[0.0] * len(device_offloading_data),
+    )
+    without_exits = OffloadingAlgo(**offloading_params)
+    without_exits.static_offloading()
+    # an exit after the first layer stops almost every input before the upload and the next layers
+    with_exits = OffloadingAlgo(exit_probabilities={0: 0.99}, **offloading_params)
+    with_exits.static_offloading()
+    assert with_exits.lowest_evaluation < without_exits.lowest_evaluation
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,49 @@
+import pytest
+from pytest import mark
+
+from src.offloading_algo.graph_offloading_algo import GraphOffloadingAlgo, LayerNode, enumerate_cuts
+
+
+@pytest.fixture
+def residual_graph():
+    # input -> conv_1 -> conv_2 -> add(conv_2, conv_1) -> dense
+    return [
+        LayerNode(name="input", inbound=[], output_size=300.0),
+        LayerNode(name="conv_1", inbound=["input"], output_size=1000.0),
+        LayerNode(name="conv_2", inbound=["conv_1"], output_size=1000.0),
+        LayerNode(name="add", inbound=["conv_2", "conv_1"], output_size=1000.0),
+        LayerNode(name="dense", inbound=["add"], output_size=20.0),
+    ]
+
+
+def test_enumerate_cuts(residual_graph):
+    cuts = enumerate_cuts(residual_graph)
+    assert [cut.tensors for cut in cuts] == [["input"], ["conv_1"], ["conv_1", "conv_2"], ["add"], ["dense"]]
+    # the cut inside the residual block carries both the block output and the skip connection
+    assert cuts[2].size == 2000.0
+
+
+def test_enumerate_cuts_not_topological(residual_graph):
+    with pytest.raises(ValueError):
+        enumerate_cuts(list(reversed(residual_graph)))
+
+
+@mark.parametrize(
+    "avg_speed, expected_last_device_layer",
+    [
+        (1e9, 0),
+        (1e-9, 4),
+    ],
+)
+def test_graph_offloading_algo(avg_speed, expected_last_device_layer, residual_graph):
+    offloading_algo = GraphOffloadingAlgo(
+        avg_speed=avg_speed,
+        nodes=residual_graph,
+        inference_time_device=[0.0, 1.0, 1.0, 0.1, 0.1],
+        inference_time_edge=[0.0, 0.1, 0.1, 0.01, 0.01],
+    )
+    assert offloading_algo.static_offloading() == expected_last_device_layer
+
+
+if __name__ == "__main__":
+    pytest.main()
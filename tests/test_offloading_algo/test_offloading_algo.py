@@ -36,5 +36,49 @@ def test_offloading_algo(
     assert best_offloading_layer <= expected_offloading_layer_index
 
 
+@mark.parametrize(
+    "deadline, edge_backlog, expected_offloading_layer_index",
+    [
+        (float('inf'), 0.0, 0),
+        # a backlog on the edge makes every split using the edge miss the deadline
+        (1.0, 10.0, 4),
+        (0.0001, 0.0, None),
+    ],
+)
+def test_offloading_algo_deadline(
+        deadline, edge_backlog, expected_offloading_layer_index,
+        layers_sizes_offloading_data, edge_offloading_data, device_offloading_data):
+    offloading_algo = OffloadingAlgo(
+        avg_speed=1e12,
+        num_layers=len(layers_sizes_offloading_data) - 1,
+        layers_sizes=list(layers_sizes_offloading_data),
+        inference_time_device=list(device_offloading_data),
+        inference_time_edge=list(edge_offloading_data),
+        deadline=deadline,
+        edge_backlog=edge_backlog
+    )
+    assert offloading_algo.static_offloading() == expected_offloading_layer_index
+
+
+@mark.parametrize("max_data_size", [5000.0, 2000.0, 1000.0])
+def test_offloading_algo_memory_budget(
+        max_data_size, layers_sizes_offloading_data, edge_offloading_data, device_offloading_data):
+    offloading_algo = OffloadingAlgo(
+        avg_speed=1e12,
+        num_layers=len(layers_sizes_offloading_data) - 1,
+        layers_sizes=list(layers_sizes_offloading_data),
+        inference_time_device=list(device_offloading_data),
+        inference_time_edge=list(edge_offloading_data),
+        max_data_size=max_data_size
+    )
+    best_offloading_layer = offloading_algo.static_offloading()
+    if max_data_size < min(layers_sizes_offloading_data):
+        assert best_offloading_layer is None
+    else:
+        # the edge only split is preferred without a budget, a deeper split with a smaller tensor is chosen
+        assert best_offloading_layer > 0
+        assert offloading_algo.best_layer_data_size <= max_data_size
+
+
 if __name__ == "__main__":
     pytest.main()
@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+from pytest import mark
+
+from src.offloading_algo.offloading_algo import OffloadingAlgo
+from src.offloading_algo.percentile_offloading_algo import PercentileOffloadingAlgo
+from src.offloading_algo.timing_histograms import LayerTimingHistograms
+
+
+def test_histograms_update():
+    histograms = LayerTimingHistograms(num_layers=4, min_time=0.001, max_time=1000.0, num_bins=61, decay=1)
+    # bins of 26% from 1 ms, the times of several seconds are resolved as well as the fast ones
+    histograms.update([0.0, 0.015, 2.5, 5000.0])
+    # partial reports only update the layers computed on the device
+    histograms.update([0.0])
+    assert histograms.counts[0, 0] == 2
+    # times beyond the last bin are clamped into it
+    assert histograms.counts[3, 60] == 1
+    np.testing.assert_allclose(histograms.get_mean()[:3], [0.0005, 0.015, 2.5], rtol=0.13)
+    # the layers computed by the edge, after the split
+    histograms.update([3.0, 3.0], first_layer=2)
+    assert histograms.counts[:2].sum() == 3
+    assert histograms.counts[2:].sum() == 4
+
+
+def test_histograms_round_trip():
+    histograms = LayerTimingHistograms.from_times([0.1, 0.2])
+    restored = LayerTimingHistograms.from_dict(histograms.to_dict())
+    np.testing.assert_array_equal(restored.counts, histograms.counts)
+
+
+@mark.parametrize("avg_speed", [1e12, 1e-3, 1e5])
+def test_matches_static_offloading_on_scalar_profiles(
+        avg_speed, layers_sizes_offloading_data, edge_offloading_data, device_offloading_data):
+    # with one observation per layer every percentile is the mean, as in OffloadingAlgo
+    num_layers = len(layers_sizes_offloading_data) - 1
+    offloading_algo = OffloadingAlgo(
+        avg_speed=avg_speed,
+        num_layers=num_layers,
+        layers_sizes=list(layers_sizes_offloading_data),
+        inference_time_device=list(device_offloading_data),
+        inference_time_edge=list(edge_offloading_data)
+    )
+    percentile_offloading_algo = PercentileOffloadingAlgo(
+        avg_speed=avg_speed,
+        num_layers=num_layers,
+        layers_sizes=list(layers_sizes_offloading_data),
+        device_histograms=LayerTimingHistograms.from_times(device_offloading_data, num_bins=4096),
+        edge_histograms=LayerTimingHistograms.from_times(edge_offloading_data, num_bins=4096),
+        percentile=99
+    )
+    assert percentile_offloading_algo.percentile_offloading() == offloading_algo.static_offloading()
+    # the edge work of the split covers the same layers
+    assert percentile_offloading_algo.best_edge_computation_cost == pytest.approx(
+        offloading_algo.best_edge_computation_cost, abs=1e-3
+    )
+
+
+def test_tail_moves_split_to_device(layers_sizes_offloading_data):
+    num_layers = len(layers_sizes_offloading_data) - 1
+    device_histograms = LayerTimingHistograms.from_times([0.1] * 5, decay=1)
+    edge_histograms = LayerTimingHistograms.from_times([0.05] * 5, decay=1)
+    # the edge is usually fast but one run in ten is very slow
+    for _ in range(9):
+        edge_histograms.update([0.05] * 5)
+    edge_histograms.update([0.5] * 5)
+
+    def offloading_layer(percentile):
+        return PercentileOffloadingAlgo(
+            avg_speed=1e12,
+            num_layers=num_layers,
+            layers_sizes=list(layers_sizes_offloading_data),
+            device_histograms=device_histograms,
+            edge_histograms=edge_histograms,
+            percentile=percentile
+        ).percentile_offloading()
+
+    assert offloading_layer(50) == 0
+    assert offloading_layer(99) == num_layers
+
+
+if __name__ == "__main__":
+    pytest.main()
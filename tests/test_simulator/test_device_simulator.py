@@ -0,0 +1,77 @@
+import json
+import time
+
+import pytest
+
+from src.mqtt_client.mqtt_configs import Topics
+from src.simulator.device_simulator import DeviceFleet, InProcessBroker
+
+
+def attach_fake_edge(broker, offloading_layer_index=1, reject=False, edge_time=0.0):
+    """Edge answering each registration with an AskInference (or a rejection) and each result with an end."""
+    def reply(topic, message_id, message_content, **kwargs):
+        broker.publish(topic, json.dumps({
+            "device_id": "edge", "message_id": message_id, "timestamp": "0",
+            "message_content": message_content, **kwargs
+        }).encode())
+
+    def on_registration(topic, payload):
+        message_id = json.loads(payload)["message_id"]
+        if reject:
+            reply(Topics.end_computation.value, message_id, "DeadlineRejected")
+        else:
+            reply(Topics.device_inference.value, message_id, "AskInference",
+                  offloading_layer_index=offloading_layer_index)
+
+    def on_result(topic, payload):
+        time.sleep(edge_time)
+        reply(Topics.end_computation.value, json.loads(payload)["message_id"], "EndComputation")
+
+    broker.subscribe(Topics.registration.value, on_registration)
+    broker.subscribe(Topics.device_inference_result.value, on_result)
+
+
+@pytest.fixture
+def broker():
+    broker = InProcessBroker()
+    yield broker
+    broker.stop()
+
+
+def make_fleet(broker, **kwargs):
+    return DeviceFleet(
+        transport=broker, device_inference_times=[0.001, 0.002, 0.003], layers_sizes=[400, 200, 40],
+        link_speed=1e7, link_speed_sigma=0, link_base_latency=0, response_timeout=1, **{"arrival_rate": 50, **kwargs}
+    )
+
+
+def test_ramp_completes_requests(broker):
+    attach_fake_edge(broker)
+    fleet = make_fleet(broker)
+    results = fleet.run_ramp([1, 2], stage_duration=0.3)
+    assert list(results["devices"]) == [1, 2]
+    assert (results["requests"] > 0).all()
+    assert (results["error_rate"] == 0).all()
+    assert (results["device_p50_ms"] >= 3).all()
+    assert all(record.offloading_layer_index == 1 for record in fleet.records)
+
+
+def test_rejected_requests_are_errors(broker):
+    attach_fake_edge(broker, reject=True)
+    summary = make_fleet(broker).run_stage(num_devices=1, duration=0.2)
+    assert summary["requests"] > 0
+    assert summary["error_rate"] == 1
+
+
+def test_pipelining_overlaps_device_and_edge(broker):
+    # 20ms on the device and 20ms on the edge for each frame
+    attach_fake_edge(broker, edge_time=0.02)
+    fleet_options = {"arrival_rate": 1000, "arrival_process": "periodic", "compute_scale": 0.02 / 0.003}
+    sequential = make_fleet(broker, **fleet_options).run_stage(1, duration=0.5)
+    pipelined = make_fleet(broker, pipeline_depth=4, **fleet_options).run_stage(1, duration=0.5)
+    assert pipelined["error_rate"] == 0
+    assert pipelined["throughput_rps"] > 1.5 * sequential["throughput_rps"]
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.offloading_algo.offloading_algo import OffloadingAlgo
+from src.offloading_algo.percentile_offloading_algo import PercentileOffloadingAlgo
+from src.offloading_algo.timing_histograms import LayerTimingHistograms
+from src.simulator.trace_replay import (
+    TraceReplay, fixed_split_policy, load_request_trace, percentile_offloading_policy, static_offloading_policy
+)
+
+DEVICE_TIMES = [0.02, 0.03, 0.04, 0.05, 0.01]
+EDGE_TIMES = [0.002, 0.003, 0.004, 0.005, 0.001]
+LAYERS_SIZES = [40000.0, 8000.0, 4000.0, 2000.0, 40.0]
+
+
+def make_replay(arrival_times, device_ids, speeds, **kwargs):
+    trace = pd.DataFrame({"device_id": device_ids, "arrival_time": arrival_times, "avg_speed": speeds})
+    return TraceReplay(trace, DEVICE_TIMES, EDGE_TIMES, LAYERS_SIZES, link_base_latency=0.0, **kwargs)
+
+
+def test_edge_contention():
+    # two devices sending their input at once, the second tensor waits for the first one on the edge
+    replay = make_replay([0.0, 0.0], ["a", "b"], [1e6, 1e6])
+    result = replay.replay(fixed_split_policy(0))
+    transfer, edge_time = 40000 / 1e6, sum(EDGE_TIMES)
+    assert result["end_times"] == pytest.approx([transfer + edge_time, transfer + 2 * edge_time])
+    assert result["edge_waits"] == pytest.approx([0, edge_time])
+    summary = replay.summarize(result)
+    assert summary["edge_utilization"] == pytest.approx(2 * edge_time / (transfer + 2 * edge_time))
+    assert summary["edge_only_share"] == 1
+
+    # with two edge servers they are computed at once
+    result = make_replay([0.0, 0.0], ["a", "b"], [1e6, 1e6], edge_servers=2).replay(fixed_split_policy(0))
+    assert result["end_times"] == pytest.approx([transfer + edge_time] * 2)
+
+
+def test_device_queue():
+    # the second frame of a device waits for the device to compute the first one
+    result = make_replay([0.0, 0.01], ["a", "a"], [1e6, 1e6]).replay(fixed_split_policy(4))
+    device_time = sum(DEVICE_TIMES)
+    assert result["end_times"] == pytest.approx([device_time + 40 / 1e6, 2 * device_time + 40 / 1e6])
+
+
+def test_policies_match_the_offloading_algorithms():
+    speeds = [1e3, 2e4, 3e5, 1e7]
+    # spaced requests, the edge is idle at each decision
+    result = make_replay(np.arange(len(speeds)) * 10.0, ["a"] * len(speeds), speeds).replay(
+        static_offloading_policy(DEVICE_TIMES, EDGE_TIMES, LAYERS_SIZES)
+    )
+    expected = [
+        OffloadingAlgo(speed, 4, LAYERS_SIZES, DEVICE_TIMES, EDGE_TIMES).static_offloading() for speed in speeds
+    ]
+    assert result["splits"].tolist() == expected
+
+    decide = percentile_offloading_policy(DEVICE_TIMES, EDGE_TIMES, LAYERS_SIZES, percentile=95)
+    for speed in speeds:
+        for edge_backlog in (0.0, 0.5):
+            offloading_algo = PercentileOffloadingAlgo(
+                speed, 4, LAYERS_SIZES, LayerTimingHistograms.from_times(DEVICE_TIMES),
+                LayerTimingHistograms.from_times(EDGE_TIMES), percentile=95, edge_backlog=edge_backlog
+            )
+            assert decide(speed, edge_backlog) == offloading_algo.percentile_offloading()
+
+
+def test_split_costs_match_the_offloading_algorithm():
+    replay = make_replay([0.0], ["a"], [1e6])
+    offloading_algo = OffloadingAlgo(1e6, 4, LAYERS_SIZES, DEVICE_TIMES, EDGE_TIMES)
+    # the partial offloading at layer 1 uploads the output of layer 2, the splits of OffloadingAlgo only
+    assert sorted(replay.edge_costs) == [0, 1, 2, 4]
+    for layer, initial_cost, layer_data_size, edge_computation_cost in offloading_algo.get_mixed_candidates()[1:]:
+        assert replay.device_costs[layer] == pytest.approx(initial_cost)
+        assert replay.data_sizes[layer] == layer_data_size
+        assert replay.edge_costs[layer] == pytest.approx(edge_computation_cost)
+    assert replay.data_sizes[1] == LAYERS_SIZES[2]
+    assert (replay.device_costs[4], replay.edge_costs[4]) == (pytest.approx(sum(DEVICE_TIMES)), 0)
+
+
+def test_load_request_trace(tmp_path):
+    file_path = tmp_path / "evaluations.csv"
+    pd.DataFrame({
+        "topic": ["devices/", "device_01/model_inference", "devices/"],
+        "device_id": ["device_01", "edge", "device_02"],
+        "message_id": ["a", "a", "b"],
+        "timestamp": [105.0, 105.5, 100.0],
+        "avg_speed": [-3.0, 1e5, 2e5],
+    }).to_csv(file_path, index=False)
+    trace = load_request_trace([str(file_path)], chunk_size=2)
+    assert trace["device_id"].tolist() == ["device_02", "device_01"]
+    assert trace["arrival_time"].tolist() == [0.0, 5.0]
+    # the negative speed recorded under clock skew is replaced
+    replay = TraceReplay(trace, DEVICE_TIMES, EDGE_TIMES, LAYERS_SIZES)
+    assert replay.speeds.tolist() == [2e5, 2e5]
+
+
+if __name__ == "__main__":
+    pytest.main()